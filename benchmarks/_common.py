@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+"""Command line and report handling shared by the benchmarks.
+
+Each benchmark builds its parser with make_parser, adds its own options,
+parses them with parse_args and passes the dict returned by make_report to
+write_report. Importing this module puts the source tree first on sys.path,
+so the benchmarks time the pyreadline next to them.
+"""
+from __future__ import print_function, unicode_literals, absolute_import
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyreadline import release
+
+
+def comma_list(convert):
+    def parse(value):
+        return [convert(v) for v in value.split(",") if v]
+    return parse
+
+
+def make_parser(doc):
+    """Return a parser described by the first line of doc."""
+    return argparse.ArgumentParser(description=doc.splitlines()[0])
+
+
+def parse_args(parser, argv=None):
+    """Add the options every benchmark has and parse argv."""
+    parser.add_argument("--seed", type=int, default=4711)
+    parser.add_argument("--output", help="write JSON here, default stdout")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def make_report(benchmark, settings, results):
+    """Return the report of a run, with the versions and platform it ran
+    on."""
+    return {
+        "benchmark": benchmark,
+        "pyreadline_version": release.version,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": settings,
+        "results": results,
+    }
+
+
+def write_report(report, output=None):
+    """Write report as JSON to the file output, or to stdout."""
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
+            f.write("\n")
+    else:
+        print(text)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+"""Common prefix benchmark.
+
+Times basemode.commonprefix, used by complete to extend the word on Tab,
+for candidate lists of growing size and reports the best time as JSON. The
+previous quadratic implementation is timed as well for the sizes up to
+--reference-limit:
+
+    python benchmarks/commonprefix.py --sizes 10000,100000,1000000
+"""
+from __future__ import print_function, unicode_literals, absolute_import
+
+import random
+import sys
+from timeit import default_timer as timer
+
+from _common import (comma_list, make_parser, make_report, parse_args,
+                     write_report)
+from pyreadline.modes.basemode import commonprefix
+
+SIZES = [10000, 100000, 1000000]
+
+
+def quadratic_commonprefix(m):
+    """The implementation commonprefix replaced."""
+    if not m:
+        return ''
+    prefix = m[0]
+    for item in m:
+        for i in range(len(prefix)):
+            if prefix[:i + 1].lower() != item[:i + 1].lower():
+                prefix = prefix[:i]
+                if i == 0:
+                    return ''
+                break
+    return prefix
+
+
+def make_candidates(size, prefix, seed):
+    """Completions sharing prefix in mixed case, like attribute names."""
+    rnd = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz_"
+    result = []
+    for i in range(size):
+        head = "".join(c.upper() if rnd.random() < 0.3 else c for c in prefix)
+        tail = "".join(rnd.choice(letters) for j in range(rnd.randint(1, 12)))
+        result.append(head + tail)
+    return result
+
+
+def best_time(function, candidates, repeat):
+    times = []
+    for i in range(repeat):
+        start = timer()
+        result = function(candidates)
+        times.append(timer() - start)
+    return min(times), result
+
+
+def run(options):
+    results = []
+    for size in options.sizes:
+        candidates = make_candidates(size, options.prefix, options.seed)
+        seconds, prefix = best_time(commonprefix, candidates, options.repeat)
+        result = {
+            "size": size,
+            "prefix_length": len(prefix),
+            "seconds": seconds,
+            "reference_seconds": None,
+        }
+        if size <= options.reference_limit:
+            ref_seconds, ref_prefix = best_time(quadratic_commonprefix,
+                                                candidates, options.repeat)
+            if ref_prefix != prefix:
+                raise AssertionError("implementations disagree for %d"
+                                     % size)
+            result["reference_seconds"] = ref_seconds
+        results.append(result)
+        if options.verbose:
+            print("%8d  %10.6f s  reference %s" % (
+                size, seconds, result["reference_seconds"]), file=sys.stderr)
+    return make_report("commonprefix", {
+        "repeat": options.repeat,
+        "prefix": options.prefix,
+        "seed": options.seed,
+    }, results)
+
+
+def main(argv=None):
+    parser = make_parser(__doc__)
+    parser.add_argument("--sizes", type=comma_list(int), default=SIZES)
+    parser.add_argument("--prefix", default="get_attribute_",
+                        help="prefix shared by all candidates")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--reference-limit", type=int, default=100000,
+                        help="largest size the old implementation is "
+                             "timed for")
+    options = parse_args(parser, argv)
+    write_report(run(options), options.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+"""History file I/O benchmark.
+
+Writes and reads a history file of --lines lines with the block at a time
+functions of pyreadline.lineeditor.historyio and with the per line loops
+they replaced, and reports the best times as JSON. The write_history_file
+and read_history_file methods of LineHistory are timed as well, with the
+search indexes turned off:
+
+    python benchmarks/history_io.py --lines 1000000 --encoding utf-8
+"""
+from __future__ import print_function, unicode_literals, absolute_import
+
+import os
+import random
+import sys
+import tempfile
+from timeit import default_timer as timer
+
+from _common import make_parser, make_report, parse_args, write_report
+from pyreadline import unicode_helper
+from pyreadline.unicode_helper import ensure_str, ensure_unicode
+from pyreadline.lineeditor import historyio
+from pyreadline.lineeditor.history import LineHistory
+
+
+def per_line_write(filename, lines):
+    """The loop write_history_file used, two writes per line."""
+    with open(filename, 'wb') as fp:
+        for line in lines:
+            fp.write(ensure_str(line))
+            fp.write('\n'.encode('ascii'))
+
+
+def per_line_read(filename):
+    """Decoding each line on its own, as ensure_unicode does."""
+    result = []
+    with open(filename, 'rb') as fp:
+        for line in fp:
+            line = ensure_unicode(line.rstrip())
+            if line:
+                result.append(line)
+    return result
+
+
+def block_write(filename, lines):
+    with open(filename, 'wb') as fp:
+        historyio.write_lines(fp, lines, historyio.history_encoding())
+
+
+def block_read(filename):
+    result = []
+    with open(filename, 'rb') as fp:
+        for lines in historyio.read_lines(fp, historyio.history_encoding()):
+            result.extend(lines)
+    return result
+
+
+def history_write(filename, lines):
+    q = LineHistory()
+    q.use_prefix_index = q.use_substring_index = False
+    q.history_length = -1
+    q.history.extend(lines)
+    start = timer()
+    q.write_history_file(filename)
+    return timer() - start
+
+
+def history_read(filename):
+    q = LineHistory()
+    q.use_prefix_index = q.use_substring_index = False
+    start = timer()
+    q.read_history_file(filename)
+    seconds = timer() - start
+    return seconds, list(q.history)
+
+
+def make_lines(count, seed):
+    """Lines like those typed at a Python prompt, a few with non ascii
+    characters."""
+    rnd = random.Random(seed)
+    words = ["print", "import", "len", "x", "data", "result", "os.path",
+             "for", "in", "range", "åäö", "€"]
+    return ["%s(%d) # %s" % (rnd.choice(words), i,
+                             " ".join(rnd.choice(words) for j in range(3)))
+            for i in range(count)]
+
+
+def best(function, repeat):
+    times = []
+    for i in range(repeat):
+        start = timer()
+        result = function()
+        times.append(timer() - start)
+    return min(times), result
+
+
+def run(options):
+    unicode_helper.pyreadline_codepage = options.encoding
+    lines = make_lines(options.lines, options.seed)
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, "history")
+    try:
+        write_old, _ = best(lambda: per_line_write(filename, lines),
+                            options.repeat)
+        write_new, _ = best(lambda: block_write(filename, lines),
+                            options.repeat)
+        read_old, old_lines = best(lambda: per_line_read(filename),
+                                   options.repeat)
+        read_new, new_lines = best(lambda: block_read(filename),
+                                   options.repeat)
+        if old_lines != new_lines or new_lines != lines:
+            raise AssertionError("implementations disagree")
+        history_write_seconds = min(history_write(filename, lines)
+                                    for i in range(options.repeat))
+        history_read_seconds = min(history_read(filename)[0]
+                                   for i in range(options.repeat))
+        size = os.path.getsize(filename)
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    results = {
+        "write": {"per_line_seconds": write_old, "block_seconds": write_new},
+        "read": {"per_line_seconds": read_old, "block_seconds": read_new},
+        "write_history_file_seconds": history_write_seconds,
+        "read_history_file_seconds": history_read_seconds,
+        "file_bytes": size,
+    }
+    if options.verbose:
+        print("write %.3f s -> %.3f s, read %.3f s -> %.3f s" % (
+            write_old, write_new, read_old, read_new), file=sys.stderr)
+    return make_report("history_io", {
+        "lines": options.lines,
+        "encoding": options.encoding,
+        "repeat": options.repeat,
+        "seed": options.seed,
+    }, results)
+
+
+def main(argv=None):
+    parser = make_parser(__doc__)
+    parser.add_argument("--lines", type=int, default=1000000)
+    parser.add_argument("--encoding", default="utf-8",
+                        help="encoding of the history file")
+    parser.add_argument("--repeat", type=int, default=3)
+    options = parse_args(parser, argv)
+    write_report(run(options), options.output)
+
+
+if __name__ == "__main__":
+    main()
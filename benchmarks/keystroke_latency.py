@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+"""Keystroke latency benchmark.
+
+Replays scripted key streams through Readline.readline() on the virtual
+console, for each editing mode, scenario and history size, and reports
+latency percentiles per keystroke and memory allocated per scenario as JSON.
+
+The latency of a key is the time from the moment getkeypress returned it
+until the next key is asked for, i.e. handling the key and redrawing the
+line. Runs on any platform:
+
+    python benchmarks/keystroke_latency.py --history-sizes 1000,100000 \\
+        --output results.json
+
+The history is added one add_history call at a time, like in a session, and
+each call inserts into the sorted list of the prefix index. Loading a
+1000000 line history that way takes minutes, so it is left out of the
+default sizes; pass it to --history-sizes to include it.
+"""
+from __future__ import print_function, unicode_literals, absolute_import
+
+import random
+import sys
+from timeit import default_timer as timer
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from _common import (comma_list, make_parser, make_report, parse_args,
+                     write_report)
+from pyreadline.console.virtual_console import Console
+from pyreadline.rlmain import Readline
+
+MODES = ["emacs", "vi"]
+SCENARIOS = ["typing", "word_motions", "reverse_search", "prefix_search",
+             "completion", "paste"]
+HISTORY_SIZES = [1000, 10000, 100000]
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "pu", "ra", "si", "to", "vu", "ze",
+             "ing", "ter", "con", "pro", "ex"]
+
+
+class TimingConsole(Console):
+    """Virtual console recording the time spent between key presses."""
+
+    def __init__(self, *args, **kwargs):
+        Console.__init__(self, *args, **kwargs)
+        self.latencies = []
+        self._returned = None
+
+    def getkeypress(self):
+        now = timer()
+        if self._returned is not None:
+            self.latencies.append(now - self._returned)
+        event = Console.getkeypress(self)
+        self._returned = timer()
+        return event
+
+    def finish(self):
+        """Record the latency of the last key when readline returns."""
+        if self._returned is not None:
+            self.latencies.append(timer() - self._returned)
+            self._returned = None
+
+
+def make_words(rnd, count):
+    words = set()
+    while len(words) < count:
+        words.add("".join(rnd.choice(SYLLABLES)
+                          for i in range(rnd.randint(1, 4))))
+    return sorted(words)
+
+
+def make_history(size, seed):
+    rnd = random.Random(seed)
+    words = make_words(rnd, 2000)
+    commands = words[:50]
+    return ["%s %s" % (rnd.choice(commands),
+                       " ".join(rnd.choice(words)
+                                for i in range(rnd.randint(1, 8))))
+            for i in range(size)]
+
+
+def typed(text):
+    """Key descriptions typing text."""
+    return ["space" if c == " " else c for c in text]
+
+
+def make_scenarios(mode, lines, options, rnd):
+    """Return a dict mapping scenario names to the list of key descriptions
+    to replay in mode. Scenarios the mode has no key bindings for are left
+    out."""
+    line = "value = compute(alpha, beta) + 42  # adjust the offset"
+    sample = lines[rnd.randrange(len(lines) // 2, len(lines))]
+    query = sample[len(sample) // 3:len(sample) // 3 + 5]
+    prefix = sample.split()[0]
+    blob = " ".join(make_words(rnd, options.paste_size // 6 + 1))
+    blob = blob[:options.paste_size]
+
+    scenarios = {
+        "typing": typed(line) + ["Return"],
+        "paste": typed(blob) + ["Return"],
+    }
+    if mode == "emacs":
+        scenarios.update({
+            "word_motions": typed(line) + ["Meta-b"] * 8 + ["Meta-f"] * 8 +
+                            ["Return"],
+            # Return ends the search, the second one accepts the line
+            "reverse_search": ["Control-r"] + typed(query) +
+                              ["Control-r"] * 3 + ["Return", "Return"],
+            "prefix_search": typed(prefix) + ["Up"] * 5 + ["Return"],
+            # y answers "Display all ... possibilities?"
+            "completion": typed("item") + ["Tab", "y", "Return"],
+        })
+    elif mode == "vi":
+        scenarios.update({
+            "word_motions": typed(line) + ["Escape"] + ["b"] * 8 +
+                            ["w"] * 8 + ["Return"],
+            "reverse_search": ["Escape", "/"] + typed(query) +
+                              ["Return"] + ["n"] * 3 + ["Return"],
+            "prefix_search": typed(prefix) + ["Up"] * 5 + ["Return"],
+            "completion": typed("item") + ["Tab", "y", "Return"],
+        })
+    return scenarios
+
+
+def make_completer(count):
+    candidates = ["item%07d" % i for i in range(count)]
+    state = {}
+
+    def completer(text, i):
+        if i == 0:
+            state["matches"] = [c for c in candidates if c.startswith(text)]
+        try:
+            return state["matches"][i]
+        except IndexError:
+            return None
+    return completer
+
+
+def make_readline(mode, lines, options):
+    console = TimingConsole(width=80, height=25)
+    rl = Readline(console)
+    rl.mode = dict((m.mode, m) for m in rl.editingmodes)[mode]
+    rl.key_batch_size = options.key_batch_size
+    rl.set_completer(make_completer(options.candidates))
+    if mode == "emacs":
+        # unbound by default, users add bind_key("Tab", "complete")
+        rl.mode._bind_key("Tab", rl.mode.complete)
+    start = timer()
+    for line in lines:
+        rl.add_history(line)
+    return rl, timer() - start
+
+
+def replay(rl, keys):
+    console = rl.console
+    console.send_keys(*keys)
+    try:
+        rl.readline(">>> ")
+    except EOFError:
+        pass
+    console.finish()
+    if console.keypress_pending():
+        raise RuntimeError("readline returned before all keys were used")
+
+
+def percentile(values, fraction):
+    """Nearest rank percentile of the sorted list values."""
+    index = max(0, int(round(fraction * len(values) + 0.5)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def summarize(latencies):
+    values = sorted(latencies)
+    ms = 1000.0
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) * ms,
+        "p50": percentile(values, 0.50) * ms,
+        "p90": percentile(values, 0.90) * ms,
+        "p99": percentile(values, 0.99) * ms,
+        "max": values[-1] * ms,
+    }
+
+
+def measure_allocations(rl, keys):
+    """Return (peak, retained) bytes allocated while replaying keys."""
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        replay(rl, keys)
+        end, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - start, end - start
+
+
+def run(options):
+    results = []
+    for size in options.history_sizes:
+        lines = make_history(size, options.seed)
+        for mode in options.modes:
+            rl, load_time = make_readline(mode, lines, options)
+            rnd = random.Random(options.seed)
+            scenarios = make_scenarios(mode, lines, options, rnd)
+            for name in options.scenarios:
+                if name not in scenarios:
+                    continue
+                keys = scenarios[name]
+                rl.console.latencies = []
+                for i in range(options.repeat):
+                    replay(rl, keys)
+                result = {
+                    "mode": mode,
+                    "scenario": name,
+                    "history_size": size,
+                    "history_load_seconds": load_time,
+                    "keys": len(keys),
+                    "repeat": options.repeat,
+                    "latency_ms": summarize(rl.console.latencies),
+                    "alloc_peak_bytes": None,
+                    "alloc_retained_bytes": None,
+                }
+                if options.allocations and tracemalloc is not None:
+                    peak, retained = measure_allocations(rl, keys)
+                    result["alloc_peak_bytes"] = peak
+                    result["alloc_retained_bytes"] = retained
+                results.append(result)
+                if options.verbose:
+                    print("%-9s %-15s %8d  p50 %8.3f ms  p99 %8.3f ms" % (
+                        mode, name, size, result["latency_ms"]["p50"],
+                        result["latency_ms"]["p99"]), file=sys.stderr)
+    return make_report("keystroke_latency", {
+        "repeat": options.repeat,
+        "candidates": options.candidates,
+        "paste_size": options.paste_size,
+        "key_batch_size": options.key_batch_size,
+        "seed": options.seed,
+    }, results)
+
+
+def main(argv=None):
+    parser = make_parser(__doc__)
+    parser.add_argument("--modes", type=comma_list(str), default=MODES)
+    parser.add_argument("--scenarios", type=comma_list(str),
+                        default=SCENARIOS)
+    parser.add_argument("--history-sizes", type=comma_list(int),
+                        default=HISTORY_SIZES)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="times each key stream is replayed")
+    parser.add_argument("--candidates", type=int, default=5000,
+                        help="number of completions offered")
+    parser.add_argument("--paste-size", type=int, default=2000,
+                        help="characters in the pasted text")
+    parser.add_argument("--key-batch-size", type=int, default=1)
+    parser.add_argument("--no-allocations", dest="allocations",
+                        action="store_false",
+                        help="skip the tracemalloc pass")
+    options = parse_args(parser, argv)
+
+    unknown = set(options.modes) - set(MODES)
+    unknown |= set(options.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error("unknown mode or scenario: %s" % ", ".join(sorted(unknown)))
+
+    write_report(run(options), options.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,10 +13,3 @@ from . import logger, clipboard, lineeditor, modes, console
 from . rlmain import *
 from . import rlmain
 
-from platform import system
-
-_S = system()
-if 'windows' != _S.lower():
-    raise RuntimeError('pyreadline is for Windows only, not {}.'.format(_S))
-del system, _S
-
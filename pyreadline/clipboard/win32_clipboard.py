@@ -37,6 +37,7 @@ from __future__ import print_function, unicode_literals, absolute_import
 import ctypes
 import ctypes.wintypes as wintypes
 from ctypes import *
+from ctypes import windll
 
 from pyreadline.keysyms.winconstants import CF_UNICODETEXT, GHND
 from pyreadline.unicode_helper import ensure_unicode
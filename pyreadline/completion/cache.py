@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+from __future__ import print_function, unicode_literals, absolute_import
+
+
+class CompletionCache(object):
+    """Completions of the word last completed on the current line.
+
+    The key identifies everything besides the word that the completions
+    depend on, e.g. the text of the line before the word, the position of
+    the word and the completer. When the same word is completed again the
+    cached completions are returned. When the word was extended, and all
+    cached completions started with the old word, the cached completions
+    starting with the new word are returned without asking the completer.
+    If none of them does the completer is asked again, since it may complete
+    the longer word differently, like rlcompleter does for "os.".
+
+    Clear the cache when the completer may have changed its mind, e.g.
+    when a new line is read.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.clear()
+
+    def clear(self):
+        self._key = None
+        self._text = None
+        self._completions = None
+        self._narrowable = False
+
+    def get(self, key, text):
+        """Return the completions of text or None if they are not known.
+        The list is shared with the cache and must not be changed."""
+        if not self.enabled or self._completions is None or key != self._key:
+            return None
+        if text == self._text:
+            return self._completions
+        if self._narrowable and text.startswith(self._text):
+            completions = [c for c in self._completions if c.startswith(text)]
+            if completions:
+                self._text = text
+                self._completions = completions
+                return completions
+        return None
+
+    def put(self, key, text, completions):
+        """Remember the completions of text."""
+        if not self.enabled:
+            return
+        self._key = key
+        self._text = text
+        self._completions = list(completions)
+        self._narrowable = all(c.startswith(text) for c in completions)
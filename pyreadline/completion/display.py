@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+from __future__ import print_function, unicode_literals, absolute_import
+
+
+class CompletionDisplay(object):
+    """Column layout of a list of completions.
+
+    The completions are listed down the columns, every column as wide as the
+    longest completion plus one space. Rows are made one at a time when they
+    are asked for, so showing the first page of a huge list only pads the
+    completions on that page. The width of the longest completion is
+    remembered for the last list, and the layout for each console width
+    used with it.
+    """
+
+    def __init__(self):
+        self._completions = None
+        self._column_width = 0
+        self._layouts = {}
+
+    def layout(self, completions, width):
+        """Return (column width, columns, rows) for showing completions on
+        a console width characters wide."""
+        if completions is not self._completions:
+            self._completions = completions
+            self._column_width = max(map(len, completions)) + 1
+            self._layouts = {}
+        layout = self._layouts.get(width)
+        if layout is None:
+            columns = max(1, (width - 1) // self._column_width)
+            rows = (len(completions) + columns - 1) // columns
+            layout = self._layouts[width] = (self._column_width, columns,
+                                             rows)
+        return layout
+
+    def row(self, completions, width, row):
+        """Return the text of a row, ending with a newline."""
+        column_width, columns, rows = self.layout(completions, width)
+        items = completions[row::rows]
+        return "".join(item.ljust(column_width) for item in items) + "\n"
+
+    def rows(self, completions, width, start=0, stop=None):
+        """Return the text of rows start to stop as one string."""
+        column_width, columns, rows = self.layout(completions, width)
+        if stop is None or stop > rows:
+            stop = rows
+        return "".join(self.row(completions, width, row)
+                       for row in range(start, stop))
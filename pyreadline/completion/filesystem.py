@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+from __future__ import print_function, unicode_literals, absolute_import
+
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from os import scandir
+except ImportError:  # Python 2
+    scandir = None
+
+from ..unicode_helper import ensure_unicode
+
+
+def _stat_mtime(path):
+    st = os.stat(path)
+    return getattr(st, "st_mtime_ns", st.st_mtime)
+
+
+def _list_directory(path):
+    """Return a list of (name, normcased name, is directory) for path."""
+    normcase = os.path.normcase
+    if scandir is not None:
+        entries = scandir(path)
+        try:
+            return [(entry.name, normcase(entry.name), entry.is_dir())
+                    for entry in entries]
+        finally:
+            close = getattr(entries, "close", None)
+            if close is not None:
+                close()
+    return [(name, normcase(name), os.path.isdir(os.path.join(path, name)))
+            for name in os.listdir(path)]
+
+
+class FilesystemCompleter(object):
+    """Complete file names from cached directory listings.
+
+    A listing is read with os.scandir, whose entries know if they are
+    directories without a stat call per file on Windows. It is reused as
+    long as the modification time of the directory is unchanged, so
+    completing in the same directory again costs a single stat. Listings
+    of up to max_directories directories are kept. The cache may be used
+    from several threads.
+
+    Names match like glob.glob(text + '*') does, i.e. case insensitively
+    where the file system is and names starting with a dot only when text
+    does, but characters like * and ? in text match literally.
+    """
+
+    def __init__(self, max_directories=64):
+        self.max_directories = max_directories
+        self._listings = OrderedDict()  # directory -> (mtime, listing)
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+
+    def listing(self, directory):
+        """Return the cached listing of directory, reading it if it changed.
+        Returns an empty list if directory can not be read."""
+        try:
+            mtime = _stat_mtime(directory)
+        except (OSError, IOError):
+            with self._lock:
+                self._listings.pop(directory, None)
+            return []
+        cached = self._listings.get(directory)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            listing = _list_directory(directory)
+        except (OSError, IOError):
+            listing = []
+        with self._lock:
+            self._listings.pop(directory, None)
+            self._listings[directory] = (mtime, listing)
+            while len(self._listings) > self.max_directories:
+                self._listings.popitem(last=False)
+        return listing
+
+    def complete(self, text, mark_directories=True):
+        """Return the paths starting with text, after expanding ~. With
+        mark_directories a separator is appended to directories."""
+        path = os.path.expanduser(ensure_unicode(text))
+        directory, prefix = os.path.split(path)
+        hidden = prefix.startswith(".")
+        prefix = os.path.normcase(prefix)
+        completions = []
+        for name, normcased, is_dir in self.listing(directory or os.curdir):
+            if not normcased.startswith(prefix):
+                continue
+            if name.startswith(".") and not hidden:
+                continue
+            if directory:
+                name = os.path.join(directory, name)
+            if is_dir and mark_directories:
+                name += os.sep
+            completions.append(name)
+        return completions
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+from __future__ import print_function, unicode_literals, absolute_import
+
+try:
+    from concurrent.futures import ThreadPoolExecutor, wait
+except ImportError:  # Python 2 without the futures backport
+    ThreadPoolExecutor = None
+
+import pyreadline.logger as logger
+from pyreadline.logger import log
+
+
+class CompletionScheduler(object):
+    """Run completion sources, on a thread pool when workers is above 0.
+
+    run(key, sources) starts every source that is not already running for
+    key and waits at most timeout seconds for them. Sources still running
+    when the time is up keep running and their results are returned by a
+    later call with the same key, e.g. the next Tab. A call with another key
+    means the user changed the line, so the work for the old key is
+    cancelled. Sources that already started can not be stopped, their
+    results are dropped.
+
+    With workers set to 0, or without concurrent.futures, the sources run
+    one after the other on the calling thread.
+    """
+
+    def __init__(self, workers=0, timeout=0.2):
+        self.timeout = timeout
+        self._workers = 0
+        self._executor = None
+        self._key = None
+        self._futures = {}
+        self.workers = workers
+
+    def get_workers(self):
+        return self._workers
+
+    def set_workers(self, workers):
+        if ThreadPoolExecutor is None:
+            workers = 0
+        workers = max(0, int(workers))
+        if workers != self._workers and self._executor is not None:
+            self.cancel()
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._workers = workers
+
+    workers = property(get_workers, set_workers)
+
+    @property
+    def concurrent(self):
+        return self._workers > 0
+
+    def cancel(self):
+        """Forget the pending work."""
+        for future in self._futures.values():
+            future.cancel()
+        self._futures = {}
+        self._key = None
+
+    def run(self, key, sources):
+        """Run sources, a list of (name, function, argument) tuples, and
+        return a dict mapping the names of the sources that finished in time
+        to function(argument). On the thread pool a source that raised an
+        exception gives an empty list."""
+        if not self.concurrent:
+            return dict((name, function(argument))
+                        for name, function, argument in sources)
+        if key != self._key:
+            self.cancel()
+            self._key = key
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self._workers)
+        futures = []
+        for name, function, argument in sources:
+            future = self._futures.get(name)
+            if future is None:
+                future = self._executor.submit(self._call, function, argument)
+                self._futures[name] = future
+            futures.append(future)
+        wait(futures, timeout=self.timeout)
+        results = {}
+        for name, function, argument in sources:
+            future = self._futures[name]
+            if future.done():
+                results[name] = future.result()
+                del self._futures[name]
+        if logger.enabled and len(results) < len(sources):
+            log('completion sources still running: %s',
+                sorted(set(self._futures)))
+        return results
+
+    def _call(self, function, argument):
+        try:
+            return function(argument)
+        except Exception as err:
+            log('completion source failed: %s', err)
+            return []
@@ -1,4 +1,5 @@
 from __future__ import print_function, unicode_literals, absolute_import
+import os
 import sys
 
 success = False
@@ -15,7 +16,14 @@ else:
         from .console import *
         success = True
     except ImportError:
-        raise
+        # No win32 console, e.g. when benchmarking or testing on another
+        # platform. Fall back to the in-memory console. On Windows a failing
+        # import is a real error unless PYREADLINE_VIRTUAL_CONSOLE is set.
+        if sys.platform == "win32" and \
+                not os.environ.get("PYREADLINE_VIRTUAL_CONSOLE"):
+            raise
+        from .virtual_console import *
+        success = True
 
 if not success:
     raise ImportError(
@@ -19,6 +19,7 @@ import os
 import traceback
 import re
 
+from .. import logger
 from ..logger import log
 from ..unicode_helper import ensure_unicode, ensure_str
 from ..keysyms import make_KeyPress, KeyPress
@@ -33,13 +34,6 @@ from ctypes.wintypes import (HANDLE, LPCWSTR, DWORD, WORD, BOOL, LPVOID,
     HMODULE, LPCSTR, LPWSTR, LPCVOID, _COORD, SMALL_RECT, ULONG, WCHAR, UINT)
 
 
-def nolog(_):
-    pass
-
-
-log = nolog
-
-
 # some constants we need
 STD_INPUT_HANDLE = -10
 STD_OUTPUT_HANDLE = -11
@@ -313,7 +307,7 @@ class Console(object):
         for escape in self.escape_to_color:
             if self.escape_to_color[escape] is not None:
                 self.escape_to_color[escape] |= background
-        log('initial attr=%x' % self.attr)
+        log('initial attr=%x', self.attr)
         self.softspace = 0  # this is for using it as a file-like object
         self.serial = 0
 
@@ -460,8 +454,9 @@ class Console(object):
         n, res = self.ansiwriter.write_color(text, attr)
         junk = DWORD(0)
         for attr, chunk in res:
-            log("console.attr:%s" % (attr))
-            log("console.chunk:%s" % (chunk))
+            if logger.enabled:
+                log("console.attr:%s", attr)
+                log("console.chunk:%s", chunk)
             SetConsoleTextAttribute(self.hout, attr.winattr)
             for short_chunk in split_block(chunk):
                 WriteConsoleW(self.hout, short_chunk,
@@ -471,7 +466,8 @@ class Console(object):
     # make this class look like a file object
     def write(self, text):
         text = ensure_unicode(text)
-        log('write("%s")' % text)
+        if logger.enabled:
+            log('write("%s")', text)
         return self.write_color(text)
 
     # write = write_scrolling
@@ -552,7 +548,7 @@ class Console(object):
         info = CONSOLE_SCREEN_BUFFER_INFO()
         GetConsoleScreenBufferInfo(self.hout, byref(info))
         rect = info.srWindow
-        log('sw: rtop=%d rbot=%d' % (rect.Top, rect.Bottom))
+        log('sw: rtop=%d rbot=%d', rect.Top, rect.Bottom)
         top = rect.Top + lines
         bot = rect.Bottom + lines
         h = bot - top
@@ -569,9 +565,9 @@ class Console(object):
         nrect.Bottom = bot
         nrect.Left = rect.Left
         nrect.Right = rect.Right
-        log('sn: top=%d bot=%d' % (top, bot))
+        log('sn: top=%d bot=%d', top, bot)
         r = SetConsoleWindowInfo(self.hout, True, byref(nrect))
-        log('r=%d' % r)
+        log('r=%d', r)
 
     def get(self):
         """Get next event from queue."""
@@ -592,7 +588,8 @@ class Console(object):
         while 1:
             e = self.get()
             if e.type == 'KeyPress' and e.keycode not in key_modifiers:
-                log("console.getkeypress %s" % e)
+                if logger.enabled:
+                    log("console.getkeypress %s", e)
                 if e.keyinfo.keyname == 'next':
                     self.scroll_window(12)
                 elif e.keyinfo.keyname == 'prior':
@@ -601,7 +598,8 @@ class Console(object):
                     return e
             elif ((e.type == 'KeyRelease') and
                 (e.keyinfo == KeyPress('S', False, True, False, 'S'))):
-                log("getKeypress:%s,%s,%s" % (e.keyinfo, e.keycode, e.type))
+                if logger.enabled:
+                    log("getKeypress:%s,%s,%s", e.keyinfo, e.keycode, e.type)
                 return e
 
     def peek(self):
@@ -609,9 +607,23 @@ class Console(object):
         Cevent = INPUT_RECORD()
         count = DWORD(0)
         status = PeekConsoleInputW(self.hin, byref(Cevent), 1, byref(count))
-        if status and count == 1:
+        if status and count.value == 1:
             return event(self, Cevent)
 
+    def keypress_pending(self):
+        """Return True if getkeypress would return without waiting. Events
+        that getkeypress would skip are removed from the queue."""
+        while 1:
+            e = self.peek()
+            if e is None:
+                return False
+            if e.type == 'KeyPress' and e.keycode not in key_modifiers:
+                return True
+            if ((e.type == 'KeyRelease') and
+                (e.keyinfo == KeyPress('S', False, True, False, 'S'))):
+                return True
+            self.get()
+
     def title(self, txt=None):
         """Set/get title."""
         if txt:
@@ -37,6 +37,10 @@ class baseconsole(object):
     def getkeypress(self):
         '''Return next key press event from the queue, ignoring others.'''
         raise NotImplementedError
+
+    def keypress_pending(self):
+        '''Return True if getkeypress would return without waiting.'''
+        return False
         
     def write(self, text):
         raise NotImplementedError
@@ -37,6 +37,7 @@ import os
 import System
 
 from .event import Event
+from pyreadline import logger
 from pyreadline.logger import log
 
 from pyreadline.keysyms import \
@@ -199,9 +200,10 @@ class Console(object):
 
         return the number of characters written.
         """
-        log('write_color("%s", %s)' % (text, attr))
         chunks = self.terminal_escape.split(text)
-        log('chunks=%s' % repr(chunks))
+        if logger.enabled:
+            log('write_color("%s", %s)', text, attr)
+            log('chunks=%r', chunks)
         bg = self.savebg
         n = 0 # count the characters we actually write, omitting the escapes
         if attr is None:#use attribute from initial console
@@ -225,7 +227,8 @@ class Console(object):
 
     # make this class look like a file object
     def write(self, text):
-        log('write("%s")' % text)
+        if logger.enabled:
+            log('write("%s")', text)
         return self.write_color(text)
 
     #write = write_scrolling
@@ -300,6 +303,10 @@ class Console(object):
             else:
                 return event(self, e)
 
+    def keypress_pending(self):
+        """Return True if getkeypress would return without waiting."""
+        return System.Console.KeyAvailable
+
     def title(self, txt=None):
         """Set/get title."""
         if txt:
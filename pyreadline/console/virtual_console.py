@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+# **************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# **************************************************************************
+'''In-memory console.
+
+Keeps the screen as a grid of characters and attributes and reads key presses
+from a scripted queue, so Readline can be driven without a Windows console,
+e.g. for tests and benchmarks on any platform.
+'''
+from __future__ import print_function, unicode_literals, absolute_import
+
+from collections import deque
+
+from ..unicode_helper import ensure_unicode
+from ..keysyms.common import KeyPress, make_KeyPress_from_keydescr
+from .ansi import AnsiState, AnsiWriter
+from .consolebase import baseconsole
+from .event import Event
+
+WHITE = 0x7
+
+# characters that select a named key when sent with send_text
+text_to_keydescr = {
+    '\r': 'Return',
+    '\n': 'Return',
+    '\t': 'Tab',
+    '\010': 'BackSpace',
+    '\033': 'Escape',
+    ' ': 'space',
+}
+
+# the character a Windows console reports for a named key
+keyname_to_char = {
+    'return': '\r',
+    'tab': '\t',
+    'backspace': '\010',
+    'escape': '\033',
+    'space': ' ',
+}
+
+
+class Console(baseconsole):
+    """Console driver keeping the screen in memory.
+
+    Key presses are queued with send_keys or send_text. getkeypress raises
+    EOFError when the queue is empty, which makes Readline.readline give up
+    like it does at the end of input.
+    """
+
+    def __init__(self, width=80, height=25, attr=WHITE):
+        self.width = width
+        self.height = height
+        self.attr = attr
+        self.saveattr = attr  # remember the initial colors
+        self.defaultstate = AnsiState()
+        self.defaultstate.winattr = attr
+        self.ansiwriter = AnsiWriter(self.defaultstate)
+        self.softspace = 0  # this is for using it as a file-like object
+        self.serial = 0
+        self.bell_count = 0
+        self.cursor_visible = True
+        self.cursor_size = None
+        self._title = ''
+        self._x = self._y = 0
+        self._chars = [[' '] * width for y in range(height)]
+        self._attrs = [[attr] * width for y in range(height)]
+        self._events = deque()
+
+    # inspecting the screen
+
+    def line(self, y):
+        """Return the text of screen line y without trailing blanks."""
+        return ''.join(self._chars[y]).rstrip()
+
+    def line_attrs(self, y):
+        """Return the list of attributes of screen line y."""
+        return list(self._attrs[y])
+
+    def lines(self):
+        """Return the text of all screen lines up to the last non blank
+        one."""
+        result = [self.line(y) for y in range(self.height)]
+        while result and not result[-1]:
+            result.pop()
+        return result
+
+    # output
+
+    def _scroll_up(self):
+        del self._chars[0]
+        del self._attrs[0]
+        self._chars.append([' '] * self.width)
+        self._attrs.append([self.attr] * self.width)
+
+    def _put(self, text, attr):
+        """Write text at the cursor the way a console in processed output
+        mode does. Returns the number of lines the buffer scrolled."""
+        w, h = self.width, self.height
+        x, y = self._x, self._y
+        scroll = 0
+        for c in text:
+            if c == '\n':
+                x = 0
+                y += 1
+            elif c == '\r':
+                x = 0
+            elif c == '\t':
+                stop = min(8 * (x // 8 + 1), w)
+                for i in range(x, stop):
+                    self._chars[y][i] = ' '
+                    self._attrs[y][i] = attr
+                x = stop
+            elif c == '\007':
+                self.bell_count += 1
+            elif c == '\010':
+                x = max(0, x - 1)
+            else:
+                self._chars[y][x] = c
+                self._attrs[y][x] = attr
+                x += 1
+            if x == w:  # wrap
+                x = 0
+                y += 1
+            if y == h:  # scroll
+                self._scroll_up()
+                scroll += 1
+                y = h - 1
+        self._x, self._y = x, y
+        return scroll
+
+    def _write(self, text, attr=None):
+        n, res = self.ansiwriter.write_color(ensure_unicode(text), attr)
+        scroll = 0
+        for state, chunk in res:
+            scroll += self._put(chunk, state.winattr)
+        return n, scroll
+
+    def write_scrolling(self, text, attr=None):
+        """write text at current cursor position while watching for scrolling.
+
+        Returns the number of lines that the buffer scrolled.
+        """
+        n, scroll = self._write(text, attr)
+        return scroll
+
+    def write_color(self, text, attr=None):
+        n, scroll = self._write(text, attr)
+        return n
+
+    # make this class look like a file object
+    def write(self, text):
+        return self.write_color(text)
+
+    def pos(self, x=None, y=None):
+        """Move or query the window cursor."""
+        if x is None:
+            return self._x, self._y
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        self._x, self._y = x, y
+        return True
+
+    def home(self):
+        """Move to home."""
+        self.pos(0, 0)
+
+    def size(self, width=None, height=None):
+        """Set/get window size."""
+        if width is not None and height is not None:
+            for row, attrs in zip(self._chars, self._attrs):
+                del row[width:], attrs[width:]
+                row.extend([' '] * (width - len(row)))
+                attrs.extend([self.attr] * (width - len(attrs)))
+            del self._chars[height:], self._attrs[height:]
+            for y in range(len(self._chars), height):
+                self._chars.append([' '] * width)
+                self._attrs.append([self.attr] * width)
+            self.width, self.height = width, height
+            self._x = min(self._x, width - 1)
+            self._y = min(self._y, height - 1)
+        return self.width, self.height
+
+    def page(self, attr=None, fill=' '):
+        """Fill the entire screen."""
+        if attr is None:
+            attr = self.attr
+        if len(fill) != 1:
+            raise ValueError
+        self.rectangle((0, 0, self.width, self.height), attr, fill)
+        self._x = self._y = 0
+        self.attr = attr
+
+    def text(self, x, y, text, attr=None):
+        """Write text at the given position."""
+        if attr is None:
+            attr = self.attr
+        i = y * self.width + x
+        for c in text[:max(0, self.width * self.height - i)]:
+            self._chars[i // self.width][i % self.width] = c
+            self._attrs[i // self.width][i % self.width] = attr
+            i += 1
+
+    def rectangle(self, rect, attr=None, fill=' '):
+        """Fill Rectangle."""
+        if attr is None:
+            attr = self.attr
+        x0, y0, x1, y1 = rect
+        x0, x1 = max(x0, 0), min(x1, self.width)
+        for y in range(max(y0, 0), min(y1, self.height)):
+            for x in range(x0, x1):
+                self._chars[y][x] = fill[0]
+                self._attrs[y][x] = attr
+
+    def scroll(self, rect, dx, dy, attr=None, fill=' '):
+        """Scroll a rectangle, clipped to itself."""
+        if attr is None:
+            attr = self.attr
+        x0, y0, x1, y1 = rect
+        x0, x1 = max(x0, 0), min(x1, self.width)
+        y0, y1 = max(y0, 0), min(y1, self.height)
+        chars = [row[x0:x1] for row in self._chars[y0:y1]]
+        attrs = [row[x0:x1] for row in self._attrs[y0:y1]]
+        self.rectangle((x0, y0, x1, y1), attr, fill)
+        for y in range(y0, y1):
+            for x in range(x0, x1):
+                if x0 <= x + dx < x1 and y0 <= y + dy < y1:
+                    self._chars[y + dy][x + dx] = chars[y - y0][x - x0]
+                    self._attrs[y + dy][x + dx] = attrs[y - y0][x - x0]
+        return True
+
+    def scroll_window(self, lines):
+        """Scroll the window by the indicated number of lines. The window
+        always shows the whole buffer so there is nothing to do."""
+        pass
+
+    def cursor(self, visible=None, size=None):
+        """Set cursor on or off."""
+        if visible is not None:
+            self.cursor_visible = bool(visible)
+        if size is not None:
+            self.cursor_size = size
+
+    def bell(self):
+        self.write('\007')
+
+    def title(self, txt=None):
+        """Set/get title."""
+        if txt:
+            self._title = txt
+        else:
+            return self._title
+
+    # input
+
+    def send_keys(self, *keydescrs):
+        """Queue key presses given as key descriptions like those used in
+        pyreadlineconfig.ini, e.g. "a", "Control-a", "Shift-Left"."""
+        for keydescr in keydescrs:
+            self._events.append(event(self, make_KeyPress_from_keydescr(
+                keydescr)))
+
+    def send_text(self, text):
+        """Queue the key presses typing text. Newline and tab are sent as the
+        Return and Tab keys, other control characters as Control chords."""
+        for c in ensure_unicode(text):
+            if c in text_to_keydescr:
+                self.send_keys(text_to_keydescr[c])
+            elif ord(c) < 32:
+                self.send_keys('Control-' + chr(ord(c) + 96))
+            else:
+                self._events.append(event(self, KeyPress(c)))
+
+    def get(self):
+        """Get next event from queue."""
+        if not self._events:
+            raise EOFError("No more scripted key presses")
+        return self._events.popleft()
+
+    def getkeypress(self):
+        """Return next key press event from the queue."""
+        return self.get()
+
+    def peek(self):
+        """Check event queue."""
+        if self._events:
+            return self._events[0]
+
+    def keypress_pending(self):
+        """Return True if getkeypress would return without waiting."""
+        return bool(self._events)
+
+    def next_serial(self):
+        """Get next event serial number."""
+        self.serial += 1
+        return self.serial
+
+
+class event(Event):
+    """Key press event made from a KeyPress."""
+
+    def __init__(self, console, keyinfo):
+        self.type = 'KeyPress'
+        self.serial = console.next_serial()
+        self.width = None
+        self.height = 0
+        self.x = 0
+        self.y = 0
+        self.keycode = 0
+        self.state = 0
+        self.keyinfo = keyinfo
+        self.keysym = keyinfo.keyname or keyinfo.char
+        if keyinfo.keyname:
+            self.char = keyname_to_char.get(keyinfo.keyname, '\0')
+            keyinfo.char = self.char
+        else:
+            self.char = keyinfo.char
+
+
+def getconsole(buffer=1):
+    """Get a console. The buffer argument is accepted for compatibility
+    with the Windows console."""
+    return Console()
+
+
+readline_hook = None  # the python hook goes here
+
+
+def install_readline(hook):
+    """Remember the hook. There is no interpreter prompt to take over, so
+    callers have to call it themselves."""
+    global readline_hook
+    readline_hook = hook
@@ -1,5 +1,6 @@
 from __future__ import print_function, unicode_literals, absolute_import
 
+import os
 import sys
 from . import winconstants
 
@@ -16,8 +17,15 @@ else:
     try:
         from .keysyms import *
         success = True
-    except ImportError as x:
-        pass
-    
+    except ImportError:
+        # No win32 api, only the key descriptions used by the virtual
+        # console are available. As for the console this is an error on
+        # Windows unless PYREADLINE_VIRTUAL_CONSOLE is set.
+        if sys.platform == "win32" and \
+                not os.environ.get("PYREADLINE_VIRTUAL_CONSOLE"):
+            raise
+        from .common import *
+        success = True
+
 if not success:
-    raise ImportError("Could not import keysym for local pythonversion", x)
+    raise ImportError("Could not import keysym for local pythonversion")
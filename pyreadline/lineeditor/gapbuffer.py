@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+from __future__ import print_function, unicode_literals, absolute_import
+
+from ..unicode_helper import ensure_unicode
+
+
+class GapBuffer(object):
+    """List of characters with a movable gap, used as TextLine.line_buffer.
+
+    The characters before the gap are kept in _left, the characters after the
+    gap are kept in _right in reverse order. Moving the gap costs the
+    distance moved, and inserting or deleting at the gap only appends to or
+    truncates _left, so editing at the cursor is amortized O(1) per character
+    and pasting a long text is linear in its length.
+
+    Indexing, slicing, slice assignment, deletion, insert, append, extend and
+    count behave like they do for a list. Slices are returned as lists.
+    """
+
+    def __init__(self, iterable=()):
+        self._left = list(iterable)
+        self._right = []
+        self._text = None
+
+    def _move_gap(self, position):
+        left, right = self._left, self._right
+        if position < len(left):
+            moved = left[position:]
+            del left[position:]
+            moved.reverse()
+            right.extend(moved)
+        elif position > len(left):
+            count = position - len(left)
+            moved = right[-count:]
+            del right[-count:]
+            moved.reverse()
+            left.extend(moved)
+
+    def _index(self, index):
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("list index out of range")
+        return index
+
+    def _range(self, key):
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            raise ValueError("GapBuffer does not support extended slices")
+        return start, max(start, stop)
+
+    def tolist(self):
+        return self._left + self._right[::-1]
+
+    def text(self):
+        """Return the characters joined to a unicode string. The result is
+        cached until the buffer is changed."""
+        if self._text is None:
+            self._text = "".join(map(ensure_unicode, self))
+        return self._text
+
+    def __len__(self):
+        return len(self._left) + len(self._right)
+
+    def __iter__(self):
+        for c in self._left:
+            yield c
+        for c in reversed(self._right):
+            yield c
+
+    def __contains__(self, item):
+        return item in self._left or item in self._right
+
+    def __eq__(self, other):
+        if isinstance(other, GapBuffer):
+            other = other.tolist()
+        if isinstance(other, list):
+            return self.tolist() == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __add__(self, other):
+        return self.tolist() + list(other)
+
+    def __radd__(self, other):
+        return list(other) + self.tolist()
+
+    def __repr__(self):
+        return "GapBuffer(%r)" % self.tolist()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step not in (None, 1):
+                return self.tolist()[key]
+            start, stop = self._range(key)
+            left, right = self._left, self._right
+            result = left[start:stop]
+            if stop > len(left):
+                first = max(start, len(left)) - len(left)
+                last = stop - len(left)
+                chunk = right[len(right) - last:len(right) - first]
+                chunk.reverse()
+                result.extend(chunk)
+            return result
+        index = self._index(key)
+        if index < len(self._left):
+            return self._left[index]
+        return self._right[len(self) - 1 - index]
+
+    def __setitem__(self, key, value):
+        self._text = None
+        if isinstance(key, slice):
+            start, stop = self._range(key)
+            value = list(value)
+            self._move_gap(stop)
+            del self._left[start:]
+            self._left.extend(value)
+            return
+        index = self._index(key)
+        if index < len(self._left):
+            self._left[index] = value
+        else:
+            self._right[len(self) - 1 - index] = value
+
+    def __delitem__(self, key):
+        self._text = None
+        if isinstance(key, slice):
+            start, stop = self._range(key)
+        else:
+            start = self._index(key)
+            stop = start + 1
+        self._move_gap(stop)
+        del self._left[start:]
+
+    def insert(self, index, item):
+        length = len(self)
+        if index < 0:
+            index = max(0, index + length)
+        self._move_gap(min(index, length))
+        self._left.append(item)
+        self._text = None
+
+    def append(self, item):
+        self.insert(len(self), item)
+
+    def extend(self, iterable):
+        self[len(self):] = iterable
+
+    def count(self, item):
+        return self._left.count(item) + self._right.count(item)
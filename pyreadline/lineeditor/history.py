@@ -8,8 +8,9 @@
 from __future__ import print_function, unicode_literals, absolute_import
 import sys
 import os
+import time
 
-from ..unicode_helper import ensure_unicode, ensure_str
+from ..unicode_helper import ensure_unicode
 
 if "pyreadline" in sys.modules:
     pyreadline = sys.modules["pyreadline"]
@@ -17,8 +18,18 @@ else:
     pass
 
 from . import lineobj
+from .historybuffer import HistoryBuffer
+from .historyindex import LineIndex, PrefixIndex, NgramIndex
+from .historyjournal import HistoryJournal
+from .historyloader import HistoryLoader, read_tail
+from .historyio import history_encoding, read_lines, write_lines
+from .historybinary import (BinaryHistoryFile, BinaryHistoryError,
+                            EXTENSION, append_binary, is_binary_history,
+                            write_binary)
+from .. import logger
 from ..logger import log
 
+from bisect import bisect_left, bisect_right
 import six
 if six.PY2:
     class FileNotFoundError(OSError):
@@ -29,22 +40,56 @@ class EscapeHistory(Exception):
     pass
 
 
+def _line_text(line):
+    if hasattr(line, "get_line_text"):
+        return line.get_line_text()
+    return ensure_unicode(line)
+
+
 class LineHistory(object):
+    """The history entries, kept as plain strings and only turned into a
+    ReadLineTextBuffer when recalled into the edit buffer."""
+
     def __init__(self):
-        self.history = []
+        self.history = HistoryBuffer()
+        self._max_entries = -1
+        self.ignorespace = False
+        self.ignoredups = False
+        self._line_index = None
+        self.lazy_load = 0
+        self._loader = None
+        self._binary = None
+        self._unloaded = 0
+        self.encoding = None
+        self.history_format = "auto"
+        self.session_id = os.getpid() & 0xffffffff
         self._history_length = 100
         self._history_cursor = 0
         self.history_filename = os.path.expanduser('~/.history')
         self.lastcommand = None
         self.query = ""
         self.last_search_for = ""
+        self._prefix_index = PrefixIndex()
+        # the trigram index takes several times the memory of the lines, it
+        # is only built by the first reverse or forward search
+        self._ngram_index = NgramIndex()
+        self._ngram_index.stale = True
+        self.journal = False
+        self.journal_fsync = False
+        self.shared = False
+        self._journal = None
 
     def get_current_history_length(self):
         """Return the number of lines currently in the history.
         (This is different from get_history_length(), which returns
         the maximum number of lines that will be written to a history file.)"""
-        value = len(self.history)
-        log("get_current_history_length:%d" % value)
+        if self._direct_access():
+            value = len(self.history) + self._unloaded
+        else:
+            self.finish_loading()
+            value = len(self.history)
+        if logger.enabled:
+            log("get_current_history_length:%d", value)
         return value
 
     def get_history_item(self, index):
@@ -52,67 +97,252 @@ class LineHistory(object):
         index 1)."""
         if index == 0:
             return None
-        item = self.history[index - 1]
-        log("get_history_item: index:%d item:%r" % (index, item))
-        return item.get_line_text()
+        if index > 0 and self._direct_access():
+            if index <= self._unloaded:
+                item = self._binary.text(index - 1)
+            else:
+                item = self.history[index - 1 - self._unloaded]
+        else:
+            self.finish_loading()
+            item = self.history[index - 1]
+        if logger.enabled:
+            log("get_history_item: index:%d item:%r", index, item)
+        return item
+
+    def get_history_info(self, index):
+        """Return (timestamp, session, exit) of history item at index (starts
+        with index 1). The timestamp is 0 when not known."""
+        if index > 0 and self._direct_access():
+            if index <= self._unloaded:
+                return self._binary.record(index - 1)[1:]
+            return self.history.info(index - 1 - self._unloaded)
+        self.finish_loading()
+        return self.history.info(index - 1)
+
+    def set_history_exit(self, index, exit):
+        """Set the exit flag of history item at index (starts with index 1),
+        e.g. to mark a command that failed. Any true value, like a non zero
+        exit status, sets the flag to 1."""
+        self.finish_loading()
+        timestamp, session = self.history.info(index - 1)[:2]
+        self.history.set_info(index - 1, (timestamp, session,
+                                          int(bool(exit))))
+
+    def _direct_access(self):
+        """True if the entries not loaded yet can be read from the binary
+        history file, that is if none of them will be dropped when they are
+        put in front of the history. The loaded entries then follow them."""
+        return self._loader is not None and self._unloaded > 0 and \
+            not (self.ignorespace or self.ignoredups or self.erasedups or
+                 self._max_entries >= 0)
 
     @property
     def history_length(self):
         """Return the desired length of the history file. Negative values imply
         unlimited history file size."""
         value = self._history_length
-        log("get_history_length:%d" % value)
+        if logger.enabled:
+            log("get_history_length:%d", value)
         return value
 
     @history_length.setter
     def history_length(self, value):
-        log("set_history_length: old:%d new:%d" % (self._history_length, value))
+        if logger.enabled:
+            log("set_history_length: old:%d new:%d", self._history_length,
+                value)
         self._history_length = value
+        if self._journal is not None:
+            self._journal.history_length = value
+
+    @property
+    def max_entries(self):
+        """The number of entries kept in memory, the oldest entries are
+        dropped when more are added. Negative values imply no limit."""
+        return self._max_entries
+
+    @max_entries.setter
+    def max_entries(self, value):
+        self._max_entries = value
+        self._trim()
 
     @property
     def history_cursor(self):
         value = self._history_cursor
-        log("get_history_cursor:%d" % value)
+        if logger.enabled:
+            log("get_history_cursor:%d", value)
         return value
 
     @history_cursor.setter
     def history_cursor(self, value):
-        log("set_history_cursor: old:%d new:%d" % (self._history_cursor, value))
+        if logger.enabled:
+            log("set_history_cursor: old:%d new:%d", self._history_cursor,
+                value)
         self._history_cursor = value
 
+    @property
+    def use_prefix_index(self):
+        """True if history_search_backward/forward use the prefix index
+        instead of scanning the whole history."""
+        return self._prefix_index is not None
+
+    @use_prefix_index.setter
+    def use_prefix_index(self, value):
+        if value and self._prefix_index is None:
+            self._prefix_index = PrefixIndex()
+            self._prefix_index.stale = True
+        elif not value:
+            self._prefix_index = None
+
+    @property
+    def use_substring_index(self):
+        """True if reverse_search_history/forward_search_history only check
+        the lines the n-gram index reports as candidates."""
+        return self._ngram_index is not None
+
+    @use_substring_index.setter
+    def use_substring_index(self, value):
+        if value and self._ngram_index is None:
+            self._ngram_index = NgramIndex()
+            self._ngram_index.stale = True
+        elif not value:
+            self._ngram_index = None
+
+    @property
+    def erasedups(self):
+        """True if adding a line removes the earlier copies of it."""
+        return self._line_index is not None
+
+    @erasedups.setter
+    def erasedups(self, value):
+        if value and self._line_index is None:
+            self._line_index = LineIndex()
+            self._line_index.stale = True
+        elif not value:
+            self._line_index = None
+
+    def _indexes(self):
+        return [index for index in (self._prefix_index, self._ngram_index,
+                                    self._line_index)
+                if index is not None]
+
+    def _index_add(self, text, id):
+        for index in self._indexes():
+            if not index.stale:
+                index.add(text, id)
+
+    def _index_discard(self, text, id):
+        for index in self._indexes():
+            if not index.stale:
+                index.discard(text, id)
+
+    def _fresh_index(self, index):
+        if index.stale:
+            index.rebuild(self.history, self.history.ids())
+        return index
+
     def clear_history(self):
         """Clear readline history."""
-        self.history = []
+        self._loader = None
+        self._close_binary()
+        self.history.clear()
         self.history_cursor = 0
+        for index in self._indexes():
+            index.clear()
+            index.stale = index is self._ngram_index
 
     def parse_history_from_string(self, string=None):
         """Create a readline history from a string.
         Each history item must be separated by a newline character (\n)"""
         if not string:
             return
-        for line in string.split("\n"):
-            self.add_history(ensure_unicode(line.rstrip()))
+        self._add_lines([ensure_unicode(line.rstrip())
+                         for line in string.split("\n")])
 
     def read_history_file(self, filename=None):
-        """Load a readline history file."""
+        """Load a readline history file. When sharing the history file its
+        lines are read by the journal, which then follows the file."""
         f = filename or self.history_filename
+        if self.shared and f == self.history_filename:
+            for line in self._journal_for(f).pull(reset=True):
+                self._add(line)
+            return
+        if self._binary_format(f):
+            self._read_binary(f)
+            return
+        if self.lazy_load > 0:
+            self.finish_loading()
+            try:
+                offset, lines = read_tail(f, self.lazy_load,
+                                          self._encoding())
+            except (IOError, OSError):
+                self.clear_history()
+                return
+            self._add_lines(lines)
+            if offset > 0:
+                self._loader = HistoryLoader(f, offset, self._encoding())
+            return
         try:
-            with open(f, 'r') as f:
-                for line in f:
-                    line = ensure_unicode(line.rstrip())
-                    self.add_history(lineobj.ReadLineTextBuffer(line))
+            with open(f, 'rb') as fp:
+                for lines in read_lines(fp, self._encoding()):
+                    self._add_lines(lines)
         except IOError:
-            self.history = []
-            self.history_cursor = 0
+            self.clear_history()
 
     def write_history_file(self, filename=None):
-        """Save a readline history file."""
+        """Save a readline history file. When journaling to the file only
+        the lines not written yet are appended."""
         f = filename or self.history_filename
+        if self._journaling and f == self.history_filename:
+            if self._journal is not None:
+                self._journal.flush()
+            return
+        self.finish_loading()
 
+        if self._binary_format(f):
+            write_binary(f, *self._columns(self.history_length))
+            return
         with open(f, 'wb') as fp:
-            for line in self.history[-self.history_length:]:
-                fp.write(ensure_str(line.get_line_text()))
-                fp.write('\n'.encode('ascii'))
+            write_lines(fp, self._last(self.history_length), self._encoding())
+
+    def _read_binary(self, filename):
+        self.finish_loading()
+        try:
+            history = BinaryHistoryFile(filename)
+        except (IOError, OSError, ValueError, BinaryHistoryError) as err:
+            log("read_history_file: can not read %s: %s", filename, err)
+            self.clear_history()
+            return
+        start = 0
+        if self.lazy_load > 0:
+            start = max(0, len(history) - self.lazy_load)
+        self._add_lines(*history.columns(start))
+        if start > 0:
+            # closed by _backfill once the loader is done
+            self._binary = history
+            self._unloaded = start
+            self._loader = HistoryLoader(0, start, read=history.columns)
+        else:
+            history.close()
+
+    def _binary_name(self, filename):
+        format = self.history_format
+        return format == "binary" or \
+            format == "auto" and filename.endswith(EXTENSION)
+
+    def _binary_format(self, filename):
+        """True if filename is in the binary history format: always with
+        history_format "binary", never with "text", and with "auto" if its
+        name ends in EXTENSION or it starts like a binary history file."""
+        return self._binary_name(filename) or \
+            self.history_format == "auto" and is_binary_history(filename)
+
+    def _columns(self, count):
+        """Return (lines, info) for the last count entries, all of them if
+        count is negative, info being the lists (timestamps, sessions,
+        exits)."""
+        history = self.history
+        start = 0 if count < 0 else max(0, len(history) - count)
+        return history[start:], history.info_columns(start)
 
     def append_history_file(self, nelements, filename=None):
         """Append the last nelements of history to a file."""
@@ -120,30 +350,50 @@ class LineHistory(object):
 
         if not os.path.exists(f):
             raise FileNotFoundError('%s not found' % f)
+        self.finish_loading()
 
-        if self.history_length < nelements:
+        if 0 <= self.history_length < nelements:
             nelements = self.history_length
 
+        if self._binary_format(f):
+            append_binary(f, *self._columns(nelements))
+            return
         with open(f, 'ab') as fp:
-            for line in self.history[-nelements:]:
-                fp.write(ensure_str(line.get_line_text()))
-                fp.write('\n'.encode('ascii'))
+            write_lines(fp, self._last(nelements), self._encoding())
+
+    def _last(self, count):
+        """Return a list of the last count entries, all of them if count
+        is negative."""
+        if count < 0:
+            return self.history[:]
+        return self.history[len(self.history) - count:] if count else []
+
+    def _encoding(self):
+        return history_encoding(self.encoding)
 
     def replace_history_item(self, index, item):
         """Replace the item at index with item."""
+        self.finish_loading()
         if index >= len(self.history):
             raise IndexError("history index out of range")
 
-        line = ensure_unicode(item)
-        if not hasattr(line, "get_line_text"):
-            line = lineobj.ReadLineTextBuffer(line)
-
+        line = _line_text(item)
+        id = self.history.id_at(index)
+        self._index_discard(self.history[index], id)
         self.history[index] = line
+        self._index_add(line, id)
 
     def remove_history_item(self, index):
         """Remove history item at index."""
+        self.finish_loading()
         if index >= len(self.history):
             raise IndexError("history index out of range")
+        self._remove(index)
+
+    def _remove(self, index):
+        if index < 0:
+            index += len(self.history)
+        self._index_discard(self.history[index], self.history.id_at(index))
         del self.history[index]
         if self._history_cursor >= len(self.history):
             self._history_cursor = len(self.history) - 1
@@ -152,74 +402,280 @@ class LineHistory(object):
 
     def add_history(self, line):
         """Append a line to the history buffer, as if it was the last line
-        typed."""
-        line = ensure_unicode(line)
-        if not hasattr(line, "get_line_text"):
-            line = lineobj.ReadLineTextBuffer(line)
-        if not line.get_line_text():
-            pass
+        typed. With journal set the line is also queued to be appended to
+        the history file."""
+        self._backfill(wait=False)
+        self.merge_shared_history()
+        line = self._add(line, (time.time(), self.session_id, 0))
+        if line and self._journaling:
+            self._journal_for(self.history_filename).append(line)
+
+    def _add(self, line, info=None):
+        """Append line, with info (timestamp, session, exit), unless
+        ignorespace or ignoredups rule it out. Returns the text added, or an
+        empty string."""
+        line = _line_text(line)
+        if not line or self.ignorespace and line.startswith(" ") or \
+                self.ignoredups and self.history and \
+                self.history.last() == line:
+            line = ""
         else:
-            self.history.append(line)
+            if self._line_index is not None:
+                self._erase_duplicates(line)
+            self._append(line, info)
+        self.history_cursor = len(self.history)
+        return line
+
+    def _erase_duplicates(self, line):
+        """Remove the earlier copies of line. They are only marked dead in
+        the history, _add moves the cursor to the end afterwards."""
+        history = self.history
+        for id in self._fresh_index(self._line_index).positions(line):
+            self._index_discard(line, id)
+            history.discard_id(id)
+
+    def finish_loading(self):
+        """Wait for the older lines of a lazily loaded history file and put
+        them in front of the history."""
+        self._backfill(wait=True)
+
+    def _backfill(self, wait):
+        loader = self._loader
+        if loader is None or not (wait or loader.done):
+            return
+        self._loader = None
+        lines, info = loader.wait()
+        self._close_binary()
+        self._prepend(lines, info)
+
+    def _close_binary(self):
+        """Close the binary history file read by a lazy load, a loader still
+        reading it gets no lines."""
+        if self._binary is not None:
+            self._binary.close()
+            self._binary = None
+        self._unloaded = 0
+
+    def _prepend(self, lines, info=None):
+        """Put lines, older than every entry, in front of the history,
+        applying ignorespace, ignoredups, erasedups and max_entries as if
+        they had been added first. The cursor moves along."""
+        history = self.history
+        # indexes of the lines kept
+        keep = range(len(lines))
+        if self.ignorespace:
+            keep = [i for i in keep if not lines[i].startswith(" ")]
+        if self._line_index is not None or self.ignoredups:
+            # walk from the newest line, keeping what adding would keep
+            seen = set(history) if self._line_index is not None else None
+            newer = history[0] if history else None
+            kept = []
+            for i in reversed(keep):
+                line = lines[i]
+                if seen is not None:
+                    if line in seen:
+                        continue
+                    seen.add(line)
+                elif line == newer:
+                    continue
+                kept.append(i)
+                newer = line
+            kept.reverse()
+            keep = kept
+        if self._max_entries >= 0:
+            room = max(0, self._max_entries - len(history))
+            keep = keep[len(keep) - room:] if room else []
+        if not keep:
+            return
+        if len(keep) < len(lines):
+            lines = [lines[i] for i in keep]
+            if info is not None:
+                info = tuple([column[i] for i in keep] for column in info)
+        history.prepend(lines, info)
+        self._history_cursor += len(lines)
+        for index in self._indexes():
+            index.stale = True
+
+    @property
+    def _journaling(self):
+        # the journal appends text, binary history files are written whole
+        return (self.journal or self.shared) and \
+            not self._binary_name(self.history_filename)
+
+    def _journal_for(self, filename):
+        journal = self._journal
+        if journal is None or journal.filename != filename or \
+                journal.closed or journal.shared != self.shared or \
+                journal.encoding != self._encoding():
+            if journal is not None:
+                journal.close()
+            journal = self._journal = HistoryJournal(
+                filename, self._history_length, self.journal_fsync,
+                shared=self.shared, encoding=self.encoding)
+        journal.fsync = self.journal_fsync
+        return journal
+
+    def merge_shared_history(self):
+        """Append the lines other sessions added to the shared history file
+        since the last merge. Nothing is merged while moving through the
+        history, so the cursor keeps pointing at the same line."""
+        if not self.shared or self._history_cursor != len(self.history):
+            return
+        for line in self._journal_for(self.history_filename).pull():
+            self._add(line)
+
+    def close_journal(self):
+        """Write the lines still queued for the journal and stop its
+        thread."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _append(self, line, info=None):
+        id = self.history.append(line, info)
+        self._index_add(line, id)
+        self._trim()
+
+    def _add_lines(self, lines, info=None):
+        """Add lines read from a file, like _add for each of them. info is
+        None or the columns (timestamps, sessions, exits) of the lines."""
+        if self.ignorespace or self.ignoredups or self._line_index is not None:
+            for i, line in enumerate(lines):
+                self._add(line, info and tuple(column[i] for column in info))
+            return
+        if not all(lines):
+            keep = [i for i, line in enumerate(lines) if line]
+            lines = [lines[i] for i in keep]
+            if info is not None:
+                info = tuple([column[i] for i in keep] for column in info)
+        if 0 <= self._max_entries < len(lines):
+            # only the last max_entries lines would survive _trim
+            start = len(lines) - self._max_entries
+            lines = lines[start:]
+            if info is not None:
+                info = tuple(column[start:] for column in info)
+        self.history.extend(lines, info)
+        # built in one pass by the first search that needs them
+        for index in self._indexes():
+            index.stale = True
+        self._trim()
         self.history_cursor = len(self.history)
 
+    def _trim(self):
+        """Drop the oldest entries beyond max_entries. The cursor moves
+        along with the entry it points at."""
+        if self._max_entries < 0:
+            return
+        while len(self.history) > self._max_entries:
+            self._index_discard(*self.history.peekleft())
+            self.history.popleft()
+            if self._history_cursor > 0:
+                self._history_cursor -= 1
+
     def previous_history(self, current):  # (C-p)
         """Move back through the history list, fetching the previous command."""
+        self.merge_shared_history()
+        if self._history_cursor == 0:
+            self.finish_loading()
         if self.history_cursor == len(self.history):
-            self.history.append(
-                current.copy())  # do not use add_history since we do not want to increment cursor
+            self._append(
+                current.get_line_text())  # do not use add_history since we do not want to increment cursor
 
         if self.history_cursor:
             self.history_cursor -= 1
-            current.set_line(self.history[self.history_cursor].get_line_text())
+            current.set_line(self.history[self.history_cursor])
             current.point = lineobj.EndOfLine
 
     def next_history(self, current):  # (C-n)
         """Move forward through the history list, fetching the next command. """
         if self.history_cursor < len(self.history) - 1:
             self.history_cursor += 1
-            current.set_line(self.history[self.history_cursor].get_line_text())
+            current.set_line(self.history[self.history_cursor])
 
     def beginning_of_history(self):  # (M-<)
         """Move to the first line in the history."""
+        self.finish_loading()
         self.history_cursor = 0
         if self.history:
-            self.l_buffer = self.history[0]
+            self.l_buffer = lineobj.ReadLineTextBuffer(self.history[0])
 
     def end_of_history(self, current):  # (M->)
         """Move to the end of the input history, i.e., the line currently
         being entered."""
         self.history_cursor = len(self.history)
-        current.set_line(self.history[-1].get_line_text())
+        current.set_line(self.history[-1])
+
+    def _find_substring(self, searchfor, startpos, direction):
+        """Return the index of the first line containing searchfor, starting
+        at startpos and moving in direction, or None. Searching backward
+        never reaches the first line, searching forward stops at the last."""
+        if direction < 0:
+            first, last = min(startpos, len(self.history) - 1), 1
+        else:
+            first, last = startpos, len(self.history) - 1
+        if (first - last) * direction > 0:
+            return None
+        candidates = None
+        if self._ngram_index is not None:
+            candidates = self._fresh_index(self._ngram_index).candidates(
+                searchfor)
+        if candidates is None:
+            for idx in range(first, last + direction, direction):
+                if searchfor in self.history[idx]:
+                    return idx
+            return None
+        history = self.history
+        first = history.id_at(first)
+        last = history.id_at(last)
+        if direction < 0:
+            i = bisect_right(candidates, first) - 1
+            while i >= 0 and candidates[i] >= last:
+                idx = history.index_of(candidates[i])
+                if idx is not None and searchfor in history[idx]:
+                    return idx
+                i -= 1
+        else:
+            i = bisect_left(candidates, first)
+            while i < len(candidates) and candidates[i] <= last:
+                idx = history.index_of(candidates[i])
+                if idx is not None and searchfor in history[idx]:
+                    return idx
+                i += 1
+        return None
+
+    def begin_search(self):
+        """Merge the lines of other sessions and finish a lazy load before
+        a search. Incremental searches call this once when they start, not
+        for every key."""
+        self.merge_shared_history()
+        self.finish_loading()
 
     def reverse_search_history(self, searchfor, startpos=None):
         if startpos is None:
             startpos = self.history_cursor
         origpos = startpos
 
-        result = lineobj.ReadLineTextBuffer("")
-
-        for idx, line in list(enumerate(self.history))[startpos:0:-1]:
-            if searchfor in line:
-                startpos = idx
-                break
+        idx = self._find_substring(searchfor, startpos, -1)
+        if idx is not None:
+            startpos = idx
 
         # If we get a new search without change in search term it means
         # someone pushed ctrl-r and we should find the next match
         if self.last_search_for == searchfor and startpos > 0:
             startpos -= 1
-            for idx, line in list(enumerate(self.history))[startpos:0:-1]:
-                if searchfor in line:
-                    startpos = idx
-                    break
+            idx = self._find_substring(searchfor, startpos, -1)
+            if idx is not None:
+                startpos = idx
 
         if self.history:
-            result = self.history[startpos].get_line_text()
+            result = self.history[startpos]
         else:
             result = ""
         self.history_cursor = startpos
         self.last_search_for = searchfor
-        log("reverse_search_history: old:%d new:%d result:%r" % (
-        origpos, self.history_cursor, result))
+        if logger.enabled:
+            log("reverse_search_history: old:%d new:%d result:%r",
+                origpos, self.history_cursor, result)
         return result
 
     def forward_search_history(self, searchfor, startpos=None):
@@ -228,24 +684,20 @@ class LineHistory(object):
                 max(0, self.get_current_history_length() - 1))
         origpos = startpos
 
-        result = lineobj.ReadLineTextBuffer("")
-
-        for idx, line in list(enumerate(self.history))[startpos:]:
-            if searchfor in line:
-                startpos = idx
-                break
+        idx = self._find_substring(searchfor, startpos, 1)
+        if idx is not None:
+            startpos = idx
 
         # If we get a new search without change in search term it means
         # someone pushed ctrl-r and we should find the next match
         if self.last_search_for == searchfor and startpos < self.get_current_history_length() - 1:
             startpos += 1
-            for idx, line in list(enumerate(self.history))[startpos:]:
-                if searchfor in line:
-                    startpos = idx
-                    break
+            idx = self._find_substring(searchfor, startpos, 1)
+            if idx is not None:
+                startpos = idx
 
         if self.history:
-            result = self.history[startpos].get_line_text()
+            result = self.history[startpos]
         else:
             result = ""
         self.history_cursor = startpos
@@ -256,19 +708,29 @@ class LineHistory(object):
         try:
             if (self.lastcommand != self.history_search_forward and
                     self.lastcommand != self.history_search_backward):
+                self.begin_search()
                 self.query = ''.join(partial[0:partial.point].get_line_text())
             hcstart = max(self.history_cursor, 0)
             hc = self.history_cursor + direction
+            if self.query and self._prefix_index is not None:
+                # jump straight to the nearest match, or past the end of the
+                # history so the loop below falls through to the no match case
+                found = self._fresh_index(self._prefix_index).find(
+                    self.query, self.history.id_bound(hc), direction)
+                if found is not None:
+                    hc = self.history.index_of(found)
+                elif direction < 0:
+                    hc = -1
+                else:
+                    hc = max(hc, len(self.history))
             while (direction < 0 and hc >= 0) or (
                     direction > 0 and hc < len(self.history)):
                 h = self.history[hc]
                 if not self.query:
                     self.history_cursor = hc
-                    result = lineobj.ReadLineTextBuffer(h,
-                        point=len(h.get_line_text()))
+                    result = lineobj.ReadLineTextBuffer(h, point=len(h))
                     return result
-                elif (h.get_line_text().startswith(self.query) and (
-                    h != partial.get_line_text())):
+                elif h.startswith(self.query):
                     self.history_cursor = hc
                     result = lineobj.ReadLineTextBuffer(h, point=partial.point)
                     return result
@@ -280,7 +742,7 @@ class LineHistory(object):
                     self.history_cursor = len(self.history)
                     return lineobj.ReadLineTextBuffer("", point=0)
                 elif self.history[max(min(hcstart, len(self.history) - 1), 0)] \
-                        .get_line_text().startswith(self.query) and self.query:
+                        .startswith(self.query) and self.query:
                     return lineobj.ReadLineTextBuffer(self.history \
                         [max(min(hcstart, len(self.history) - 1), 0)],
                         point=partial.point)
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+from __future__ import print_function, unicode_literals, absolute_import
+
+import mmap
+import os
+import struct
+
+from .historyio import history_encoding, read_lines, write_lines
+from .historyjournal import _replace
+
+# file name extension of binary history files
+EXTENSION = ".bhist"
+
+MAGIC = b"PYRLHIST"
+END_MAGIC = b"PYRLINDX"
+VERSION = 1
+# magic, version
+HEADER = struct.Struct(str("<8sI"))
+# text length in bytes, timestamp, session id, exit flag
+RECORD = struct.Struct(str("<IdIB"))
+# offset of the index, number of records, end magic
+FOOTER = struct.Struct(str("<QQ8s"))
+# the columns of the index: record offset, timestamp, session id, exit flag
+COLUMNS = "QdIB"
+# entries packed or unpacked by one struct call
+CHUNK_RECORDS = 8192
+
+
+class BinaryHistoryError(Exception):
+    pass
+
+
+def is_binary_history(filename):
+    """Return True if filename starts like a binary history file."""
+    try:
+        with open(filename, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except (IOError, OSError):
+        return False
+
+
+def _column_size(code):
+    return struct.calcsize(str("<" + code))
+
+
+class BinaryHistoryFile(object):
+    """Read access to a binary history file.
+
+    The file starts with a header and holds one record per entry: the length
+    of the text, the time the entry was added, the id of the session that
+    added it and an exit flag, followed by the text in utf-8. After the
+    records comes the index, a column with the offset of every record and
+    columns with their timestamps, session ids and exit flags, and a footer
+    with the offset of the index and the number of records.
+
+    The file is memory mapped. Record i is read by looking up its offset in
+    the index without reading anything before it, a range of records by
+    unpacking the index columns with one struct call per chunk and decoding
+    the texts between the offsets.
+
+    A file whose footer is missing, e.g. because writing it was interrupted,
+    is read by walking the length prefixed records from the start.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, "rb")
+        self._map = None
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < HEADER.size:
+                raise BinaryHistoryError("%s is too short" % filename)
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+            magic, version = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != VERSION:
+                raise BinaryHistoryError("%s is not a binary history file"
+                                         % filename)
+            self._read_footer(size)
+        except Exception:
+            self.close()
+            raise
+
+    def _read_footer(self, size):
+        self._walked = None
+        entry = sum(_column_size(code) for code in COLUMNS)
+        if size >= HEADER.size + FOOTER.size:
+            index, count, magic = FOOTER.unpack_from(self._map,
+                                                     size - FOOTER.size)
+            if magic == END_MAGIC and \
+                    index + count * entry == size - FOOTER.size:
+                self.end = index
+                self._count = count
+                self._columns = []
+                for code in COLUMNS:
+                    self._columns.append((code, index))
+                    index += count * _column_size(code)
+                return
+        # no valid footer, find the records by walking them
+        walked = []
+        position = HEADER.size
+        while position + RECORD.size <= size:
+            length = RECORD.unpack_from(self._map, position)[0]
+            if position + RECORD.size + length > size:
+                break
+            walked.append(position)
+            position += RECORD.size + length
+        self._walked = walked
+        self._count = len(walked)
+        self.end = position
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def closed(self):
+        return self._map is None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def _data(self):
+        data = self._map
+        if data is None:
+            raise ValueError("%s is closed" % self.filename)
+        return data
+
+    def _column(self, column, start, stop):
+        """Return a list of the values start to stop of an index column."""
+        data = self._data()
+        if self._walked is not None:
+            if column == 0:
+                return self._walked[start:stop]
+            return [self.record(i)[column] for i in range(start, stop)]
+        code, position = self._columns[column]
+        size = _column_size(code)
+        position += start * size
+        values = []
+        for first in range(start, stop, CHUNK_RECORDS):
+            count = min(CHUNK_RECORDS, stop - first)
+            values.extend(struct.unpack_from(str("<%d%s" % (count, code)),
+                                             data, position))
+            position += count * size
+        return values
+
+    def offset(self, i):
+        """Return the position of record i in the file, or the end of the
+        records for i equal to the number of records."""
+        if i == self._count:
+            return self.end
+        if not 0 <= i < self._count:
+            raise IndexError("history index out of range")
+        return self._column(0, i, i + 1)[0]
+
+    def record(self, i):
+        """Return record i as (text, timestamp, session, exit)."""
+        if not 0 <= i < self._count:
+            raise IndexError("history index out of range")
+        data = self._data()
+        position = self.offset(i)
+        length, timestamp, session, exit = RECORD.unpack_from(data, position)
+        start = position + RECORD.size
+        text = data[start:start + length].decode("utf-8", "replace")
+        return text, timestamp, session, exit
+
+    def text(self, i):
+        return self.record(i)[0]
+
+    def columns(self, start=0, stop=None):
+        """Return (lines, info) for the records start to stop, info being
+        the lists (timestamps, sessions, exits)."""
+        if stop is None or stop > self._count:
+            stop = self._count
+        if start >= stop:
+            return [], ([], [], [])
+        if self._walked is not None:
+            records = [self.record(i) for i in range(start, stop)]
+            columns = [list(column) for column in zip(*records)]
+            return columns[0], tuple(columns[1:])
+        offsets = self._column(0, start, stop)
+        offsets.append(self.offset(stop))
+        data = self._data()
+        header = RECORD.size
+        lines = [data[offsets[i] + header:offsets[i + 1]].decode("utf-8",
+                                                                 "replace")
+                 for i in range(stop - start)]
+        return lines, tuple(self._column(column, start, stop)
+                            for column in range(1, len(COLUMNS)))
+
+    def records(self, start=0, stop=None):
+        """Return a list of the records start to stop as (text, timestamp,
+        session, exit)."""
+        lines, info = self.columns(start, stop)
+        return list(zip(lines, *info))
+
+    def tail(self, count):
+        """Return a list of the last count records."""
+        return self.records(max(0, self._count - count))
+
+
+def _default_info(count, session=0):
+    return [0.0] * count, [session] * count, [0] * count
+
+
+def _write_records(f, position, lines, info):
+    """Write lines and their info as records starting at position in the
+    file, and return the list of their offsets."""
+    offsets = []
+    chunk = []
+    pack = RECORD.pack
+    for text, timestamp, session, exit in zip(lines, *info):
+        data = text.encode("utf-8", "replace")
+        offsets.append(position)
+        chunk.append(pack(len(data), timestamp, session, exit))
+        chunk.append(data)
+        position += RECORD.size + len(data)
+        if len(chunk) >= 2 * CHUNK_RECORDS:
+            f.write(b"".join(chunk))
+            chunk = []
+    f.write(b"".join(chunk))
+    return offsets
+
+
+def _write_index(f, index, columns):
+    for code, values in zip(COLUMNS, columns):
+        for start in range(0, len(values), CHUNK_RECORDS):
+            part = values[start:start + CHUNK_RECORDS]
+            f.write(struct.pack(str("<%d%s" % (len(part), code)), *part))
+    f.write(FOOTER.pack(index, len(columns[0]), END_MAGIC))
+
+
+def write_binary(filename, lines, info=None):
+    """Write lines to a new binary history file. info is None or the lists
+    (timestamps, sessions, exits) with an item for each line.
+
+    The file is written next to filename and then replaces it, so a crash
+    while writing leaves the old file as it was."""
+    if info is None:
+        info = _default_info(len(lines))
+    temporary = filename + ".tmp"
+    try:
+        with open(temporary, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION))
+            offsets = _write_records(f, HEADER.size, lines, info)
+            _write_index(f, f.tell(), [offsets] + list(info))
+        _replace(temporary, filename)
+    except Exception:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def append_binary(filename, lines, info=None):
+    """Append lines to a binary history file. The old index is replaced by
+    one that also holds the new records."""
+    if not os.path.exists(filename) or not os.path.getsize(filename):
+        write_binary(filename, lines, info)
+        return
+    if info is None:
+        info = _default_info(len(lines))
+    with BinaryHistoryFile(filename) as history:
+        columns = [history._column(column, 0, len(history))
+                   for column in range(len(COLUMNS))]
+        end = history.end
+    with open(filename, "r+b") as f:
+        f.seek(end)
+        f.truncate()
+        columns[0].extend(_write_records(f, end, lines, info))
+        for column, values in zip(columns[1:], info):
+            column.extend(values)
+        _write_index(f, f.tell(), columns)
+
+
+def text_to_binary(source, destination, encoding=None, session=0):
+    """Convert a text history file to a binary one. The entries get
+    timestamp 0, meaning unknown."""
+    with open(source, "rb") as f:
+        lines = [line for block in read_lines(f, history_encoding(encoding))
+                 for line in block]
+    write_binary(destination, lines, _default_info(len(lines), session))
+
+
+def binary_to_text(source, destination, encoding=None):
+    """Convert a binary history file to a text one, dropping the
+    timestamps, session ids and exit flags."""
+    with BinaryHistoryFile(source) as history:
+        lines = history.columns()[0]
+    with open(destination, "wb") as f:
+        write_lines(f, lines, history_encoding(encoding))
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+from __future__ import print_function, unicode_literals, absolute_import
+
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import compress, islice
+
+# dropped slots kept at the front before the list is compacted
+MIN_COMPACT = 64
+# marks the slot of a line removed by discard_id
+_DEAD = object()
+
+
+class HistoryBuffer(object):
+    """The list of history lines, with O(1) removal of the oldest line.
+
+    Lines are kept in a list whose first slots are unused. popleft() only
+    clears a slot and moves the start past it, the unused slots are removed
+    in one go once they make up half of the list. Appending and dropping the
+    oldest line thus cost O(1) amortized while indexing stays a list lookup.
+
+    Every line also gets an id, counting up from 0 since the buffer was
+    created or cleared. The id of a line does not change when lines before
+    it are dropped or deleted, which is what the history indexes store. The
+    ids are kept in ascending order next to the lines, so the position of an
+    id is found by bisection.
+
+    Next to the ids are the info of the lines: the time they were added, the
+    id of the session that added them and an exit flag, 0 when not known.
+
+    discard_id removes a line by leaving a dead slot in its place and
+    adding its position to a sorted list. Indexing moves past the dead slots
+    before a position by bisecting that list, and the dead slots are dropped
+    in one pass once they make up half of the slots. Removing the earlier
+    copy of a line, as erasedups does on every add, thus costs O(1)
+    amortized instead of a pass over the whole history.
+    """
+
+    def __init__(self, lines=()):
+        self.clear()
+        for line in lines:
+            self.append(line)
+
+    def __len__(self):
+        return len(self._items) - self._start - len(self._dead)
+
+    def __iter__(self):
+        items = islice(self._items, self._start, None)
+        if self._dead:
+            return (item for item in items if item is not _DEAD)
+        return items
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and \
+                all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "HistoryBuffer(%r)" % list(self)
+
+    def _settle(self):
+        """Drop the dead slots left by discard_id."""
+        if not self._dead:
+            return
+        start = self._start
+        live = [item is not _DEAD for item in islice(self._items, start, None)]
+        self._items = list(compress(islice(self._items, start, None), live))
+        (self._ids, self._times, self._sessions, self._exits) = [
+            array(column.typecode, compress(column[start:], live))
+            for column in self._columns()]
+        self._start = 0
+        self._dead = []
+
+    def _position(self, index):
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("history index out of range")
+        position = self._start + index
+        # move right by the dead slots up to position until there are no more
+        skipped = 0
+        while True:
+            dead = bisect_right(self._dead, position)
+            if dead == skipped:
+                return position
+            position += dead - skipped
+            skipped = dead
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if self._dead:
+                return list(self)[index]
+            start, stop, step = index.indices(len(self))
+            if step > 0:
+                return self._items[self._start + start:self._start + stop:step]
+            return [self._items[self._start + i]
+                    for i in range(start, stop, step)]
+        position = self._position(index)
+        return self._items[position]
+
+    def __setitem__(self, index, line):
+        position = self._position(index)
+        self._items[position] = line
+
+    def __delitem__(self, index):
+        self._settle()
+        position = self._position(index)
+        del self._items[position]
+        for column in self._columns():
+            del column[position]
+
+    def _columns(self):
+        return self._ids, self._times, self._sessions, self._exits
+
+    def info(self, index):
+        """Return (timestamp, session, exit) of the line at index."""
+        position = self._position(index)
+        return (self._times[position], self._sessions[position],
+                self._exits[position])
+
+    def set_info(self, index, info):
+        position = self._position(index)
+        (self._times[position], self._sessions[position],
+         self._exits[position]) = info
+
+    def info_columns(self, start=0, stop=None):
+        """Return the lists (timestamps, sessions, exits) of the lines start
+        to stop."""
+        start, stop, step = slice(start, stop).indices(len(self))
+        if self._dead:
+            live = list(self._live_positions())[start:stop]
+            return tuple([column[position] for position in live]
+                         for column in self._columns()[1:])
+        start += self._start
+        stop += self._start
+        return tuple(column[start:stop].tolist()
+                     for column in self._columns()[1:])
+
+    def _live_positions(self):
+        items = self._items
+        return (position for position in range(self._start, len(items))
+                if items[position] is not _DEAD)
+
+    def _add_info(self, info, count):
+        """Add info, None or the columns (timestamps, sessions, exits), for
+        count lines."""
+        if info is None:
+            info = [0.0] * count, [0] * count, [0] * count
+        for column, values in zip(self._columns()[1:], info):
+            column.extend(values)
+
+    @property
+    def first_id(self):
+        """The id of the oldest line, or the id the next line will get."""
+        if len(self):
+            self._skip_dead()
+            return self._ids[self._start]
+        return self._next_id
+
+    def id_at(self, index):
+        """Return the id of the line at index."""
+        position = self._position(index)
+        return self._ids[position]
+
+    def ids(self):
+        """Return an iterator over the ids of the lines, oldest first."""
+        ids = islice(self._ids, self._start, None)
+        if self._dead:
+            return compress(ids, (item is not _DEAD for item in
+                                  islice(self._items, self._start, None)))
+        return ids
+
+    def id_bound(self, index):
+        """Like id_at, but for an index past either end return an id past
+        the ids of the lines on that side."""
+        if index < 0:
+            return self.first_id - 1
+        if index >= len(self):
+            return self._next_id
+        return self._ids[self._position(index)]
+
+    def index_of(self, id):
+        """Return the index of the line with id, or None if it is gone."""
+        position = bisect_left(self._ids, id, self._start)
+        if position < len(self._ids) and self._ids[position] == id and \
+                self._items[position] is not _DEAD:
+            return position - self._start - bisect_left(self._dead, position)
+        return None
+
+    def append(self, line, info=None):
+        """Append line, with info (timestamp, session, exit), and return its
+        id."""
+        id = self._next_id
+        self._next_id += 1
+        self._items.append(line)
+        self._ids.append(id)
+        self._times.append(info[0] if info else 0.0)
+        self._sessions.append(info[1] if info else 0)
+        self._exits.append(info[2] if info else 0)
+        return id
+
+    def prepend(self, lines, info=None):
+        """Insert lines before the oldest line. They get the ids just below
+        first_id, which may be negative. info is None or the columns
+        (timestamps, sessions, exits) of the lines."""
+        self._settle()
+        first = self.first_id
+        start = self._start
+        columns = self._columns()
+        self._items[:start] = lines
+        for column in columns:
+            del column[:start]
+        new = HistoryBuffer()
+        new._add_info(info, len(lines))
+        new._ids.extend(range(first - len(lines), first))
+        for column, values in zip(columns, new._columns()):
+            column[:0] = values
+        self._start = 0
+
+    def extend(self, lines, info=None):
+        """Append lines and return the id of the first of them. info is None
+        or the columns (timestamps, sessions, exits) of the lines."""
+        first = self._next_id
+        self._items.extend(lines)
+        self._ids.extend(range(first, first + len(lines)))
+        self._add_info(info, len(lines))
+        self._next_id += len(lines)
+        return first
+
+    def discard_id(self, id):
+        """Remove the line with id, if it is still there."""
+        position = bisect_left(self._ids, id, self._start)
+        if position < len(self._ids) and self._ids[position] == id and \
+                self._items[position] is not _DEAD:
+            self._items[position] = _DEAD
+            insort(self._dead, position)
+            if 2 * len(self._dead) > len(self._items) - self._start:
+                self._settle()
+
+    def last(self):
+        """Return the newest line."""
+        for position in range(len(self._items) - 1, self._start - 1, -1):
+            if self._items[position] is not _DEAD:
+                return self._items[position]
+        raise IndexError("history is empty")
+
+    def peekleft(self):
+        """Return (line, id) of the oldest line."""
+        if not len(self):
+            raise IndexError("history is empty")
+        self._skip_dead()
+        return self._items[self._start], self._ids[self._start]
+
+    def _skip_dead(self):
+        while self._items[self._start] is _DEAD:
+            self._items[self._start] = None
+            self._start += 1
+            del self._dead[0]
+
+    def popleft(self):
+        """Remove and return the oldest line."""
+        if not len(self):
+            raise IndexError("pop from empty history")
+        self._skip_dead()
+        line = self._items[self._start]
+        self._items[self._start] = None
+        self._start += 1
+        if self._start >= MIN_COMPACT and 2 * self._start >= len(self._items):
+            if self._dead:
+                self._settle()
+                return line
+            del self._items[:self._start]
+            for column in self._columns():
+                del column[:self._start]
+            self._start = 0
+        return line
+
+    def clear(self):
+        self._items = []
+        self._ids = array(str("l"))
+        self._times = array(str("d"))
+        self._sessions = array(str("L"))
+        self._exits = array(str("B"))
+        self._start = 0
+        self._dead = []
+        self._next_id = 0
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+from __future__ import print_function, unicode_literals, absolute_import
+
+from bisect import bisect_left, bisect_right, insort
+from itertools import count
+
+
+def _discard_position(positions, position):
+    i = bisect_left(positions, position)
+    if i < len(positions) and positions[i] == position:
+        del positions[i]
+
+
+class HistoryIndex(object):
+    """Base class for indexes over the text of the history entries.
+
+    An index that can not be updated incrementally, e.g. because positions
+    were shifted by a removal, is marked stale and rebuilt by its owner before
+    it is used again.
+    """
+
+    def __init__(self):
+        self.stale = False
+        self.clear()
+
+    def clear(self):
+        raise NotImplementedError
+
+    def add(self, text, position):
+        raise NotImplementedError
+
+    def discard(self, text, position):
+        raise NotImplementedError
+
+    def rebuild(self, texts, positions=None):
+        """Rebuild the index from an iterable of texts in history order and
+        an iterable of their ascending positions, by default 0, 1, 2..."""
+        self.clear()
+        if positions is None:
+            positions = count()
+        for position, text in zip(positions, texts):
+            self.add(text, position)
+        self.stale = False
+
+
+class LineIndex(HistoryIndex):
+    """Map history text to the ascending list of positions holding that
+    text, so the earlier copies of a line are found without a scan."""
+
+    def clear(self):
+        self._positions = {}
+
+    def add(self, text, position):
+        positions = self._positions.get(text)
+        if positions is None:
+            self._positions[text] = [position]
+        elif positions[-1] < position:
+            positions.append(position)
+        else:
+            insort(positions, position)
+
+    def discard(self, text, position):
+        positions = self._positions.get(text)
+        if not positions:
+            return
+        _discard_position(positions, position)
+        if not positions:
+            del self._positions[text]
+
+    def positions(self, text):
+        """Return a list of the positions holding text."""
+        return list(self._positions.get(text, ()))
+
+
+class PrefixIndex(HistoryIndex):
+    """Map history text to the history positions holding that text.
+
+    The distinct texts are kept in a sorted list so all texts starting with a
+    given prefix form one contiguous run that can be found by bisection. Each
+    text maps to an ascending list of positions, which makes finding the
+    nearest match in either direction a second bisection.
+
+    rebuild sorts the distinct texts once. A text whose last position is
+    discarded keeps its slot in the sorted list with an empty list of
+    positions, the dead slots are dropped in one pass once they make up half
+    of the list.
+    """
+
+    def clear(self):
+        self._keys = []
+        self._positions = {}
+        self._dead = 0
+
+    def rebuild(self, texts, positions=None):
+        self.clear()
+        if positions is None:
+            positions = count()
+        index = self._positions
+        for position, text in zip(positions, texts):
+            found = index.get(text)
+            if found is None:
+                index[text] = [position]
+            else:
+                found.append(position)
+        self._keys = sorted(index)
+        self.stale = False
+
+    def add(self, text, position):
+        positions = self._positions.get(text)
+        if positions is None:
+            insort(self._keys, text)
+            self._positions[text] = [position]
+        elif not positions:
+            positions.append(position)
+            self._dead -= 1
+        elif positions[-1] < position:
+            positions.append(position)
+        else:
+            insort(positions, position)
+
+    def discard(self, text, position):
+        positions = self._positions.get(text)
+        if not positions:
+            return
+        _discard_position(positions, position)
+        if not positions:
+            self._dead += 1
+            if 2 * self._dead > len(self._keys):
+                self._compact()
+
+    def _compact(self):
+        index = self._positions
+        self._keys = [key for key in self._keys if index[key]]
+        self._positions = dict((key, index[key]) for key in self._keys)
+        self._dead = 0
+
+    def find(self, prefix, start, direction):
+        """Return the position nearest to start, moving in direction, whose
+        text starts with prefix. start itself is included. Returns None if
+        there is no such position."""
+        keys = self._keys
+        best = None
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and keys[i].startswith(prefix):
+            positions = self._positions[keys[i]]
+            if direction < 0:
+                j = bisect_right(positions, start) - 1
+                if j >= 0 and (best is None or positions[j] > best):
+                    best = positions[j]
+            else:
+                j = bisect_left(positions, start)
+                if j < len(positions) and (best is None or positions[j] < best):
+                    best = positions[j]
+            i += 1
+        return best
+
+
+class NgramIndex(HistoryIndex):
+    """Inverted index from every n character substring of the history text
+    to the ascending list of positions containing it.
+
+    A line can only contain a query if it contains all n-grams of the query,
+    so the posting list of the rarest n-gram of the query is a small superset
+    of the matching positions. The candidates still have to be checked.
+
+    discard leaves the position in the posting lists, so candidates may also
+    hold positions that are gone. Once more positions were discarded than
+    there are left the index marks itself stale to be rebuilt.
+    """
+
+    def __init__(self, n=3):
+        self.n = n
+        super(NgramIndex, self).__init__()
+
+    def clear(self):
+        self._postings = {}
+        self._size = 0
+        self._garbage = 0
+
+    def _grams(self, text):
+        n = self.n
+        return set(text[i:i + n] for i in range(len(text) - n + 1))
+
+    def add(self, text, position):
+        postings = self._postings
+        self._size += 1
+        for gram in self._grams(text):
+            positions = postings.get(gram)
+            if positions is None:
+                postings[gram] = [position]
+            elif positions[-1] < position:
+                positions.append(position)
+            else:
+                insort(positions, position)
+
+    def discard(self, text, position):
+        self._size -= 1
+        self._garbage += 1
+        if self._garbage > self._size:
+            self.stale = True
+
+    def candidates(self, query):
+        """Return an ascending list of positions that may contain query, or
+        None if query is too short to be looked up in the index."""
+        if len(query) < self.n:
+            return None
+        best = None
+        for gram in self._grams(query):
+            positions = self._postings.get(gram)
+            if not positions:
+                return []
+            if best is None or len(positions) < len(best):
+                best = positions
+        return best
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+from __future__ import print_function, unicode_literals, absolute_import
+
+import codecs
+
+from .. import unicode_helper
+
+# lines joined and encoded by one codec call
+CHUNK_LINES = 8192
+# bytes decoded by one codec call
+BLOCK_SIZE = 1 << 20
+
+
+def history_encoding(encoding=None):
+    """Return the codec name to use for a history file, the console code
+    page when encoding is None, ascii when the name is unknown."""
+    encoding = encoding or unicode_helper.pyreadline_codepage
+    try:
+        return codecs.lookup(encoding).name
+    except (LookupError, TypeError):
+        return "ascii"
+
+
+def encode_lines(lines, encoding):
+    """Return lines encoded as one newline terminated block of bytes."""
+    if not lines:
+        return b""
+    return ("\n".join(lines) + "\n").encode(encoding, "replace")
+
+
+def write_lines(f, lines, encoding):
+    """Write lines to the binary file f. Each chunk of CHUNK_LINES lines is
+    joined and encoded with one codec call and written with one write."""
+    for start in range(0, len(lines), CHUNK_LINES):
+        f.write(encode_lines(lines[start:start + CHUNK_LINES], encoding))
+
+
+def split_lines(text):
+    """Return the non empty lines of text with trailing white space
+    removed."""
+    return list(filter(None, map(type(text).rstrip, text.split("\n"))))
+
+
+def decode_lines(data, encoding):
+    """Decode data, a number of complete lines, and return the non empty
+    lines."""
+    return split_lines(data.decode(encoding, "replace"))
+
+
+def read_lines(f, encoding):
+    """Read the binary file f a block at a time and yield the list of non
+    empty lines completed by each block. Each block is decoded with one call
+    of an incremental decoder, so characters split between blocks are
+    decoded correctly."""
+    decoder = codecs.getincrementaldecoder(encoding)("replace")
+    rest = ""
+    while True:
+        data = f.read(BLOCK_SIZE)
+        text = rest + decoder.decode(data, not data)
+        if not data:
+            break
+        end = text.rfind("\n") + 1
+        rest = text[end:]
+        if end:
+            yield split_lines(text[:end])
+    if text:
+        yield split_lines(text)
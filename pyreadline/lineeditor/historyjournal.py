@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+from __future__ import print_function, unicode_literals, absolute_import
+
+import atexit
+import os
+import threading
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+from ..logger import log
+from .historyio import history_encoding, encode_lines, decode_lines
+
+# bytes read at a time when counting the lines of the file
+CHUNK_SIZE = 1 << 20
+
+
+def _replace(source, destination):
+    if hasattr(os, "replace"):
+        os.replace(source, destination)
+    else:  # Python 2, rename does not overwrite on Windows
+        if os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+def count_lines(filename):
+    """Return the number of lines in filename, 0 if it can not be read."""
+    count = 0
+    try:
+        with open(filename, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                count += chunk.count(b"\n")
+    except (IOError, OSError):
+        return 0
+    return count
+
+
+class FileLock(object):
+    """Exclusive lock on filename, held for the duration of a with block.
+    Used as a lock file next to a shared history file, so only one session
+    at a time appends to or compacts it."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = None
+
+    def __enter__(self):
+        f = open(self.filename, "a+b")
+        try:
+            if msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        except (IOError, OSError):
+            f.close()
+            raise
+        self._file = f
+        return self
+
+    def __exit__(self, *exc_info):
+        f, self._file = self._file, None
+        try:
+            if msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        finally:
+            f.close()
+
+
+class HistoryJournal(object):
+    """Append history lines to a file from a background thread.
+
+    append() only queues the line. The writer thread waits interval seconds
+    after the first queued line so that lines accepted close together are
+    written with one write call, then appends them to the file and, with
+    fsync set, asks the operating system to put them on disk. A crash loses
+    at most the lines of the last interval.
+
+    When the file has grown to twice history_length lines it is compacted to
+    the last history_length lines, written to a temporary file that then
+    replaces it. A negative history_length means the file is never
+    compacted.
+
+    close() stops the thread and writes the lines still queued, it is also
+    run at exit.
+
+    With shared set several sessions may journal to the same file. Appends
+    and compaction are done while holding a lock on filename + '.lock'. The
+    journal remembers the offset in the file up to which it has read, and
+    pull() returns the lines other sessions appended after it by reading
+    only the new bytes. Before each append the writer thread reads the lines
+    appended by others, so its own lines are never read back. When another
+    session compacted the file the lines appended between the last read and
+    the compaction are not seen, reading goes on from the end of the new
+    file.
+    """
+
+    def __init__(self, filename, history_length=-1, fsync=False,
+                 interval=0.5, shared=False, encoding=None):
+        self.filename = filename
+        self.encoding = history_encoding(encoding)
+        self.history_length = history_length
+        self.fsync = fsync
+        self.interval = interval
+        self.shared = shared
+        self.offset = None  # bytes of the file read by pull
+        self._identity = None  # (st_dev, st_ino) of the file at offset
+        self._partial = b""  # start of a line still being written
+        self._incoming = []  # lines of other sessions read by the thread
+        self._pending = []
+        self._lines = None  # lines in the file, counted on the first write
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name="pyreadline history journal")
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def closed(self):
+        return self._stop.is_set()
+
+    def append(self, line):
+        """Queue line to be appended to the file."""
+        with self._pending_lock:
+            self._pending.append(line)
+        if self._stop.is_set():
+            self.flush()
+        else:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write the queued lines now."""
+        with self._write_lock:
+            with self._pending_lock:
+                lines, self._pending = self._pending, []
+            if lines:
+                self._write(lines)
+
+    def pull(self, reset=False):
+        """Return the lines other sessions appended since the last pull.
+        With reset the whole file is read. The first pull without reset
+        only starts reading at the current end of the file."""
+        with self._write_lock:
+            if reset:
+                self.offset = 0
+                self._identity = None
+                self._partial = b""
+                self._incoming = []
+            lines = self._incoming + self._read_new()
+            self._incoming = []
+        return lines
+
+    def close(self):
+        """Stop the writer thread and write the queued lines."""
+        if not self._stop.is_set():
+            self._stop.set()
+            self._wakeup.set()
+            if self._thread is not threading.current_thread():
+                self._thread.join(self.interval + 1.0)
+            if hasattr(atexit, "unregister"):  # not in Python 2
+                atexit.unregister(self.close)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # gather the lines accepted in the next interval into one write
+            self._stop.wait(self.interval)
+            self.flush()
+
+    def _write(self, lines):
+        data = encode_lines(lines, self.encoding)
+        try:
+            if self.shared:
+                with FileLock(self.filename + ".lock"):
+                    self._incoming.extend(self._read_new())
+                    self._append(data, len(lines))
+                    st = os.stat(self.filename)
+                    self.offset = st.st_size
+                    self._identity = (st.st_dev, st.st_ino)
+            else:
+                self._append(data, len(lines))
+        except (IOError, OSError) as err:
+            log("history journal: can not write %s: %s", self.filename, err)
+            self._lines = None
+
+    def _append(self, data, count):
+        if self._lines is None:
+            self._lines = count_lines(self.filename)
+        with open(self.filename, "ab") as f:
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._lines += count
+        if 0 <= self.history_length and \
+                self._lines >= 2 * max(self.history_length, 1):
+            self._compact()
+
+    def _read_new(self):
+        """Read the bytes appended after offset and return the complete
+        lines among them."""
+        try:
+            with open(self.filename, "rb") as f:
+                st = os.fstat(f.fileno())
+                identity = (st.st_dev, st.st_ino)
+                if self.offset is None or self._identity is not None and (
+                        identity != self._identity or
+                        st.st_size < self.offset):
+                    if self.offset is not None:
+                        log("history journal: %s was replaced",
+                            self.filename)
+                    self.offset = st.st_size
+                    self._identity = identity
+                    self._partial = b""
+                    self._lines = None
+                    return []
+                self._identity = identity
+                f.seek(self.offset)
+                data = f.read()
+        except (IOError, OSError):
+            return []
+        self.offset += len(data)
+        data = self._partial + data
+        end = data.rfind(b"\n") + 1
+        self._partial = data[end:]
+        if self._lines is not None:
+            self._lines += data.count(b"\n", 0, end)
+        return decode_lines(data[:end], self.encoding)
+
+    def _compact(self):
+        with open(self.filename, "rb") as f:
+            lines = f.read().split(b"\n")
+        # only newlines end lines, like in read_lines and count_lines
+        rest = lines.pop()
+        lines = [line + b"\n" for line in lines]
+        if rest:
+            lines.append(rest)
+        keep = lines[-self.history_length:] if self.history_length else []
+        temporary = self.filename + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(b"".join(keep))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        _replace(temporary, self.filename)
+        self._lines = len(keep)
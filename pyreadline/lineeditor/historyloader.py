@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+from __future__ import print_function, unicode_literals, absolute_import
+
+import os
+import threading
+
+from ..logger import log
+from .historyio import history_encoding, decode_lines
+
+# bytes read at a time when looking for the start of the tail
+BLOCK_SIZE = 1 << 16
+
+
+def read_tail(filename, count, encoding=None):
+    """Return (offset, lines) for the last count non empty lines of filename,
+    offset being the position in the file where the first of them starts.
+    Only the end of the file is read, a block at a time."""
+    with open(filename, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        offset = f.tell()
+        data = b""
+        newlines = 0
+        while offset > 0:
+            size = min(BLOCK_SIZE, offset)
+            offset -= size
+            f.seek(offset)
+            block = f.read(size)
+            data = block + data
+            newlines += block.count(b"\n")
+            # one more newline than lines wanted marks the start of the tail,
+            # unless some of the lines are blank
+            if newlines > count:
+                lines = data.split(b"\n")[1:]
+                if sum(1 for line in lines if line.strip()) >= count:
+                    break
+    if offset > 0:
+        # skip the end of the line the first block started in
+        start = data.index(b"\n") + 1
+        offset += start
+        data = data[start:]
+    lines = data.split(b"\n")
+    start = len(lines)
+    found = 0
+    while start > 0 and found < count:
+        start -= 1
+        if lines[start].strip():
+            found += 1
+    offset += sum(len(line) + 1 for line in lines[:start])
+    return offset, decode_lines(b"\n".join(lines[start:]),
+                                history_encoding(encoding))
+
+
+def read_head(filename, offset, encoding=None):
+    """Return (lines, None) for the non empty lines of filename before
+    offset."""
+    with open(filename, "rb") as f:
+        data = f.read(offset)
+    return decode_lines(data, history_encoding(encoding)), None
+
+
+class HistoryLoader(object):
+    """Call read(*args) on a background thread, by default read_head to read
+    the lines of a text history file before an offset.
+
+    wait() returns what read returned once it is done, (lines, info) with
+    info None or the columns (timestamps, sessions, exits) of the lines, or
+    ([], None) if the file could not be read.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.read = kwargs.pop("read", read_head)
+        self.args = args
+        self.kwargs = kwargs
+        self._result = [], None
+        self._thread = threading.Thread(target=self._run,
+                                        name="pyreadline history loader")
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def done(self):
+        return not self._thread.is_alive()
+
+    def wait(self):
+        self._thread.join()
+        return self._result
+
+    def _run(self):
+        try:
+            self._result = self.read(*self.args, **self.kwargs)
+        except (IOError, OSError, ValueError) as err:
+            log("history loader: can not read %r: %s", self.args, err)
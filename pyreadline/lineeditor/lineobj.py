@@ -8,11 +8,14 @@
 from __future__ import print_function, unicode_literals, absolute_import
 
 from . import wordmatcher
+from .gapbuffer import GapBuffer
+from .undo import UndoHistory
 from .. import clipboard
 from ..error import ReadlineError
 from ..unicode_helper import ensure_unicode, biter
 
 kill_ring_to_clipboard = False  # set to true to copy every addition to kill ring to clipboard
+undo_memory_limit = 1000000  # bytes kept for undo per line buffer, -1 means no limit
 
 
 class NotAWordError(IndexError):
@@ -55,8 +58,8 @@ PrevChar = PrevChar()
 
 class NextWordStart(LinePositioner):
     def __call__(self, line):
-        return line.next_start_segment(line.line_buffer, line.is_word_token)[
-            line.point]
+        return line.next_start_index(line.line_buffer, line.point,
+            line.is_word_token)
 
 
 NextWordStart = NextWordStart()
@@ -64,8 +67,8 @@ NextWordStart = NextWordStart()
 
 class NextWordEnd(LinePositioner):
     def __call__(self, line):
-        return line.next_end_segment(line.line_buffer, line.is_word_token)[
-            line.point]
+        return line.next_end_index(line.line_buffer, line.point,
+            line.is_word_token)
 
 
 NextWordEnd = NextWordEnd()
@@ -73,8 +76,8 @@ NextWordEnd = NextWordEnd()
 
 class PrevWordStart(LinePositioner):
     def __call__(self, line):
-        return line.prev_start_segment(line.line_buffer, line.is_word_token)[
-            line.point]
+        return line.prev_start_index(line.line_buffer, line.point,
+            line.is_word_token)
 
 
 PrevWordStart = PrevWordStart()
@@ -114,8 +117,8 @@ WordEnd = WordEnd()
 
 class PrevWordEnd(LinePositioner):
     def __call__(self, line):
-        return line.prev_end_segment(line.line_buffer, line.is_word_token)[
-            line.point]
+        return line.prev_end_index(line.line_buffer, line.point,
+            line.is_word_token)
 
 
 PrevWordEnd = PrevWordEnd()
@@ -123,11 +126,11 @@ PrevWordEnd = PrevWordEnd()
 
 class PrevSpace(LinePositioner):
     def __call__(self, line):
+        buf = line.line_buffer
         point = line.point
-        if line[point - 1:point].get_line_text() == " ":
-            while point > 0 and line[point - 1:point].get_line_text() == " ":
-                point -= 1
-        while point > 0 and line[point - 1:point].get_line_text() != " ":
+        while point > 0 and buf[point - 1] == " ":
+            point -= 1
+        while point > 0 and buf[point - 1] != " ":
             point -= 1
         return point
 
@@ -221,13 +224,13 @@ PointSlice = PointSlice()
 
 class TextLine(object):
     def __init__(self, txtstr, point=None, mark=None):
-        self.line_buffer = []
+        self._line_buffer = GapBuffer()
         self._point = 0
         self.mark = -1
-        self.undo_stack = []
+        self._undo = None  # UndoHistory, made by the first push_undo
         self.overwrite = False
         if isinstance(txtstr, TextLine):  # copy
-            self.line_buffer = txtstr.line_buffer[:]
+            self.line_buffer = txtstr.line_buffer
             self.point = point or txtstr.point
             self.mark = mark or txtstr.mark
         else:
@@ -236,39 +239,48 @@ class TextLine(object):
             self.mark = mark or -1
 
         self.is_word_token = wordmatcher.is_word_token
-        self.next_start_segment = wordmatcher.next_start_segment
-        self.next_end_segment = wordmatcher.next_end_segment
-        self.prev_start_segment = wordmatcher.prev_start_segment
-        self.prev_end_segment = wordmatcher.prev_end_segment
+        self.next_start_index = wordmatcher.next_start_index
+        self.next_end_index = wordmatcher.next_end_index
+        self.prev_start_index = wordmatcher.prev_start_index
+        self.prev_end_index = wordmatcher.prev_end_index
 
     def push_undo(self):
-        ltext = self.get_line_text()
-        if self.undo_stack and ltext == self.undo_stack[-1].get_line_text():
-            self.undo_stack[-1].point = self.point
-        else:
-            self.undo_stack.append(self.copy())
+        if self._undo is None:
+            self._undo = UndoHistory(undo_memory_limit)
+        self._undo.push(self.get_line_text(), self.point, self.mark)
 
     def pop_undo(self):
-        if len(self.undo_stack) >= 2:
-            self.undo_stack.pop()
+        if self._undo is not None and len(self._undo) >= 2:
+            self._undo.pop()
             self.set_top_undo()
-            self.undo_stack.pop()
+            self._undo.pop()
         else:
-            self.reset_line()
-            self.undo_stack = []
+            self.revert_undo()
 
     def set_top_undo(self):
-        if self.undo_stack:
-            undo = self.undo_stack[-1]
-            self.line_buffer = undo.line_buffer
-            self.point = undo.point
-            self.mark = undo.mark
-        else:
-            pass
+        if self._undo is not None and len(self._undo):
+            self.line_buffer, self.point, self.mark = self._undo.top()
+
+    def revert_undo(self):
+        """Undo all changes, the same as calling pop_undo until there is
+        nothing left to undo."""
+        self.reset_line()
+        if self._undo is not None:
+            self._undo.clear()
 
     def __repr__(self):
         return 'TextLine("%s",point=%s,mark=%s)' % (
-            self.line_buffer, self.point, self.mark)
+            self.line_buffer.tolist(), self.point, self.mark)
+
+    def get_line_buffer(self):
+        return self._line_buffer
+
+    def set_line_buffer(self, value):
+        """Replace the characters with a copy of value, which may be any
+        sequence of characters."""
+        self._line_buffer = GapBuffer(value)
+
+    line_buffer = property(get_line_buffer, set_line_buffer)
 
     def copy(self):
         return self.__class__(self)
@@ -298,9 +310,7 @@ class TextLine(object):
         return ''.join(map(ensure_unicode, quoted))
 
     def get_line_text(self):
-        buf = self.line_buffer
-        buf = list(map(ensure_unicode, buf))
-        return ''.join(buf)
+        return self.line_buffer.text()
 
     def set_line(self, text, cursor=None):
         self.line_buffer = [c for c in str(text)]
@@ -324,9 +334,9 @@ class TextLine(object):
                 self.line_buffer[self.point] = c
                 self.point += 1
         else:
-            for c in biter(text):
-                self.line_buffer.insert(self.point, c)
-                self.point += 1
+            chars = list(biter(text))
+            self.line_buffer[self.point:self.point] = chars
+            self.point += len(chars)
 
     def __getitem__(self, key):
         # Check if key is LineSlice, convert to regular slice
@@ -382,9 +392,7 @@ class TextLine(object):
         else:
             start = key
             stop = key + 1
-        prev = self.line_buffer[:start]
-        rest = self.line_buffer[stop:]
-        self.line_buffer = prev + rest
+        self._replace(start, stop, [])
         if point > stop:
             self.point = point - (stop - start)
         elif start <= point <= stop:
@@ -402,13 +410,22 @@ class TextLine(object):
         else:
             start = key
             stop = key + 1
-        prev = self.line_buffer[:start]
-        value = self.__class__(value).line_buffer
-        rest = self.line_buffer[stop:]
-        out = prev + value + rest
-        if len(out) >= len(self):
-            self.point = len(self)
-        self.line_buffer = out
+        length = len(self)
+        self._replace(start, stop, self.__class__(value).line_buffer)
+        if len(self) >= length:
+            self.point = length
+
+    def _replace(self, start, stop, value):
+        """Same as line_buffer[:start] + value + line_buffer[stop:] but done
+        in place. If stop is before start the overlap ends up twice, like it
+        does with the concatenation."""
+        buf = self.line_buffer
+        start = slice(None, start).indices(len(buf))[1]
+        stop = slice(stop, None).indices(len(buf))[0]
+        if stop >= start:
+            buf[start:stop] = value
+        else:
+            buf[start:start] = list(value) + buf[stop:start]
 
     def __len__(self):
         return len(self.line_buffer)
@@ -446,7 +463,8 @@ class ReadLineTextBuffer(TextLine):
     def __repr__(self):
         return 'ReadLineTextBuffer' \
                '("%s",point=%s,mark=%s,selection_mark=%s)' % \
-               (self.line_buffer, self.point, self.mark, self.selection_mark)
+               (self.line_buffer.tolist(), self.point, self.mark,
+                self.selection_mark)
 
     def insert_text(self, char, argument=1):
         self.delete_selection()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+from __future__ import print_function, unicode_literals, absolute_import
+
+
+def is_plain(text):
+    """True if every character of text takes exactly one console cell, so
+    cell positions can be computed without asking the console."""
+    for c in text:
+        o = ord(c)
+        if o < 32 or o == 127 or 0x2013 <= o <= 0xFFFD:
+            return False
+    return True
+
+
+def make_cells(text, spans):
+    """Return a list of (char, attr) for text. spans is a list of
+    (start, stop, attr) covering text."""
+    cells = []
+    for start, stop, attr in spans:
+        cells.extend((c, attr) for c in text[start:stop])
+    return cells
+
+
+class LineRenderer(object):
+    """Remember what was drawn after the prompt and redraw only the cells
+    that changed.
+
+    state is whatever the caller uses to decide that the screen still looks
+    like it did after the last draw (prompt, its position, console size).
+    When it differs, or after invalidate(), the caller has to draw the line
+    itself and report it with drawn().
+    """
+
+    def __init__(self, console):
+        self.console = console
+        self.invalidate()
+
+    def invalidate(self):
+        self.state = None
+        self.origin = None
+        self.cells = None
+
+    def drawn(self, state, origin, cells):
+        """Record that cells are on screen starting at origin. cells may be
+        None if the line can not be tracked."""
+        if cells is None:
+            self.invalidate()
+        else:
+            self.state = state
+            self.origin = origin
+            self.cells = cells
+
+    def can_update(self, state, cells):
+        return (cells is not None and self.cells is not None and
+                state == self.state)
+
+    def position(self, index):
+        """Screen position of cell index."""
+        x, y = self.origin
+        w, h = self.console.size()
+        x += index
+        return x % w, y + x // w
+
+    def update(self, cells):
+        """Write the cells that differ from the last draw. Returns the number
+        of lines the console scrolled."""
+        old = self.cells
+        common = min(len(old), len(cells))
+        first = 0
+        while first < common and old[first] == cells[first]:
+            first += 1
+        if len(old) == len(cells):
+            last = len(cells)
+            while last > first and old[last - 1] == cells[last - 1]:
+                last -= 1
+        else:
+            last = len(cells)
+
+        c = self.console
+        scroll = 0
+        if first < last:
+            c.pos(*self.position(first))
+            start = first
+            while start < last:
+                attr = cells[start][1]
+                stop = start + 1
+                while stop < last and cells[stop][1] == attr:
+                    stop += 1
+                text = "".join(ch for ch, a in cells[start:stop])
+                scroll += c.write_scrolling(text, attr)
+                start = stop
+        if len(cells) < len(old):
+            # blank the cells the shorter line no longer covers
+            if not first < last:
+                c.pos(*self.position(len(cells)))
+            scroll += c.write_scrolling(" " * (len(old) - len(cells)))
+
+        if scroll:
+            x, y = self.origin
+            self.origin = (x, y - scroll)
+        self.cells = cells
+        return scroll
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+# *****************************************************************************
+#       Copyright (C) 2006  Jorgen Stenarson. <jorgen.stenarson@bostream.nu>
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+# *****************************************************************************
+from __future__ import print_function, unicode_literals, absolute_import
+
+import sys
+from collections import deque
+
+# rough size in bytes of a record without the text it keeps
+RECORD_OVERHEAD = 64
+
+
+class _Edit(object):
+    """One older state: the text of the state above it with
+    text[start:stop] replaced by inserted."""
+    __slots__ = ("start", "stop", "inserted", "point", "mark", "size")
+
+    def __init__(self, start, stop, inserted, point, mark):
+        self.start = start
+        self.stop = stop
+        self.inserted = inserted
+        self.point = point
+        self.mark = mark
+        self.size = RECORD_OVERHEAD + sys.getsizeof(inserted)
+
+
+class _TypedRun(object):
+    """count older states made by typing one character after another at
+    start. Relative to the state above the run, state i (counted from the
+    oldest, which is 0) has the characters from start + i to start + count
+    removed and its point at start + i."""
+    __slots__ = ("start", "count", "mark", "size")
+
+    def __init__(self, start, mark):
+        self.start = start
+        self.count = 1
+        self.mark = mark
+        self.size = RECORD_OVERHEAD
+
+
+def _common_prefix(a, b, limit):
+    """Length of the common prefix of a and b, at most limit. The halves
+    are compared as strings, which is much faster than a loop over the
+    characters."""
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a, b, limit):
+    """Length of the common suffix of a and b, at most limit."""
+    la, lb = len(a), len(b)
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[la - mid:la - lo] == b[lb - mid:lb - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def text_delta(old, new):
+    """Return (start, old_stop, new_stop) such that replacing
+    old[start:old_stop] with new[start:new_stop] turns old into new."""
+    shortest = min(len(old), len(new))
+    start = _common_prefix(old, new, shortest)
+    end = _common_suffix(old, new, shortest - start)
+    return start, len(old) - end, len(new) - end
+
+
+class UndoHistory(object):
+    """Undo states of a line kept as a log of deltas.
+
+    Only the newest state, the top, is kept in full. Each older state is
+    kept as the edit that turns the text of the state above it into its own
+    text, together with its point and mark, so a state costs memory in
+    proportion to the change rather than to the length of the line. A run
+    of characters typed one after the other is kept as one record.
+
+    When the estimated size of the records grows beyond limit bytes the
+    oldest records are dropped. A negative limit means no limit.
+
+    States left by undo are kept for redo until the next push.
+    """
+
+    def __init__(self, limit=-1):
+        self.limit = limit
+        self.clear()
+
+    def clear(self):
+        self._text = None  # text of the top state, None when empty
+        self._point = 0
+        self._mark = -1
+        self._records = deque()  # oldest first
+        self._redo = []  # records of undone states, newest last
+        self._depth = 0
+        self.size = 0
+
+    def __len__(self):
+        """Number of states, including the top."""
+        return self._depth
+
+    def top(self):
+        """Return the newest state as (text, point, mark), or None."""
+        if self._text is None:
+            return None
+        return self._text, self._point, self._mark
+
+    def has_redo(self):
+        return bool(self._redo)
+
+    def clear_redo(self):
+        for record in self._redo:
+            self.size -= record.size
+        self._redo = []
+
+    def push(self, text, point, mark):
+        """Add a state. If text is the text of the top state only the point
+        of the top state is updated. Forgets the undone states."""
+        if self._redo:
+            self.clear_redo()
+        if self._text is not None:
+            if text == self._text:
+                self._point = point
+                return
+            self._add_record(text)
+        self._text = text
+        self._point = point
+        self._mark = mark
+        self._depth += 1
+        if self.limit >= 0:
+            self._evict()
+
+    def pop(self):
+        """Drop the top state and return the state below it, which becomes
+        the new top, as (text, point, mark). Returns None when no state is
+        left."""
+        if not self._records:
+            self.clear()
+            return None
+        self._step_back()
+        return self.top()
+
+    def undo(self):
+        """Like pop, but the top state is kept for redo. Returns None and
+        changes nothing when there is no older state."""
+        if not self._records:
+            return None
+        record = self._step_back()
+        self._redo.append(record)
+        self.size += record.size
+        return self.top()
+
+    def redo(self):
+        """Make the state undone last the top again and return it, or
+        None when there is nothing to redo."""
+        if not self._redo:
+            return None
+        record = self._redo.pop()
+        self.size -= record.size
+        text = self._text
+        text = text[:record.start] + record.inserted + text[record.stop:]
+        self._add_record(text)
+        self._text = text
+        self._point = record.point
+        self._mark = record.mark
+        self._depth += 1
+        return self.top()
+
+    def _step_back(self):
+        """Make the state below the top the new top. Returns the record
+        turning the new top back into the old one."""
+        record = self._records[-1]
+        text = self._text
+        if isinstance(record, _TypedRun):
+            i = record.count - 1
+            start = record.start + i
+            stop = record.start + record.count
+            self._text = text[:start] + text[stop:]
+            undone = _Edit(start, start, text[start:stop], self._point,
+                           self._mark)
+            self._point = start
+            self._mark = record.mark
+            record.count = i
+            if i == 0:
+                self._records.pop()
+                self.size -= record.size
+        else:
+            start = record.start
+            self._text = text[:start] + record.inserted + text[record.stop:]
+            undone = _Edit(start, start + len(record.inserted),
+                           text[start:record.stop], self._point, self._mark)
+            self._point = record.point
+            self._mark = record.mark
+            self._records.pop()
+            self.size -= record.size
+        self._depth -= 1
+        return undone
+
+    def _add_record(self, text):
+        """Keep the top state as a record relative to text, the text of the
+        state about to become the top."""
+        old = self._text
+        records = self._records
+        start = self._point
+        if len(text) == len(old) + 1 and text.startswith(old[:start]) \
+                and text.endswith(old[start:]):
+            # a character typed at the cursor
+            last = records[-1] if records else None
+            if isinstance(last, _TypedRun) and last.mark == self._mark \
+                    and last.start + last.count == start:
+                last.count += 1
+                return
+            run = _TypedRun(start, self._mark)
+        else:
+            start, old_stop, new_stop = text_delta(old, text)
+            run = _Edit(start, new_stop, old[start:old_stop], self._point,
+                        self._mark)
+        records.append(run)
+        self.size += run.size
+
+    def _evict(self):
+        records = self._records
+        while records and self.size > self.limit:
+            record = records.popleft()
+            self.size -= record.size
+            self._depth -= getattr(record, "count", 1)
@@ -118,3 +118,55 @@ def prev_end_segment(str, is_segment):
     result[len(result):len(str)] = [len(str) for x in
         range(len(str) - len(result) + 1)]
     return result
+
+
+# The functions below answer the same questions as the tables above for a
+# single index, by scanning from index instead of building the whole table.
+# A word start is a segment character not preceded by one, a word end is the
+# index after a segment character not followed by one.
+
+def _is_start(str, i, is_segment):
+    return is_segment(str[i]) and (i == 0 or not is_segment(str[i - 1]))
+
+
+def _is_end(str, i, is_segment):
+    return is_segment(str[i - 1]) and (i == len(str) or
+                                       not is_segment(str[i]))
+
+
+def next_start_index(str, index, is_segment):
+    """Same as next_start_segment(str, is_segment)[index]"""
+    for i in range(index + 1, len(str)):
+        if _is_start(str, i, is_segment):
+            return i
+    return len(str)
+
+
+def next_end_index(str, index, is_segment):
+    """Same as next_end_segment(str, is_segment)[index]"""
+    for i in range(max(index + 1, 1), len(str) + 1):
+        if _is_end(str, i, is_segment):
+            return i
+    return len(str)
+
+
+def prev_start_index(str, index, is_segment):
+    """Same as prev_start_segment(str, is_segment)[index]"""
+    for i in range(min(index, len(str)) - 1, -1, -1):
+        if _is_start(str, i, is_segment):
+            return i
+    return 0
+
+
+def prev_end_index(str, index, is_segment):
+    """Same as prev_end_segment(str, is_segment)[index]. Like the table this
+    is len(str) when there is no word end at or after index."""
+    for i in range(max(index - 1, 0), len(str)):
+        if is_segment(str[i]):
+            break
+    else:
+        return len(str)
+    for i in range(min(index, len(str) + 1) - 1, 0, -1):
+        if _is_end(str, i, is_segment):
+            return i
+    return 0
@@ -8,6 +8,7 @@ from __future__ import print_function, unicode_literals, absolute_import
 
 import socket, logging, logging.handlers
 from pyreadline.unicode_helper import ensure_str
+from pyreadline.py3k_compat import PY3
 
 host = "localhost"
 port = logging.handlers.DEFAULT_TCP_LOGGING_PORT
@@ -19,6 +20,15 @@ pyreadline_logger.propagate = False
 formatter = logging.Formatter(str('%(message)s'))
 file_handler = None
 
+# True while a handler recording the messages is installed. Call sites on hot
+# paths test it before building their message:
+#
+#     if logger.enabled:
+#         log("cursor:%d", value)
+#
+# Set it yourself if you add a handler to pyreadline_logger by other means.
+enabled = False
+
 class NULLHandler(logging.Handler):
     def emit(self, s):
         pass
@@ -39,22 +49,29 @@ class SocketStream(object):
 socket_handler = None
 pyreadline_logger.addHandler(NULLHandler())
 
+def _update_enabled():
+    global enabled
+    enabled = socket_handler is not None or file_handler is not None
+
 def start_socket_log():
     global socket_handler
     socket_handler = logging.StreamHandler(SocketStream(host, port))
     socket_handler.setFormatter(formatter)
     pyreadline_logger.addHandler(socket_handler)
+    _update_enabled()
 
 def stop_socket_log():
     global socket_handler
     if socket_handler:
         pyreadline_logger.removeHandler(socket_handler)
         socket_handler = None
+    _update_enabled()
 
 def start_file_log(filename):
     global file_handler
     file_handler = logging.FileHandler(filename, "w")
     pyreadline_logger.addHandler(file_handler)
+    _update_enabled()
 
 def stop_file_log():
     global file_handler
@@ -62,12 +79,20 @@ def stop_file_log():
         pyreadline_logger.removeHandler(file_handler)
         file_handler.close()
         file_handler = None
+    _update_enabled()
 
 def stop_logging():
     log("STOPING LOG")
     stop_file_log()
     stop_socket_log()
 
-def log(s):
-    s = ensure_str(s)
+def log(s, *args):
+    """Log s, or s % args if args are given. Nothing is formatted while
+    logging is not enabled."""
+    if not enabled:
+        return
+    if args:
+        s = s % args
+    if not PY3:
+        s = ensure_str(s)
     pyreadline_logger.debug(s)
@@ -10,19 +10,22 @@ from __future__ import print_function, unicode_literals, absolute_import
 
 import os
 import re
-import math
-import glob
 import sys
 import traceback
 
 from pyreadline.py3k_compat import callable
+import pyreadline.logger as logger
 from pyreadline.logger import log
 from pyreadline.keysyms.common import make_KeyPress_from_keydescr
 import pyreadline.lineeditor.lineobj as lineobj
 import pyreadline.lineeditor.history as history
 import pyreadline.clipboard as clipboard
+from pyreadline.completion.cache import CompletionCache
+from pyreadline.completion.filesystem import FilesystemCompleter
+from pyreadline.completion.display import CompletionDisplay
+from pyreadline.completion.scheduler import CompletionScheduler
 from pyreadline.error import ReadlineError
-from pyreadline.unicode_helper import ensure_str, ensure_unicode
+from pyreadline.unicode_helper import ensure_unicode
 
 in_ironpython = "IronPython" in sys.version
 
@@ -44,6 +47,13 @@ class BaseMode(object):
         self.mark_directories = 'on'
         self.complete_filesystem = 'off'
         self.completer = None
+        self.bulk_completer = None
+        self._completion_cache = CompletionCache()
+        self._filesystem_completer = FilesystemCompleter()
+        self._completion_scheduler = CompletionScheduler()
+        self._completion_display = CompletionDisplay()
+        self.completion_query_items = 100
+        self.page_completions = 'off'
         self.begidx = 0
         self.endidx = 0
         self.tabstop = 4
@@ -100,6 +110,7 @@ class BaseMode(object):
     allow_ctrl_c = property(*_gs("allow_ctrl_c"))
     _print_prompt = property(_g("_print_prompt"))
     _update_line = property(_g("_update_line"))
+    _invalidate_line = property(_g("_invalidate_line"))
     console = property(_g("console"))
     prompt_begin_pos = property(_g("prompt_begin_pos"))
     prompt_end_pos = property(_g("prompt_end_pos"))
@@ -134,6 +145,8 @@ class BaseMode(object):
                     traceback.print_exc()
 
         self.l_buffer.reset_line()
+        self._completion_cache.clear()
+        self._completion_scheduler.cancel()
         self.prompt = prompt
 
         if self.pre_input_hook:
@@ -180,7 +193,7 @@ class BaseMode(object):
                 "Trying to bind non method to keystroke:%s,%s,%s,%s" % (
                 key, func, type(func), type(self._bind_key)))
         keyinfo = make_KeyPress_from_keydescr(key.lower()).tuple()
-        log(">>>%s -> %s<<<" % (keyinfo, func.__name__))
+        log(">>>%s -> %s<<<", keyinfo, func.__name__)
         self.key_dispatch[keyinfo] = func
 
     def _bind_exit_key(self, key):
@@ -203,54 +216,89 @@ class BaseMode(object):
         self.begidx = self.l_buffer.point
         self.endidx = self.l_buffer.point
         buf = self.l_buffer.line_buffer
-        if self.completer:
+        filesystem = self.complete_filesystem == "on"
+        scheduler = self._completion_scheduler
+        sources = []
+        if self.completer or self.bulk_completer:
             # get the string to complete
-            while self.begidx > 0:
-                self.begidx -= 1
-                if buf[self.begidx] in self.completer_delims:
-                    self.begidx += 1
-                    break
-            text = ensure_str(''.join(buf[self.begidx:self.endidx]))
-            log('complete text="%s"' % ensure_unicode(text))
-            i = 0
-            while 1:
-                try:
-                    r = self.completer(ensure_unicode(text), i)
-                except IndexError:
-                    break
-                except TypeError:
-                    break
-                i += 1
-                if r is None:
-                    break
-                elif r and r not in completions:
-                    completions.append(r)
-                else:
-                    pass
-            log('text completions=<%s>' % list(
-                map(ensure_unicode, completions)))
-        if (self.complete_filesystem == "on") and not completions:
+            self.begidx = self._word_start(self.begidx, self.completer_delims)
+            text = ensure_unicode(''.join(buf[self.begidx:self.endidx]))
+            log('complete text="%s"', text)
+            key = (self.l_buffer.get_line_text()[:self.begidx], self.begidx,
+                   self.completer, self.bulk_completer)
+            completions = self._completion_cache.get(key, text)
+            if completions is None:
+                sources.append(("completer", self._complete_text, text))
+        if filesystem and not completions:
             # get the filename to complete
-            while self.begidx > 0:
-                self.begidx -= 1
-                if buf[self.begidx] in ' \t\n':
-                    self.begidx += 1
-                    break
-            text = ensure_str(''.join(buf[self.begidx:self.endidx]))
-            log('file complete text="%s"' % ensure_unicode(text))
-            completions = list(map(ensure_unicode,
-                glob.glob(os.path.expanduser(text) + '*'.encode('ascii'))))
-            if self.mark_directories == 'on':
-                mc = []
-                for f in completions:
-                    if os.path.isdir(f):
-                        mc.append(f + os.sep)
-                    else:
-                        mc.append(f)
-                completions = mc
-            log('fnames=<%s>' % list(map(ensure_unicode, completions)))
+            file_begidx = self._word_start(self.begidx, ' \t\n')
+            file_text = ensure_unicode(''.join(buf[file_begidx:self.endidx]))
+            log('file complete text="%s"', file_text)
+            # only needed when the completer finds nothing, but on the
+            # thread pool it is cheaper to ask both at once
+            file_source = ("filesystem", self._complete_filename, file_text)
+            if scheduler.concurrent or not sources:
+                sources.append(file_source)
+        results = {}
+        if sources:
+            results = scheduler.run(
+                (self.l_buffer.get_line_text(), self.endidx), sources)
+        if sources and sources[0][0] == "completer":
+            if "completer" not in results:
+                log('completer did not finish in time')
+                return []
+            completions = results["completer"]
+            self._completion_cache.put(key, text, completions)
+            if logger.enabled:
+                log('text completions=<%s>',
+                    list(map(ensure_unicode, completions)))
+        if filesystem and not completions:
+            if "filesystem" not in results and not scheduler.concurrent:
+                results = scheduler.run(None, [file_source])
+            self.begidx = file_begidx
+            completions = results.get("filesystem", [])
+            if logger.enabled:
+                log('fnames=<%s>', list(map(ensure_unicode, completions)))
         return completions
 
+    def _word_start(self, index, delims):
+        """Return the start of the word ending at index, words are
+        separated by the characters in delims."""
+        buf = self.l_buffer.line_buffer
+        while index > 0:
+            index -= 1
+            if buf[index] in delims:
+                return index + 1
+        return 0
+
+    def _complete_text(self, text):
+        """Return the completions of text from the completer."""
+        if self.bulk_completer:
+            candidates = self.bulk_completer(text) or []
+        else:
+            candidates = self._iter_completer(text)
+        return unique_completions(candidates)
+
+    def _complete_filename(self, text):
+        return self._filesystem_completer.complete(
+            text, self.mark_directories == 'on')
+
+    def _iter_completer(self, text):
+        """Yield the results of completer(text, state) for state 0, 1, 2,
+        ... until it returns None."""
+        i = 0
+        while 1:
+            try:
+                r = self.completer(text, i)
+            except IndexError:
+                break
+            except TypeError:
+                break
+            i += 1
+            if r is None:
+                break
+            yield r
+
     def _display_completions(self, completions):
         if not completions:
             return
@@ -260,43 +308,48 @@ class BaseMode(object):
 
         self.console.write('\n')
 
-        # If more than 100 items are to be displayed,
+        # If more than completion_query_items items are to be displayed,
         # ask the user whether to display or not.
-        if len(completions) > 100:
-
-            old_prompt = self.prompt
-            old_line_buffer = self.get_line_buffer()
-            answer = self.readline(
-                "%d possibilities found. Display? (y/n): " % len(completions))
-            self.prompt = old_prompt
-            self.l_buffer.reset_line()
-            self.insert_text(old_line_buffer)
-
-            self.prompt_completion_locked = False
-
-            if answer.strip().lower() in ["n", "no"]:
-                self._print_prompt()
-                return
-            elif not answer.strip().lower() in ["y", "yes"]:
-                self.console.write("Invalid answer\n")
+        if 0 <= self.completion_query_items < len(completions):
+            self.console.write("Display all %d possibilities? (y or n)"
+                               % len(completions))
+            answer = self._read_key_char()
+            self.console.write('\n')
+            if answer not in 'yY ':
                 self._print_prompt()
                 return
 
-        wmax = max(map(len, completions))
+        display = self._completion_display
         w, h = self.console.size()
-        cols = max(1, int((w - 1) / (wmax + 1)))
-        rows = int(math.ceil(float(len(completions)) / cols))
-        for row in range(rows):
-            s = ''
-            for col in range(cols):
-                i = col * rows + row
-                if i < len(completions):
-                    self.console.write(completions[i].ljust(wmax + 1))
-            self.console.write('\n')
+        column_width, columns, rows = display.layout(completions, w)
+        page = max(1, h - 1)
+        row = 0
+        while True:
+            # one write per screen
+            self.console.write(display.rows(completions, w, row, row + page))
+            row += page
+            if row >= rows:
+                break
+            if self.page_completions != 'on':
+                continue
+            self.console.write('--More--')
+            answer = self._read_key_char()
+            self.console.write('\r        \r')
+            if answer in 'qQnN\x1b':
+                break
+            elif answer in '\r\n':
+                page = 1
+            else:
+                page = max(1, h - 1)
         if in_ironpython:
             self.prompt = sys.ps1
         self._print_prompt()
 
+    def _read_key_char(self):
+        """Wait for a key press and return its character."""
+        event = self.console.getkeypress()
+        return getattr(event, 'char', '') or '\0'
+
     def complete(self, e):  # (TAB)
         """Attempt to perform completion on the text before point. The
         actual completion performed is application-specific. The default is
@@ -474,10 +527,12 @@ class BaseMode(object):
         """Clear the screen and redraw the current line, leaving the current
         line at the top of the screen."""
         self.console.page()
+        self._invalidate_line()
         self.finalize()
 
     def redraw_current_line(self, e):  # ()
         """Refresh the current line. By default, this is unbound."""
+        self._invalidate_line()
         self.finalize()
 
     def accept_line(self, e):  # (Newline or Return)
@@ -533,7 +588,8 @@ class BaseMode(object):
         if self.enable_win32_clipboard:
             txt = clipboard.get_clipboard_text_and_convert(False)
             txt = txt.split("\n")[0].strip("\r").strip("\n")
-            log("paste: >%s<" % list(map(ord, txt)))
+            if logger.enabled:
+                log("paste: >%s<", list(map(ord, txt)))
             self.insert_text(txt)
         self.finalize()
 
@@ -549,7 +605,7 @@ class BaseMode(object):
                 self.insert_text(t[0])
                 self.add_history(self.l_buffer.copy())
                 self.paste_line_buffer = t[1:]
-                log("multi: >%s<" % self.paste_line_buffer)
+                log("multi: >%s<", self.paste_line_buffer)
                 return True
             else:
                 return False
@@ -596,16 +652,31 @@ class BaseMode(object):
         self.finalize()
 
 
+def unique_completions(candidates):
+    """Return the non empty candidates in order, leaving out repeats."""
+    seen = set()
+    completions = []
+    for r in candidates:
+        if r and r not in seen:
+            seen.add(r)
+            completions.append(r)
+    return completions
+
+
 def commonprefix(m):
-    """Given a list of pathnames, returns the longest common leading component"""
+    """Given a list of pathnames, returns the longest common leading
+    component, ignoring case. The case is taken from the first item.
+
+    The common prefix of a list is the common prefix of its smallest and
+    largest item, so the time is linear in the total length of the items.
+    """
     if not m:
         return ''
-    prefix = m[0]
-    for item in m:
-        for i in range(len(prefix)):
-            if prefix[:i + 1].lower() != item[:i + 1].lower():
-                prefix = prefix[:i]
-                if i == 0:
-                    return ''
-                break
-    return prefix
+    low = min(m, key=lambda item: item.lower())
+    high = max(m, key=lambda item: item.lower())
+    n = min(len(low), len(high))
+    i = 0
+    # compare the items themselves, lowering a string may change its length
+    while i < n and low[i].lower() == high[i].lower():
+        i += 1
+    return m[0][:i]
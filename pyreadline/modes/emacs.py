@@ -10,6 +10,7 @@ from __future__ import print_function, unicode_literals, absolute_import
 
 import sys
 
+import pyreadline.logger as logger
 from pyreadline.logger import log
 from pyreadline.lineeditor.lineobj import Point
 import pyreadline.lineeditor.lineobj as lineobj
@@ -32,7 +33,8 @@ class IncrementalSearchPromptMode(object):
         pass
 
     def _process_incremental_search_keyevent(self, keyinfo):
-        log("_process_incremental_search_keyevent")
+        if logger.enabled:
+            log("_process_incremental_search_keyevent")
         keytuple = keyinfo.tuple()
         # dispatch_func = self.key_dispatch.get(keytuple, default)
         revtuples = []
@@ -43,7 +45,8 @@ class IncrementalSearchPromptMode(object):
             elif func == self.forward_search_history:
                 fwdtuples.append(ktuple)
 
-        log("IncrementalSearchPromptMode %s %s" % (keyinfo, keytuple))
+        if logger.enabled:
+            log("IncrementalSearchPromptMode %s %s", keyinfo, keytuple)
         if keyinfo.keyname == 'backspace':
             self.subsearch_query = self.subsearch_query[:-1]
             if len(self.subsearch_query) > 0:
@@ -84,6 +87,7 @@ class IncrementalSearchPromptMode(object):
         """Initialize search prompt
         """
         log("init_incremental_search")
+        self._history.begin_search()
         self.subsearch_query = ''
         self.subsearch_fun = searchfun
         self.subsearch_old_line = self.l_buffer.get_line_text()
@@ -116,7 +120,8 @@ class SearchPromptMode(object):
 
     def _process_non_incremental_search_keyevent(self, keyinfo):
         keytuple = keyinfo.tuple()
-        log("SearchPromptMode %s %s" % (keyinfo, keytuple))
+        if logger.enabled:
+            log("SearchPromptMode %s %s", keyinfo, keytuple)
         history = self._history
 
         if keyinfo.keyname == 'backspace':
@@ -146,6 +151,7 @@ class SearchPromptMode(object):
         self.prompt = self.non_inc_oldprompt + ":" + self.non_inc_query
 
     def _init_non_i_search(self, direction):
+        self._history.begin_search()
         self.non_inc_direction = direction
         self.non_inc_query = ""
         self.non_inc_oldprompt = self.prompt
@@ -177,9 +183,10 @@ class DigitArgumentMode(object):
         pass
 
     def _process_digit_argument_keyevent(self, keyinfo):
-        log("DigitArgumentMode.keyinfo %s" % keyinfo)
         keytuple = keyinfo.tuple()
-        log("DigitArgumentMode.keytuple %s %s" % (keyinfo, keytuple))
+        if logger.enabled:
+            log("DigitArgumentMode.keyinfo %s", keyinfo)
+            log("DigitArgumentMode.keytuple %s %s", keyinfo, keytuple)
         if keyinfo.keyname in ['return']:
             self.prompt = self._digit_argument_oldprompt
             self.process_keyevent_queue = self.process_keyevent_queue[:-1]
@@ -189,7 +196,8 @@ class DigitArgumentMode(object):
         elif (keyinfo.char in "0123456789" and
                 not keyinfo.control and
                 not keyinfo.meta):
-            log("arg %s %s" % (self.argument, keyinfo.char))
+            if logger.enabled:
+                log("arg %s %s", self.argument, keyinfo.char)
             self.argument = self.argument * 10 + int(keyinfo.char)
         else:
             self.prompt = self._digit_argument_oldprompt
@@ -210,9 +218,10 @@ class DigitArgumentMode(object):
             self.argument = -1
         elif keyinfo.char in "0123456789":
             self.argument = int(keyinfo.char)
-        log("<%s> %s" % (self.argument, type(self.argument)))
         self.prompt = "(arg: %s) " % self.argument
-        log("arg-init %s %s" % (self.argument, keyinfo.char))
+        if logger.enabled:
+            log("<%s> %s", self.argument, type(self.argument))
+            log("arg-init %s %s", self.argument, keyinfo.char)
 
 
 class EmacsMode(
@@ -260,7 +269,8 @@ class EmacsMode(
         """return True when line is final
         """
         # Process exit keys. Only exit on empty line
-        log("_process_keyevent <%s>" % keyinfo)
+        if logger.enabled:
+            log("_process_keyevent <%s>", keyinfo)
 
         def nop(e):
             pass
@@ -277,8 +287,9 @@ class EmacsMode(
             return False
 
         if keytuple in self.exit_dispatch:
-            pars = (self.l_buffer, lineobj.EndOfLine(self.l_buffer))
-            log("exit_dispatch:<%s, %s>" % pars)
+            if logger.enabled:
+                log("exit_dispatch:<%s, %s>", self.l_buffer,
+                    lineobj.EndOfLine(self.l_buffer))
             if lineobj.EndOfLine(self.l_buffer) == 0:
                 raise EOFError
         if keyinfo.keyname or keyinfo.control or keyinfo.meta:
@@ -287,7 +298,8 @@ class EmacsMode(
             default = self.self_insert
         dispatch_func = self.key_dispatch.get(keytuple, default)
 
-        log("readline from keyboard:<%s,%s>" % (keytuple, dispatch_func))
+        if logger.enabled:
+            log("readline from keyboard:<%s,%s>", keytuple, dispatch_func)
 
         r = None
         if dispatch_func:
@@ -724,18 +736,4 @@ class EmacsMode(
         self._bind_key("alt--", self.digit_argument)
 
 
-# make it case insensitive
-def commonprefix(m):
-    """Given a list of pathnames, returns the longest common leading
-    component"""
-    if not m:
-        return ''
-    prefix = m[0]
-    for item in m:
-        for i in range(len(prefix)):
-            if prefix[:i + 1].lower() != item[:i + 1].lower():
-                prefix = prefix[:i]
-                if i == 0:
-                    return ''
-                break
-    return prefix
+commonprefix = basemode.commonprefix
@@ -163,6 +163,7 @@ class NotEmacsMode(basemode.BaseMode):
         c = self.console
         line = self.get_line_buffer()
         query = ''
+        self._history.begin_search()
         hc_start = self._history.history_cursor #+ direction
         while 1:
             x, y = self.prompt_end_pos
@@ -596,16 +597,5 @@ class NotEmacsMode(basemode.BaseMode):
         self._bind_key('Clear',             self.clear_screen)
 
 
-# make it case insensitive
-def commonprefix(m):
-    """Given a list of pathnames, returns the longest common leading component"""
-    if not m: return ''
-    prefix = m[0]
-    for item in m:
-        for i in range(len(prefix)):
-            if prefix[:i+1].lower() != item[:i+1].lower():
-                prefix = prefix[:i]
-                if i == 0: return ''
-                break
-    return prefix
+commonprefix = basemode.commonprefix
 
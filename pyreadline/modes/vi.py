@@ -10,8 +10,10 @@
 from __future__ import print_function, unicode_literals, absolute_import
 import os
 
+import pyreadline.logger as logger
 from   pyreadline.logger import log
 import pyreadline.lineeditor.lineobj as lineobj
+from pyreadline.lineeditor.undo import UndoHistory
 from . import basemode
 
 
@@ -37,7 +39,8 @@ class ViMode(basemode.BaseMode):
                 raise EOFError
 
         dispatch_func = self.key_dispatch.get(keytuple, self.vi_key)
-        log("readline from keyboard:%s->%s" % (keytuple, dispatch_func))
+        if logger.enabled:
+            log("readline from keyboard:%s->%s", keytuple, dispatch_func)
         r = None
         if dispatch_func:
             r = dispatch_func(keyinfo)
@@ -63,8 +66,7 @@ class ViMode(basemode.BaseMode):
         self._vi_yank_buffer = None
         self._vi_multiplier1 = ''
         self._vi_multiplier2 = ''
-        self._vi_undo_stack = []
-        self._vi_undo_cursor = -1
+        self._vi_undo = UndoHistory(lineobj.undo_memory_limit)
         self._vi_current = None
         self._vi_search_text = ''
         self._vi_search_position = 0
@@ -137,10 +139,9 @@ class ViMode(basemode.BaseMode):
                 self.l_buffer.point -= 1
                 if self.l_buffer.overwrite:
                     try:
-                        prev = self._vi_undo_stack[self._vi_undo_cursor][1][
-                            self.l_buffer.point]
+                        prev = self._vi_undo.top()[0][self.l_buffer.point]
                         self.l_buffer.line_buffer[self.l_buffer.point] = prev
-                    except IndexError:
+                    except (IndexError, TypeError):
                         del self.l_buffer.line_buffer[self.l_buffer.point]
                 else:
                     self.vi_save_line()
@@ -152,8 +153,7 @@ class ViMode(basemode.BaseMode):
             return False
         self._vi_command = None
         self.vi_set_insert_mode(True)
-        self._vi_undo_stack = []
-        self._vi_undo_cursor = -1
+        self._vi_undo = UndoHistory(lineobj.undo_memory_limit)
         self._vi_current = None
         if self.l_buffer.line_buffer:
             self.add_history(self.l_buffer.copy())
@@ -173,60 +173,59 @@ class ViMode(basemode.BaseMode):
             self.cursor_size = 100
 
     def vi_undo_restart(self):
-        tpl_undo = (self.l_buffer.point, self.l_buffer.line_buffer[:],)
-        self._vi_undo_stack = [tpl_undo]
-        self._vi_undo_cursor = 0
+        self._vi_undo = UndoHistory(lineobj.undo_memory_limit)
+        self._vi_undo.push(self.l_buffer.get_line_text(), self.l_buffer.point,
+                           -1)
 
     def vi_save_line(self):
-        if self._vi_undo_stack and self._vi_undo_cursor >= 0:
-            del self._vi_undo_stack[self._vi_undo_cursor + 1:]
-        # tpl_undo = (self.l_buffer.point, self.l_buffer[:], )
-        tpl_undo = (self.l_buffer.point, self.l_buffer.line_buffer[:],)
-        if not self._vi_undo_stack or self._vi_undo_stack[self._vi_undo_cursor][
-            1] != tpl_undo[1]:
-            self._vi_undo_stack.append(tpl_undo)
-            self._vi_undo_cursor += 1
+        text = self.l_buffer.get_line_text()
+        top = self._vi_undo.top()
+        if top is None or top[0] != text:
+            self._vi_undo.push(text, self.l_buffer.point, -1)
+        else:
+            self._vi_undo.clear_redo()
 
     def vi_undo_prepare(self):
-        if self._vi_undo_cursor == len(self._vi_undo_stack) - 1:
+        if not self._vi_undo.has_redo():
             self.vi_save_line()
 
     def vi_undo(self, do_pop=True):
         self.vi_undo_prepare()
-        if not self._vi_undo_stack or self._vi_undo_cursor <= 0:
+        if len(self._vi_undo) <= 1:
             self.vi_error()
             return
-        self._vi_undo_cursor -= 1
+        self._vi_undo.undo()
         self.vi_undo_assign()
 
     def vi_undo_all(self):
         self.vi_undo_prepare()
-        if self._vi_undo_cursor > 0:
-            self._vi_undo_cursor = 0
+        if len(self._vi_undo) > 1:
+            while len(self._vi_undo) > 1:
+                self._vi_undo.undo()
             self.vi_undo_assign()
         else:
             self.vi_error()
 
     def vi_undo_assign(self):
-        tpl_undo = self._vi_undo_stack[self._vi_undo_cursor]
-        self.l_buffer.line_buffer = tpl_undo[1][:]
-        self.l_buffer.point = tpl_undo[0]
+        text, point, mark = self._vi_undo.top()
+        self.l_buffer.line_buffer = text
+        self.l_buffer.point = point
 
     def vi_redo(self, e):
-        if self._vi_undo_cursor >= len(self._vi_undo_stack) - 1:
+        if not self._vi_undo.has_redo():
             self.vi_error()
             return
-        self._vi_undo_cursor += 1
+        self._vi_undo.redo()
         self.vi_undo_assign()
 
     def vi_search(self, rng):
         for i in rng:
             line_history = self._history.history[i]
-            pos = line_history.get_line_text().find(self._vi_search_text)
+            pos = line_history.find(self._vi_search_text)
             if pos >= 0:
                 self._vi_search_position = i
                 self._history.history_cursor = i
-                self.l_buffer.line_buffer = list(line_history.line_buffer)
+                self.l_buffer.line_buffer = list(line_history)
                 self.l_buffer.point = pos
                 self.vi_undo_restart()
                 return True
@@ -236,6 +235,7 @@ class ViMode(basemode.BaseMode):
     def vi_search_first(self):
         text = ''.join(self.l_buffer.line_buffer[1:])
         if text:
+            self._history.begin_search()
             self._vi_search_text = text
             self._vi_search_position = len(self._history.history) - 1
         elif self._vi_search_text:
@@ -785,7 +785,7 @@ class ViCommand:
         self.state = _VI_END
 
     def key_v(self, char):
-        editor = ViExternalEditor(self.readline.l_buffer.line_buffer)
+        editor = ViExternalEditor(self.readline.l_buffer.get_line_text())
         self.readline.l_buffer.line_buffer = list(editor.result)
         self.readline.l_buffer.point = 0
         self.is_edit = True
@@ -1035,7 +1035,8 @@ class ViEvent:
 
 # vi standalone functions
 def vi_is_word(char):
-    log('xx vi_is_word: type(%s), %s' % (type(char), char,))
+    if logger.enabled:
+        log('xx vi_is_word: type(%s), %s', type(char), char)
     return char.isalpha() or char.isdigit() or char == '_'
 
 
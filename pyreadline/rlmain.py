@@ -15,6 +15,7 @@ from . import release
 from .py3k_compat import callable
 
 from .lineeditor import lineobj
+from .lineeditor.linerenderer import LineRenderer, is_plain, make_cells
 from . import console
 from . import logger
 
@@ -51,6 +52,12 @@ class BaseReadline(object):
     def __init__(self):
         self.allow_ctrl_c = False
         self.ctrl_c_tap_time_interval = 0.3
+        # key events handled before the line is redrawn, and how long
+        # (in seconds) to keep handling queued events before redrawing
+        self.key_batch_size = 1
+        self.key_batch_latency = 0.05
+        # redraw only the changed part of the line when possible
+        self.differential_redraw = True
 
         self.debug = False
         self.bell_style = 'none'
@@ -64,14 +71,15 @@ class BaseReadline(object):
         self.mode = self.editingmodes[0]
 
         self.read_inputrc()
-        log("\n".join(self.mode.rl_settings_to_string()))
+        if logger.enabled:
+            log("\n".join(self.mode.rl_settings_to_string()))
 
         self.callback = None
 
     def parse_and_bind(self, string):
         """Parse and execute single line of a readline init file."""
         try:
-            log('parse_and_bind("%s")' % string)
+            log('parse_and_bind("%s")', string)
             if string.startswith('#'):
                 return
             if string.startswith('set'):
@@ -83,9 +91,9 @@ class BaseReadline(object):
                     try:
                         setattr(self.mode, var_name.replace('-', '_'), val)
                     except AttributeError:
-                        log('unknown var="%s" val="%s"' % (var_name, val))
+                        log('unknown var="%s" val="%s"', var_name, val)
                 else:
-                    log('bad set "%s"' % string)
+                    log('bad set "%s"', string)
                 return
             m = re.compile(r'\s*(.+)\s*:\s*([-a-zA-Z]+)\s*$').match(string)
             if m:
@@ -95,7 +103,7 @@ class BaseReadline(object):
                 try:
                     func = getattr(self.mode, py_name)
                 except AttributeError:
-                    log('unknown func key="%s" func="%s"' % (key, func_name))
+                    log('unknown func key="%s" func="%s"', key, func_name)
                     if self.debug:
                         print(
                             'pyreadline parse_and_bind error, unknown function to bind: "%s"' % func_name)
@@ -124,7 +132,7 @@ class BaseReadline(object):
     def read_init_file(self, filename=None):
         """Parse a readline initialization file. The default filename is the
         last filename used."""
-        log('read_init_file("%s")' % filename)
+        log('read_init_file("%s")', filename)
 
     # History file book keeping methods (non-bindable)
 
@@ -178,7 +186,7 @@ class BaseReadline(object):
         """Load a readline history file. The default filename is ~/.history."""
         if filename is None:
             filename = self.mode._history.history_filename
-        log("read_history_file from %s" % ensure_unicode(filename))
+        log("read_history_file from %s", ensure_unicode(filename))
         self.mode._history.read_history_file(filename)
 
     def write_history_file(self, filename=None):
@@ -217,6 +225,24 @@ class BaseReadline(object):
         log('get_completer')
         return self.mode.completer
 
+    def set_bulk_completer(self, function=None):
+        """Set or remove the bulk completer function.
+
+        The bulk completer is called once as function(text) and returns a
+        list (or any iterable) of all possible completions starting with
+        text. When it is set it is used instead of the completer function,
+        which saves calling the completer once per completion. If function
+        is omitted or None the completer function is used again.
+        """
+        log('set_bulk_completer')
+        self.mode.bulk_completer = function
+
+    def get_bulk_completer(self):
+        """Get the bulk completer function.
+        """
+        log('get_bulk_completer')
+        return self.mode.bulk_completer
+
     def get_begidx(self):
         """Get the beginning index of the readline tab-completion scope."""
         return self.mode.begidx
@@ -340,6 +366,10 @@ class BaseReadline(object):
             import pyreadline.lineeditor.lineobj
             pyreadline.lineeditor.lineobj.kill_ring_to_clipboard = killring
 
+        def setundo_memory_limit(limit):
+            import pyreadline.lineeditor.lineobj
+            pyreadline.lineeditor.lineobj.undo_memory_limit = int(limit)
+
         def sethistoryfilename(filename):
             self.mode._history.history_filename = os.path.expanduser(
                 ensure_str(filename))
@@ -353,8 +383,44 @@ class BaseReadline(object):
         def sethistorylength(length):
             self.mode._history.history_length = int(length)
 
+        def sethistorymaxentries(count):
+            self.mode._history.max_entries = int(count)
+
+        def sethistoryencoding(encoding):
+            self.mode._history.encoding = encoding
+
+        def sethistoryformat(format):
+            self.mode._history.history_format = format
+
+        def sethistorylazyload(count):
+            self.mode._history.lazy_load = int(count)
+
+        def sethistorycontrol(value):
+            options = value.split(":")
+            history = self.mode._history
+            history.ignorespace = "ignorespace" in options or \
+                "ignoreboth" in options
+            history.ignoredups = "ignoredups" in options or \
+                "ignoreboth" in options
+            history.erasedups = "erasedups" in options
+
+        def sethistoryprefixindex(flag):
+            self.mode._history.use_prefix_index = flag
+
+        def sethistorysubstringindex(flag):
+            self.mode._history.use_substring_index = flag
+
+        def sethistoryjournal(flag):
+            self.mode._history.journal = flag
+
+        def sethistoryjournalfsync(flag):
+            self.mode._history.journal_fsync = flag
+
+        def sethistoryshared(flag):
+            self.mode._history.shared = flag
+
         def allow_ctrl_c(mode):
-            log("allow_ctrl_c:%s:%s" % (self.allow_ctrl_c, mode))
+            log("allow_ctrl_c:%s:%s", self.allow_ctrl_c, mode)
             self.allow_ctrl_c = mode
 
         def setbellstyle(mode):
@@ -366,6 +432,15 @@ class BaseReadline(object):
         def ctrl_c_tap_time_interval(mode):
             self.ctrl_c_tap_time_interval = mode
 
+        def key_batch_size(size):
+            self.key_batch_size = max(1, int(size))
+
+        def key_batch_latency(seconds):
+            self.key_batch_latency = float(seconds)
+
+        def differential_redraw(mode):
+            self.differential_redraw = mode
+
         def mark_directories(mode):
             self.mode.mark_directories = mode
 
@@ -375,6 +450,21 @@ class BaseReadline(object):
         def complete_filesystem(delims):
             self.mode.complete_filesystem = delims.lower()
 
+        def completion_cache(flag):
+            self.mode._completion_cache.enabled = flag
+
+        def completion_workers(workers):
+            self.mode._completion_scheduler.workers = int(workers)
+
+        def completion_timeout(seconds):
+            self.mode._completion_scheduler.timeout = float(seconds)
+
+        def completion_query_items(count):
+            self.mode.completion_query_items = int(count)
+
+        def page_completions(mode):
+            self.mode.page_completions = mode
+
         def enable_ipython_paste_for_paths(boolean):
             self.mode.enable_ipython_paste_for_paths = boolean
 
@@ -425,14 +515,33 @@ class BaseReadline(object):
             "show_all_if_ambiguous": show_all_if_ambiguous,
             "completer_delims": completer_delims,
             "complete_filesystem": complete_filesystem,
+            "completion_cache": completion_cache,
+            "completion_workers": completion_workers,
+            "completion_timeout": completion_timeout,
+            "completion_query_items": completion_query_items,
+            "page_completions": page_completions,
             "debug_output": debug_output,
             "history_filename": sethistoryfilename,
             "history_length": sethistorylength,
+            "history_max_entries": sethistorymaxentries,
+            "history_control": sethistorycontrol,
+            "history_lazy_load": sethistorylazyload,
+            "history_encoding": sethistoryencoding,
+            "history_format": sethistoryformat,
+            "history_prefix_index": sethistoryprefixindex,
+            "history_substring_index": sethistorysubstringindex,
+            "history_journal": sethistoryjournal,
+            "history_journal_fsync": sethistoryjournalfsync,
+            "history_shared": sethistoryshared,
             "set_prompt_color": set_prompt_color,
             "set_input_color": set_input_color,
             "allow_ctrl_c": allow_ctrl_c,
             "ctrl_c_tap_time_interval": ctrl_c_tap_time_interval,
+            "key_batch_size": key_batch_size,
+            "key_batch_latency": key_batch_latency,
+            "differential_redraw": differential_redraw,
             "kill_ring_to_clipboard": setkill_ring_to_clipboard,
+            "undo_memory_limit": setundo_memory_limit,
             "enable_ipython_paste_for_paths": enable_ipython_paste_for_paths,
         }
         if os.path.isfile(inputrcpath):
@@ -454,15 +563,21 @@ class BaseReadline(object):
 
 class Readline(BaseReadline):
     """Baseclass for readline based on a console
+
+    consoleobj replaces the console of the platform, e.g. with a
+    pyreadline.console.virtual_console.Console for scripted input.
     """
 
-    def __init__(self):
+    def __init__(self, consoleobj=None):
         BaseReadline.__init__(self)
-        self.console = console.Console()
+        if consoleobj is None:
+            consoleobj = console.Console()
+        self.console = consoleobj
         self.selection_color = self.console.saveattr << 4
         self.command_color = None
         self.prompt_color = None
         self.size = self.console.size()
+        self._renderer = LineRenderer(self.console)
 
         # variables you can control with parse_and_bind
 
@@ -508,6 +623,11 @@ class Readline(BaseReadline):
         self.prompt_begin_pos = (x, y - n)
         self.prompt_end_pos = c.pos()
         self.size = c.size()
+        self._renderer.invalidate()
+
+    def _invalidate_line(self):
+        """Make the next _update_line redraw the whole line."""
+        self._renderer.invalidate()
 
     def _update_prompt_pos(self, n):
         if n != 0:
@@ -520,22 +640,39 @@ class Readline(BaseReadline):
         c = self.console
         l_buffer = self.mode.l_buffer
         c.cursor(0)  # Hide cursor avoiding flicking
-        c.pos(*self.prompt_begin_pos)
-        self._print_prompt()
         ltext = l_buffer.quoted_text()
         if l_buffer.enable_selection and (l_buffer.selection_mark >= 0):
             start = len(l_buffer[:l_buffer.selection_mark].quoted_text())
             stop = len(l_buffer[:l_buffer.point].quoted_text())
             if start > stop:
                 stop, start = start, stop
-            n = c.write_scrolling(ltext[:start], self.command_color)
-            n = c.write_scrolling(ltext[start:stop], self.selection_color)
-            n = c.write_scrolling(ltext[stop:], self.command_color)
         else:
-            n = c.write_scrolling(ltext, self.command_color)
+            start = stop = len(ltext)
+
+        cells = None
+        if self.differential_redraw and is_plain(ltext):
+            cells = make_cells(ltext, [(0, start, self.command_color),
+                                       (start, stop, self.selection_color),
+                                       (stop, len(ltext), self.command_color)])
+        state = (self.prompt, self.prompt_color, self.prompt_end_pos, c.size())
+        renderer = self._renderer
+        if renderer.can_update(state, cells):
+            n = renderer.update(cells)
+            x, y = renderer.position(len(cells))
+            redrawn = False
+        else:
+            c.pos(*self.prompt_begin_pos)
+            self._print_prompt()
+            if start < stop:
+                n = c.write_scrolling(ltext[:start], self.command_color)
+                n = c.write_scrolling(ltext[start:stop], self.selection_color)
+                n = c.write_scrolling(ltext[stop:], self.command_color)
+            else:
+                n = c.write_scrolling(ltext, self.command_color)
+            x, y = c.pos()
+            redrawn = True
 
         # Preserve one line for Asian IME(Input Method Editor) statusbar
-        x, y = c.pos()
         w, h = c.size()
         if (y >= h - 1) or (n > 0):
             c.scroll_window(-1)
@@ -543,12 +680,16 @@ class Readline(BaseReadline):
             n += 1
 
         self._update_prompt_pos(n)
-        if hasattr(c, "clear_to_end_of_window"):
-            # Work around function for ironpython due
-            # to System.Console's lack of FillFunction
-            c.clear_to_end_of_window()
-        else:
-            self._clear_after()
+        if redrawn:
+            if hasattr(c, "clear_to_end_of_window"):
+                # Work around function for ironpython due
+                # to System.Console's lack of FillFunction
+                c.clear_to_end_of_window()
+            else:
+                self._clear_after()
+        renderer.drawn(
+            (self.prompt, self.prompt_color, self.prompt_end_pos, c.size()),
+            self.prompt_end_pos, cells)
 
         # Show cursor, set size vi mode changes size in insert/overwrite mode
         c.cursor(1, size=self.mode.cursor_size)
@@ -561,6 +702,7 @@ class Readline(BaseReadline):
         if self.keyboard_poll():
             line = self.get_line_buffer() + '\n'
             self.console.write("\r\n")
+            self._renderer.invalidate()
             # however there is another newline added by
             # self.mode.readline_setup(prompt) which is called by callback_handler_install
             # this differs from GNU readline
@@ -590,15 +732,25 @@ class Readline(BaseReadline):
         def nop(e):
             pass
 
-        try:
-            event = c.getkeypress()
-        except KeyboardInterrupt:
-            event = self.handle_ctrl_c()
-        try:
-            result = self.mode.process_keyevent(event.keyinfo)
-        except EOFError:
-            logger.stop_logging()
-            raise
+        # Keys that are already queued (typeahead, pasted text) are handled
+        # in one batch and the line is only redrawn after the last one.
+        deadline = time.time() + self.key_batch_latency
+        count = 0
+        while 1:
+            try:
+                event = c.getkeypress()
+            except KeyboardInterrupt:
+                event = self.handle_ctrl_c()
+            try:
+                result = self.mode.process_keyevent(event.keyinfo)
+            except EOFError:
+                logger.stop_logging()
+                raise
+            count += 1
+            if (result or count >= self.key_batch_size or
+                    self.mode.paste_line_buffer or time.time() >= deadline or
+                    not c.keypress_pending()):
+                break
         self._update_line()
         return result
 
@@ -612,7 +764,9 @@ class Readline(BaseReadline):
         self.ctrl_c_timeout = time.time()
         self._readline_from_keyboard()
         self.console.write('\r\n')
-        log('returning(%s)' % self.get_line_buffer())
+        self._renderer.invalidate()
+        if logger.enabled:
+            log('returning(%s)', self.get_line_buffer())
         return self.get_line_buffer() + '\n'
 
     def handle_ctrl_c(self):
@@ -7,7 +7,7 @@
 #*****************************************************************************
 from __future__ import print_function, unicode_literals, absolute_import
 from pyreadline.modes.emacs import *
-from pyreadline.lineeditor import lineobj
+from pyreadline.lineeditor import lineobj, history
 from pyreadline.keysyms.common import make_KeyPress_from_keydescr
 
 import unittest2 as unittest
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, absolute_import
+
+import os
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+
+from pyreadline.completion.cache import CompletionCache
+from pyreadline.completion.display import CompletionDisplay
+from pyreadline.completion.filesystem import FilesystemCompleter
+from pyreadline.completion.scheduler import CompletionScheduler
+from pyreadline.modes.basemode import commonprefix
+
+
+def quadratic_commonprefix(m):
+    """The commonprefix basemode used to have."""
+    if not m:
+        return ''
+    prefix = m[0]
+    for item in m:
+        for i in range(len(prefix)):
+            if prefix[:i + 1].lower() != item[:i + 1].lower():
+                prefix = prefix[:i]
+                if i == 0:
+                    return ''
+                break
+    return prefix
+
+
+class Test_completion_cache(unittest.TestCase):
+    def test_same_word(self):
+        cache = CompletionCache()
+        self.assertEqual(None, cache.get("key", "ab"))
+        cache.put("key", "ab", ["abc", "abd"])
+        self.assertEqual(["abc", "abd"], cache.get("key", "ab"))
+        self.assertEqual(None, cache.get("other", "ab"))
+
+    def test_narrowing(self):
+        cache = CompletionCache()
+        cache.put("key", "a", ["abc", "abd", "ax"])
+        self.assertEqual(["abc", "abd"], cache.get("key", "ab"))
+        self.assertEqual(["abd"], cache.get("key", "abd"))
+        # shorter words are not known any more
+        self.assertEqual(None, cache.get("key", "ab"))
+
+    def test_no_match_asks_again(self):
+        cache = CompletionCache()
+        cache.put("key", "os", ["os"])
+        self.assertEqual(None, cache.get("key", "os."))
+
+    def test_not_narrowed_unless_all_start_with_word(self):
+        cache = CompletionCache()
+        cache.put("key", "~/a", ["/home/me/ab", "/home/me/ac"])
+        self.assertEqual(None, cache.get("key", "~/ab"))
+
+    def test_disabled(self):
+        cache = CompletionCache(enabled=False)
+        cache.put("key", "a", ["ab"])
+        self.assertEqual(None, cache.get("key", "a"))
+
+
+class Test_commonprefix(unittest.TestCase):
+    def test_examples(self):
+        self.assertEqual("", commonprefix([]))
+        self.assertEqual("abc", commonprefix(["abc"]))
+        self.assertEqual("Ab", commonprefix(["Abc", "aBd", "ab"]))
+        self.assertEqual("", commonprefix(["abc", "xbc"]))
+
+    def test_lower_changes_length(self):
+        self.assertEqual("\u0130", commonprefix(["\u0130a", "\u0130b"]))
+        self.assertEqual("\u0130a", commonprefix(["\u0130ab", "\u0130ac"]))
+
+    def test_same_as_quadratic(self):
+        rnd = random.Random(4711)
+        for i in range(2000):
+            m = ["".join(rnd.choice("aAbB\u0130") for j in range(rnd.randint(0, 6)))
+                 for k in range(rnd.randint(1, 5))]
+            self.assertEqual(quadratic_commonprefix(m), commonprefix(m))
+
+
+class Test_filesystem_completer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name in ["alpha.txt", "alps", ".hidden", "beta"]:
+            open(os.path.join(self.directory, name), "w").close()
+        os.mkdir(os.path.join(self.directory, "alpine"))
+        self.completer = FilesystemCompleter()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def complete(self, text, mark_directories=True):
+        return sorted(self.completer.complete(
+            os.path.join(self.directory, text), mark_directories))
+
+    def path(self, *names):
+        return [os.path.join(self.directory, name) for name in names]
+
+    def test_complete(self):
+        self.assertEqual(self.path("alpha.txt", "alpine" + os.sep, "alps"),
+                         self.complete("al"))
+        self.assertEqual(self.path("alpine"), self.complete("alpi", False))
+        self.assertEqual([], self.complete("x"))
+        self.assertEqual([], self.complete("missing" + os.sep + "a"))
+
+    def test_hidden(self):
+        self.assertEqual(4, len(self.complete("")))
+        self.assertEqual(self.path(".hidden"), self.complete("."))
+
+    def test_listing_reused_until_directory_changes(self):
+        mtime = os.stat(self.directory).st_mtime_ns
+        self.assertEqual(self.path("beta"), self.complete("b"))
+        open(os.path.join(self.directory, "bet"), "w").close()
+        os.utime(self.directory, ns=(mtime, mtime))
+        self.assertEqual(self.path("beta"), self.complete("b"))
+        mtime += 10 ** 10
+        os.utime(self.directory, ns=(mtime, mtime))
+        self.assertEqual(self.path("bet", "beta"), self.complete("b"))
+
+
+class Test_completion_scheduler(unittest.TestCase):
+    def test_without_workers(self):
+        scheduler = CompletionScheduler()
+        self.assertFalse(scheduler.concurrent)
+        self.assertEqual({"a": ["x"], "b": []}, scheduler.run(
+            "key", [("a", lambda text: [text], "x"),
+                    ("b", lambda text: [], "x")]))
+
+    def test_late_result_returned_next_time(self):
+        scheduler = CompletionScheduler(workers=2, timeout=0.01)
+        release = threading.Event()
+        calls = []
+
+        def slow(text):
+            calls.append(text)
+            release.wait(5)
+            return [text + "1"]
+
+        sources = [("slow", slow, "a"), ("fast", lambda text: [text], "a")]
+        self.assertEqual({"fast": ["a"]}, scheduler.run("key", sources))
+        release.set()
+        scheduler.timeout = 5
+        self.assertEqual({"slow": ["a1"], "fast": ["a"]},
+                         scheduler.run("key", sources))
+        self.assertEqual(["a"], calls)
+        scheduler.workers = 0
+
+    def test_new_key_drops_stale_work(self):
+        scheduler = CompletionScheduler(workers=1, timeout=0.01)
+        release = threading.Event()
+
+        def slow(text):
+            release.wait(5)
+            return [text]
+
+        self.assertEqual({}, scheduler.run("a", [("slow", slow, "a")]))
+        release.set()
+        scheduler.timeout = 5
+        self.assertEqual({"slow": ["ab"]},
+                         scheduler.run("ab", [("slow", slow, "ab")]))
+        scheduler.workers = 0
+
+    def test_failing_source(self):
+        scheduler = CompletionScheduler(workers=1, timeout=5)
+
+        def fail(text):
+            raise ValueError(text)
+
+        self.assertEqual({"fail": []}, scheduler.run("key",
+                                                     [("fail", fail, "")]))
+        scheduler.workers = 0
+
+
+class Test_completion_display(unittest.TestCase):
+    def test_layout(self):
+        display = CompletionDisplay()
+        completions = ["a", "bbb", "cc", "d", "e"]
+        self.assertEqual((4, 2, 3), display.layout(completions, 10))
+        self.assertEqual((4, 1, 5), display.layout(completions, 5))
+        self.assertEqual("a   d   \n", display.row(completions, 10, 0))
+        self.assertEqual("bbb e   \ncc  \n",
+                         display.rows(completions, 10, 1, 10))
+
+    def test_layout_follows_list(self):
+        display = CompletionDisplay()
+        self.assertEqual((2, 4, 1), display.layout(["a"] * 4, 10))
+        self.assertEqual((5, 1, 2), display.layout(["abcd", "e"], 10))
@@ -352,6 +352,24 @@ class TestsHistory(unittest.TestCase):
         r.input('Up')
         self.assert_line(r, 'k', 1)
 
+    def test_incremental_search_begins_once(self):
+        r = EmacsModeTest()
+        for line in ['aaba', 'akca', 'bbb', 'ako']:
+            r.add_history(line)
+        history = r._history
+        calls = []
+        finish_loading = history.finish_loading
+        history.finish_loading = lambda: calls.append(finish_loading())
+
+        def press(*keys):
+            for key in keys:
+                keyinfo, event = keytext_to_keyinfo_and_event(key)
+                r.process_keyevent(keyinfo)
+        press('Control-r', '"a"', '"k"', '"c"')
+        self.assertEqual('akca', r.line)
+        press('Control-r', 'BackSpace')
+        self.assertEqual(1, len(calls))
+
     def test_complete(self):
         import rlcompleter
 
@@ -384,6 +402,72 @@ class TestsHistory(unittest.TestCase):
         r.input('Tab')
         self.assert_line(r, "exit", 4)
 
+    def test_completions_unique_in_order(self):
+        r = EmacsModeTest()
+        r.lst_completions = ["bb", "ab", "", "bb", "ab", "ac", None]
+        r.input('"x"')
+        self.assertEqual(["bb", "ab", "ac"], r._get_completions())
+
+    def test_bulk_completer(self):
+        r = EmacsModeTest()
+        calls = []
+
+        def bulk(text):
+            calls.append(text)
+            return ["%s%d" % (text, i % 3) for i in range(10)]
+
+        r.bulk_completer = bulk
+        r.input('"ab cd"')
+        self.assertEqual(["cd0", "cd1", "cd2"], r._get_completions())
+        self.assertEqual(["cd"], calls)
+        self.assertEqual(3, r.begidx)
+        r.bulk_completer = lambda text: None
+        self.assertEqual([], r._get_completions())
+
+    def test_completion_cache(self):
+        r = EmacsModeTest()
+        calls = []
+
+        def bulk(text):
+            calls.append(text)
+            return [c for c in ["abc", "abd", "xyz"] if c.startswith(text)]
+
+        r.bulk_completer = bulk
+        r.input('"x a"')
+        self.assertEqual(["abc", "abd"], r._get_completions())
+        r.input('"b"')
+        self.assertEqual(["abc", "abd"], r._get_completions())
+        r.input('"d"')
+        self.assertEqual(["abd"], r._get_completions())
+        self.assertEqual(["a"], calls)
+        # changing the line before the word asks the completer again
+        r.input('Home')
+        r.input('"y"')
+        r.input('End')
+        self.assertEqual(["abd"], r._get_completions())
+        self.assertEqual(["a", "abd"], calls)
+
+    def test_completer_on_thread_pool(self):
+        import threading
+        r = EmacsModeTest()
+        release = threading.Event()
+
+        def bulk(text):
+            release.wait(5)
+            return [text + "x"]
+
+        r.bulk_completer = bulk
+        r._completion_scheduler.workers = 1
+        r._completion_scheduler.timeout = 0.01
+        try:
+            r.input('"ab"')
+            self.assertEqual([], r._get_completions())
+            release.set()
+            r._completion_scheduler.timeout = 5
+            self.assertEqual(["abx"], r._get_completions())
+        finally:
+            r._completion_scheduler.workers = 0
+
     def assert_line(self, r, line, cursor):
         self.assertEqual(r.line, line)
         self.assertEqual(r.line_cursor, cursor)
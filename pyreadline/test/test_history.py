@@ -7,14 +7,27 @@ try:
 except ImportError:
     from test.test_support import unlink
 
+import atexit
+import gc
+import random
 import tempfile
+import threading
 import os
 import unittest2
+import weakref
 
 from pyreadline.lineeditor import lineobj
 from pyreadline.lineeditor.history import LineHistory
+from pyreadline.lineeditor.historybuffer import HistoryBuffer
+from pyreadline.lineeditor.historyindex import PrefixIndex
+from pyreadline.lineeditor import historyio
+from pyreadline.lineeditor.historyjournal import HistoryJournal
+from pyreadline.lineeditor import historybinary
 
-import readline
+try:
+    import readline
+except (ImportError, RuntimeError):
+    readline = None
 
 import pyreadline.logger
 pyreadline.logger.sock_silent = False
@@ -26,6 +39,56 @@ pyreadline.logger.sock_silent = False
 RL = lineobj.ReadLineTextBuffer
 
 
+def make_history(lines=(), filename=None, **options):
+    """Return a LineHistory with the attributes in options set, lines added
+    and filename read, if given."""
+    q = LineHistory()
+    for name, value in options.items():
+        setattr(q, name, value)
+    for line in lines:
+        q.add_history(line)
+    if filename is not None:
+        q.read_history_file(filename)
+    return q
+
+
+class HistoryTestCase(unittest2.TestCase):
+    def assertSameSearches(self, q, ref, queries):
+        """Check that prefix and incremental searches for each of queries
+        find the same entries in q as in ref."""
+        for query in queries:
+            for h in (q, ref):
+                h.history_cursor = len(h.history)
+                h.lastcommand = None
+            a = q.history_search_backward(RL(query, point=len(query)))
+            b = ref.history_search_backward(RL(query, point=len(query)))
+            self.assertEqual(b.get_line_text(), a.get_line_text())
+            self.assertEqual(ref.history_cursor, q.history_cursor)
+            for h in (q, ref):
+                h.history_cursor = len(h.history) - 1
+                h.last_search_for = ""
+            self.assertEqual(ref.reverse_search_history(query),
+                             q.reverse_search_history(query))
+            self.assertEqual(ref.history_cursor, q.history_cursor)
+
+
+class HistoryFileTestCase(unittest2.TestCase):
+    """Tests on the history file self.filename, holding content."""
+    content = b""
+    suffix = ""
+
+    def setUp(self):
+        hfile = tempfile.NamedTemporaryFile(suffix=self.suffix, delete=False)
+        hfile.write(self.content)
+        hfile.close()
+        self.filename = hfile.name
+        self.addCleanup(unlink, self.filename)
+
+    def patch(self, obj, name, value):
+        self.addCleanup(setattr, obj, name, getattr(obj, name))
+        setattr(obj, name, value)
+
+
 class Test_prev_next_history(unittest2.TestCase):
     t = "test text"
 
@@ -100,6 +163,144 @@ class TestSearchHistory(unittest2.TestCase):
             assert res.get_line_text() == x
 
 
+class TestPrefixIndexSearch(unittest2.TestCase):
+    lines = ["aaaa", "aaba", "aaca", "    aacax", "akca", "bbb", "ako",
+             "aaba", "b", "aa"]
+
+    def make_history(self, use_index):
+        q = LineHistory()
+        q.use_prefix_index = use_index
+        for x in self.lines:
+            q.add_history(RL(x))
+        return q
+
+    def walk(self, q, direction, text, point):
+        a = RL(text, point=point)
+        result = []
+        for i in range(len(self.lines) + 2):
+            if direction < 0:
+                a = q.history_search_backward(a)
+                q.lastcommand = q.history_search_backward
+            else:
+                a = q.history_search_forward(a)
+                q.lastcommand = q.history_search_forward
+            result.append((a.get_line_text(), a.point, q.history_cursor))
+        return result
+
+    def test_same_as_scan(self):
+        for prefix in ["", "a", "aa", "aab", "b", "x", "    "]:
+            for direction in [-1, 1]:
+                scan = self.make_history(False)
+                indexed = self.make_history(True)
+                if direction > 0:
+                    scan.beginning_of_history()
+                    indexed.beginning_of_history()
+                self.assertEqual(
+                    self.walk(scan, direction, prefix, len(prefix)),
+                    self.walk(indexed, direction, prefix, len(prefix)))
+
+    def test_index_follows_updates(self):
+        q = self.make_history(True)
+        q.replace_history_item(6, "aazz")
+        q.remove_history_item(1)
+        q.add_history(RL("akk"))
+        a = RL("aa", point=2)
+        res = [q.history_search_backward(a).get_line_text()]
+        q.lastcommand = q.history_search_backward
+        res.append(q.history_search_backward(a).get_line_text())
+        res.append(q.history_search_backward(a).get_line_text())
+        self.assertEqual(["aa", "aaba", "aazz"], res)
+        q.clear_history()
+        q.add_history(RL("abc"))
+        q.lastcommand = None
+        res = q.history_search_backward(RL("ab", point=2))
+        self.assertEqual("abc", res.get_line_text())
+
+    def test_rebuild_same_as_add(self):
+        built = PrefixIndex()
+        built.rebuild(self.lines)
+        added = PrefixIndex()
+        for position, text in enumerate(self.lines):
+            added.add(text, position)
+        for index in (built, added):
+            index.discard("akca", 4)
+            index.discard("aaba", 1)
+            index.discard("bbb", 5)
+            index.discard("aa", 9)
+            index.add("bbb", 10)
+        for prefix in ["", "a", "aa", "aab", "ak", "b", "x"]:
+            for start, direction in [(0, 1), (11, -1), (5, 1), (5, -1)]:
+                self.assertEqual(added.find(prefix, start, direction),
+                                 built.find(prefix, start, direction))
+        self.assertEqual(7, built.find("aab", 11, -1))
+        self.assertEqual(10, built.find("b", 9, 1))
+        self.assertEqual(None, built.find("akc", 0, 1))
+
+
+class TestSubstringIndexSearch(unittest2.TestCase):
+    lines = ["aaaa", "aaba", "aaca", "    aacax", "akca", "bbb", "ako",
+             "aaba", "b", "aacab"]
+
+    def make_history(self, use_index):
+        q = LineHistory()
+        q.use_substring_index = use_index
+        for x in self.lines:
+            q.add_history(RL(x))
+        return q
+
+    def walk(self, q, search, text):
+        result = []
+        for i in range(len(self.lines) + 2):
+            result.append((search(q, text), q.history_cursor))
+        return result
+
+    def test_same_as_scan(self):
+        searches = [LineHistory.reverse_search_history,
+                    LineHistory.forward_search_history]
+        for text in ["", "a", "aa", "aac", "aca", "acab", "bb", "xyz", " aa"]:
+            for search in searches:
+                for start in [0, 4, len(self.lines) - 1]:
+                    scan = self.make_history(False)
+                    indexed = self.make_history(True)
+                    scan.history_cursor = start
+                    indexed.history_cursor = start
+                    self.assertEqual(self.walk(scan, search, text),
+                                     self.walk(indexed, search, text))
+
+    def test_index_follows_updates(self):
+        q = self.make_history(True)
+        q.replace_history_item(8, "xaacx")
+        q.remove_history_item(2)
+        q.add_history(RL("zzz"))
+        res = [q.reverse_search_history("aac") for i in range(3)]
+        self.assertEqual(["aacab", "xaacx", "    aacax"], res)
+        q.clear_history()
+        q.add_history(RL("abc"))
+        q.add_history(RL("abcd"))
+        self.assertEqual("abcd", q.reverse_search_history("bcd"))
+
+    def test_remove_with_cursor_in_history(self):
+        q = self.make_history(True)
+        q.history_cursor = 5
+        q.remove_history_item(2)
+        self.assertEqual(4, q.history_cursor)
+        self.assertEqual("    aacax", q.reverse_search_history("aac"))
+
+    def test_index_built_by_first_search(self):
+        q = self.make_history(True)
+        self.assertTrue(q._ngram_index.stale)
+        q.history_search_backward(RL("aa"))
+        self.assertTrue(q._ngram_index.stale)
+        self.assertEqual("aacab", q.reverse_search_history("aca"))
+        self.assertFalse(q._ngram_index.stale)
+        q.add_history(RL("xacay"))
+        q.history_cursor = len(q.history)
+        self.assertEqual("xacay", q.reverse_search_history("cay"))
+        q.clear_history()
+        q.add_history(RL("abc"))
+        self.assertTrue(q._ngram_index.stale)
+
+
 class Test_history_search_incr_fwd_backwd(unittest2.TestCase):
     def setUp(self):
         self.q = q = LineHistory()
@@ -147,6 +348,640 @@ class Test_empty_history_search_incr_fwd_backwd(unittest2.TestCase):
         self.assertEqual(q.forward_search_history("a"), "")
 
 
+class TestHistoryStorage(unittest2.TestCase):
+    def test_entries_are_strings(self):
+        q = LineHistory()
+        q.add_history(RL("first line"))
+        q.add_history("second line")
+        q.replace_history_item(0, RL("replaced line"))
+        self.assertEqual(["replaced line", "second line"], q.history)
+        self.assertEqual("replaced line", q.get_history_item(1))
+        self.assertEqual("second line", q.get_history_item(2))
+
+    def test_recall_gives_own_buffer(self):
+        q = LineHistory()
+        q.add_history(RL("first line"))
+        l = RL("")
+        q.previous_history(l)
+        self.assertEqual("first line", l.get_line_text())
+        l.insert_text("x")
+        self.assertEqual("first line", q.get_history_item(1))
+
+    def test_read_write_file(self):
+        hfile = tempfile.NamedTemporaryFile(delete=False)
+        hfile.close()
+        self.addCleanup(unlink, hfile.name)
+        q = LineHistory()
+        q.add_history("first line")
+        q.add_history("second line")
+        q.write_history_file(hfile.name)
+        q.clear_history()
+        q.read_history_file(hfile.name)
+        self.assertEqual(["first line", "second line"], q.history)
+
+
+class TestHistoryIO(HistoryFileTestCase):
+    def test_blocks_split_characters(self):
+        lines = ["line %d \xe5\xe4\xf6 \u20ac" % i for i in range(100)]
+        self.patch(historyio, "BLOCK_SIZE", 7)
+        self.patch(historyio, "CHUNK_LINES", 3)
+        with open(self.filename, "wb") as f:
+            historyio.write_lines(f, lines, "utf-8")
+        with open(self.filename, "rb") as f:
+            self.assertEqual("\n".join(lines) + "\n",
+                             f.read().decode("utf-8"))
+        with open(self.filename, "rb") as f:
+            read = [line for block in historyio.read_lines(f, "utf-8")
+                    for line in block]
+        self.assertEqual(lines, read)
+
+    def test_last_line_without_newline(self):
+        with open(self.filename, "wb") as f:
+            f.write(b"first\r\n\n  \nsecond  \nthird")
+        with open(self.filename, "rb") as f:
+            read = [line for block in historyio.read_lines(f, "ascii")
+                    for line in block]
+        self.assertEqual(["first", "second", "third"], read)
+
+    def test_history_encoding(self):
+        q = LineHistory()
+        q.encoding = "utf-8"
+        q.add_history("\u20ac 1")
+        q.write_history_file(self.filename)
+        with open(self.filename, "rb") as f:
+            self.assertEqual("\u20ac 1\n".encode("utf-8"), f.read())
+        q.clear_history()
+        q.read_history_file(self.filename)
+        self.assertEqual(["\u20ac 1"], q.history)
+        q.encoding = "ascii"
+        q.write_history_file(self.filename)
+        with open(self.filename, "rb") as f:
+            self.assertEqual(b"? 1\n", f.read())
+        self.assertEqual("ascii", historyio.history_encoding("no such codec"))
+
+    def test_history_length(self):
+        q = LineHistory()
+        for i in range(5):
+            q.add_history("line %d" % i)
+        for length, written in ((-1, 5), (0, 0), (2, 2), (10, 5)):
+            q.history_length = length
+            q.write_history_file(self.filename)
+            with open(self.filename) as f:
+                self.assertEqual(q.history[5 - written:],
+                                 f.read().splitlines())
+
+
+class TestHistoryBuffer(unittest2.TestCase):
+    def test_same_as_list(self):
+        buf = HistoryBuffer()
+        ref = []
+        for i in range(500):
+            buf.append("line %d" % i)
+            ref.append("line %d" % i)
+            if i % 3:
+                self.assertEqual(ref.pop(0), buf.popleft())
+            self.assertEqual(ref, buf)
+        self.assertEqual(ref[-10:], buf[-10:])
+        self.assertEqual(ref[::-1], buf[::-1])
+        self.assertEqual(ref[-1], buf[-1])
+        self.assertEqual(333, buf.first_id)
+        del buf[5]
+        del ref[5]
+        buf[0] = ref[0] = "replaced"
+        self.assertEqual(ref, list(buf))
+        self.assertRaises(IndexError, lambda: buf[len(ref)])
+
+    def test_discard_id(self):
+        buf = HistoryBuffer("line %d" % i for i in range(200))
+        ref = list(buf)
+        for id in [0, 1, 5, 100, 150, 199, 5]:
+            buf.discard_id(id)
+        for i in [199, 150, 100, 5, 1, 0]:
+            del ref[i]
+        self.assertEqual(len(ref), len(buf))
+        self.assertEqual(ref[-1], buf.last())
+        self.assertEqual((ref[0], 2), buf.peekleft())
+        self.assertEqual(ref[0], buf.popleft())
+        buf.discard_id(3)
+        buf.append("new")
+        del ref[:2]
+        ref.append("new")
+        self.assertEqual(ref, buf)
+        self.assertEqual(None, buf.index_of(150))
+        self.assertEqual(ref.index("line 151"), buf.index_of(151))
+
+    def test_dead_slots_same_as_list(self):
+        rnd = random.Random(4711)
+        buf = HistoryBuffer()
+        ref = []
+        for i in range(2000):
+            info = (float(i), i % 7, i % 2)
+            id = buf.append("line %d" % i, info)
+            ref.append(("line %d" % i, id, info))
+            if rnd.random() < 0.4:
+                buf.discard_id(ref.pop(rnd.randrange(len(ref)))[1])
+            if ref and rnd.random() < 0.1:
+                self.assertEqual(ref.pop(0)[0], buf.popleft())
+            self.assertEqual(len(ref), len(buf))
+            if not ref:
+                continue
+            j = rnd.randrange(len(ref))
+            self.assertEqual(ref[j][0], buf[j])
+            self.assertEqual(ref[j][1], buf.id_at(j))
+            self.assertEqual(ref[j][2], buf.info(j))
+            self.assertEqual(j, buf.index_of(ref[j][1]))
+        self.assertEqual([r[0] for r in ref], list(buf))
+        self.assertEqual([r[0] for r in ref][-20::3], buf[-20::3])
+        self.assertEqual([r[1] for r in ref], list(buf.ids()))
+        self.assertEqual(tuple(list(c) for c in zip(*[r[2] for r in ref])),
+                         buf.info_columns())
+        self.assertEqual(ref[0][1], buf.first_id)
+
+
+class TestBoundedHistory(HistoryTestCase):
+    def history(self, lines, max_entries, **options):
+        return make_history(lines, max_entries=max_entries, **options)
+
+    def test_oldest_entries_are_dropped(self):
+        q = self.history(["line %d" % i for i in range(10)], 3)
+        self.assertEqual(["line 7", "line 8", "line 9"], q.history)
+        self.assertEqual(3, q.history_cursor)
+        q.max_entries = 2
+        self.assertEqual(["line 8", "line 9"], q.history)
+        self.assertEqual(2, q.history_cursor)
+
+    def test_bulk_add_keeps_last_lines(self):
+        q = self.history(["old"], 3)
+        q.parse_history_from_string("\n".join("line %d" % i
+                                              for i in range(10)))
+        self.assertEqual(["line 7", "line 8", "line 9"], q.history)
+        self.assertEqual(3, q.history_cursor)
+        q = self.history(["old"], 3)
+        q.parse_history_from_string("line 1\nline 2")
+        self.assertEqual(["old", "line 1", "line 2"], q.history)
+
+    def test_cursor_follows_entry(self):
+        q = self.history(["a", "b", "c"], 3)
+        l = RL("current")
+        q.previous_history(l)
+        self.assertEqual("c", l.get_line_text())
+        q.previous_history(l)
+        self.assertEqual("b", l.get_line_text())
+        q.next_history(l)
+        self.assertEqual("c", l.get_line_text())
+        q.next_history(l)
+        self.assertEqual("current", l.get_line_text())
+
+    def test_remove_moves_cursor(self):
+        q = self.history(["a", "b", "c", "d", "e"], 4)
+        q.history_cursor = 2
+        q.remove_history_item(0)
+        self.assertEqual(["c", "d", "e"], q.history)
+        self.assertEqual("d", q.history[q.history_cursor])
+        q.history_cursor = len(q.history)
+        q.remove_history_item(0)
+        self.assertEqual(len(q.history) - 1, q.history_cursor)
+
+    def test_searches_same_as_scan(self):
+        lines = ["%s %d" % (word, i) for i in range(200)
+                 for word in ("ls", "cd", "echo", "less")]
+        for index in (True, False):
+            for options in ({"use_prefix_index": index},
+                            {"use_substring_index": index}):
+                q = self.history(lines, 50, **options)
+                ref = self.history(lines[-50:], -1, use_prefix_index=False,
+                                   use_substring_index=False)
+                self.assertSameSearches(q, ref, ("l", "ls", "echo", "less 19",
+                                                 "s 1", "zz"))
+
+
+class TestHistoryControl(HistoryTestCase):
+    def test_ignorespace(self):
+        q = make_history(["ls", " secret", "cd"], ignorespace=True)
+        self.assertEqual(["ls", "cd"], q.history)
+
+    def test_ignoredups(self):
+        q = make_history(["ls", "ls", "cd", "ls", "ls"], ignoredups=True)
+        self.assertEqual(["ls", "cd", "ls"], q.history)
+        self.assertEqual(3, q.history_cursor)
+
+    def test_erasedups(self):
+        q = make_history(["ls", "cd", "ls", "make", "cd", "ls"],
+                         erasedups=True)
+        self.assertEqual(["make", "cd", "ls"], q.history)
+        self.assertEqual(3, q.history_cursor)
+
+    def test_erasedups_keeps_searches_right(self):
+        lines = ["ls %d" % (i % 7) for i in range(100)] + \
+                ["less %d" % (i % 5) for i in range(100)]
+        q = make_history(lines, erasedups=True, max_entries=8)
+        expected = ["ls 6", "ls 1", "less 0", "less 1", "less 2", "less 3",
+                    "less 4", "ls 0"]
+        q.add_history("ls 0")
+        self.assertEqual(expected, q.history)
+        ref = make_history(expected, use_prefix_index=False,
+                           use_substring_index=False)
+        self.assertSameSearches(q, ref, ("l", "ls", "less", "ls 2", "ess 1"))
+
+    def test_erasedups_compacts_rarely(self):
+        q = make_history(["line %d" % i for i in range(100)], erasedups=True)
+        history = q.history
+        rebuilds = []
+        settle = history._settle
+
+        def counting_settle():
+            if history._dead:
+                rebuilds.append(len(history))
+            settle()
+        history._settle = counting_settle
+        l = RL("")
+        for i in range(0, 100, 2):
+            q.add_history("line %d" % i)
+            q.previous_history(l)
+            q.previous_history(l)
+            q.next_history(l)
+            self.assertEqual("line %d" % i, l.get_line_text())
+        self.assertTrue(len(rebuilds) <= 1)
+
+    def test_applied_when_reading_file(self):
+        hfile = tempfile.NamedTemporaryFile(delete=False)
+        hfile.write(b"ls\nls\n secret\ncd\nls\n")
+        hfile.close()
+        self.addCleanup(unlink, hfile.name)
+        q = make_history([], ignorespace=True, ignoredups=True)
+        q.read_history_file(hfile.name)
+        self.assertEqual(["ls", "cd", "ls"], q.history)
+        q = make_history([], erasedups=True)
+        q.read_history_file(hfile.name)
+        self.assertEqual([" secret", "cd", "ls"], q.history)
+
+
+class TestLazyLoad(HistoryFileTestCase):
+    content = "".join("line %d\n" % i for i in range(1000)).encode()
+
+    def history(self, lazy_load=10, **options):
+        return make_history(filename=self.filename, lazy_load=lazy_load,
+                            **options)
+
+    def test_tail_first(self):
+        q = self.history()
+        self.assertEqual(["line %d" % i for i in range(990, 1000)],
+                         q.history[:10])
+        self.assertEqual(1000, q.get_current_history_length())
+        self.assertEqual("line 0", q.get_history_item(1))
+
+    def test_backfill_at_add_history(self):
+        q = self.history()
+        q._loader.wait()
+        q.add_history("new line")
+        self.assertEqual(1001, len(q.history))
+        self.assertEqual(1001, q.history_cursor)
+        self.assertEqual("line 0", q.history[0])
+
+    def test_cursor_keeps_entry(self):
+        q = self.history()
+        l = RL("current")
+        for i in range(3):
+            q.previous_history(l)
+        self.assertEqual("line 997", l.get_line_text())
+        q.finish_loading()
+        self.assertEqual("line 997", q.history[q.history_cursor])
+        q.next_history(l)
+        self.assertEqual("line 998", l.get_line_text())
+
+    def test_browsing_past_tail(self):
+        q = self.history(lazy_load=2)
+        l = RL("")
+        for i in range(3):
+            q.previous_history(l)
+        self.assertEqual("line 997", l.get_line_text())
+
+    def test_search_past_tail(self):
+        q = self.history()
+        q.history_cursor = len(q.history)
+        result = q.history_search_backward(RL("line 5", point=6))
+        self.assertEqual("line 599", result.get_line_text())
+        self.assertEqual("line 599", q.history[q.history_cursor])
+        q.last_search_for = ""
+        self.assertEqual("line 499", q.reverse_search_history("line 49"))
+
+    def test_same_as_full_read(self):
+        for options in ({"ignoredups": True}, {"erasedups": True},
+                        {"max_entries": 5}, {"max_entries": 50}):
+            with open(self.filename, "ab") as f:
+                f.write(b"line 3\nline 3\n \nline 999\n")
+            full = self.history(lazy_load=0, **options)
+            q = self.history(**options)
+            q.finish_loading()
+            self.assertEqual(full.history, q.history)
+            self.assertEqual(full.history_cursor, q.history_cursor)
+
+    def test_write_waits_for_backfill(self):
+        q = self.history()
+        q.write_history_file(self.filename)
+        q = self.history(lazy_load=0)
+        self.assertEqual(100, len(q.history))
+
+
+class TestBinaryHistory(HistoryFileTestCase):
+    suffix = historybinary.EXTENSION
+
+    def setUp(self):
+        super(TestBinaryHistory, self).setUp()
+        self.records = [("line %d" % i, 1000.0 + i, i % 3, i % 2)
+                        for i in range(1000)]
+        lines, times, sessions, exits = map(list, zip(*self.records))
+        historybinary.write_binary(self.filename, lines,
+                                   (times, sessions, exits))
+
+    def history(self, lazy_load=0, **options):
+        return make_history(filename=self.filename, lazy_load=lazy_load,
+                            **options)
+
+    def test_random_access(self):
+        with historybinary.BinaryHistoryFile(self.filename) as f:
+            self.assertEqual(1000, len(f))
+            self.assertEqual(self.records[537], f.record(537))
+            self.assertEqual(self.records[-3:], f.tail(3))
+            self.assertEqual(self.records, f.records())
+            self.assertRaises(IndexError, f.record, 1000)
+
+    def test_read_write(self):
+        q = self.history(history_length=-1)
+        self.assertEqual([r[0] for r in self.records], q.history)
+        self.assertEqual((1005.0, 2, 1), q.get_history_info(6))
+        q.add_history("new line")
+        q.set_history_exit(1001, 256)
+        self.assertEqual(1, q.get_history_info(1001)[2])
+        q.set_history_exit(1000, -1)
+        q.set_history_exit(1000, 0)
+        q.write_history_file(self.filename)
+        q = self.history()
+        self.assertEqual("new line", q.get_history_item(1001))
+        timestamp, session, exit = q.get_history_info(1001)
+        self.assertTrue(timestamp > 1000.0)
+        self.assertEqual((q.session_id, 1), (session, exit))
+
+    def test_failed_write_keeps_file(self):
+        lines = ["fine", object()]
+        self.assertRaises(AttributeError, historybinary.write_binary,
+                          self.filename, lines)
+        self.assertFalse(os.path.exists(self.filename + ".tmp"))
+        with historybinary.BinaryHistoryFile(self.filename) as f:
+            self.assertEqual(self.records, f.records())
+
+    def test_append(self):
+        q = LineHistory()
+        q.add_history("appended")
+        q.append_history_file(1, self.filename)
+        with historybinary.BinaryHistoryFile(self.filename) as f:
+            self.assertEqual(1001, len(f))
+            self.assertEqual(self.records[999], f.record(999))
+            self.assertEqual("appended", f.text(1000))
+
+    def test_missing_footer(self):
+        with open(self.filename, "rb") as f:
+            data = f.read()
+        end = historybinary.FOOTER.unpack(data[-historybinary.FOOTER.size:])[0]
+        with open(self.filename, "wb") as f:
+            f.write(data[:end - 3])
+        with historybinary.BinaryHistoryFile(self.filename) as f:
+            self.assertEqual(self.records[:999], f.records())
+        historybinary.append_binary(self.filename, ["after"])
+        q = self.history()
+        self.assertEqual(1000, len(q.history))
+        self.assertEqual("after", q.history[-1])
+
+    def test_format_detection(self):
+        hfile = tempfile.NamedTemporaryFile(delete=False)
+        hfile.close()
+        self.addCleanup(unlink, hfile.name)
+        q = self.history(history_format="binary")
+        q.write_history_file(hfile.name)
+        self.assertTrue(historybinary.is_binary_history(hfile.name))
+        q = LineHistory()
+        q.read_history_file(hfile.name)
+        self.assertEqual("line 999", q.history[-1])
+        q.history_format = "text"
+        q.write_history_file(hfile.name)
+        with open(hfile.name, "rb") as f:
+            self.assertEqual(b"line 900\n", f.readline())
+
+    def test_lazy_load(self):
+        q = self.history(lazy_load=10)
+        self.assertEqual(["line %d" % i for i in range(990, 1000)],
+                         q.history[:10])
+        self.assertEqual(1000, q.get_current_history_length())
+        self.assertEqual("line 3", q.get_history_item(4))
+        self.assertEqual((1003.0, 0, 1), q.get_history_info(4))
+        q.finish_loading()
+        self.assertEqual([r[0] for r in self.records], q.history)
+        self.assertEqual((1003.0, 0, 1), q.get_history_info(4))
+        self.assertEqual(1000, q.history_cursor)
+
+    def test_loaded_entries_while_loading(self):
+        loaded = threading.Event()
+        self.addCleanup(loaded.set)
+        columns = historybinary.BinaryHistoryFile.columns
+
+        def slow_columns(f, start=0, stop=None):
+            if stop is not None:
+                loaded.wait(10)
+            return columns(f, start, stop)
+        self.patch(historybinary.BinaryHistoryFile, "columns", slow_columns)
+        q = self.history(lazy_load=10)
+        q.add_history("new line")
+        self.assertEqual("line 999", q.get_history_item(1000))
+        self.assertEqual((1999.0, 0, 1), q.get_history_info(1000))
+        self.assertEqual("new line", q.get_history_item(1001))
+        self.assertEqual("line 3", q.get_history_item(4))
+        self.assertFalse(q._loader.done)
+        loaded.set()
+        q.finish_loading()
+        self.assertEqual("line 999", q.get_history_item(1000))
+        self.assertEqual("new line", q.get_history_item(1001))
+
+    def test_lazy_load_with_control(self):
+        q = self.history(lazy_load=10)
+        reader = q._binary
+        q.clear_history()
+        self.assertTrue(reader.closed)
+        self.assertEqual(0, q.get_current_history_length())
+        q = self.history(lazy_load=10, max_entries=50)
+        self.assertEqual("line 950", q.get_history_item(1))
+        self.assertEqual((1950.0, 2, 0), q.get_history_info(1))
+
+    def test_convert(self):
+        text = self.filename + ".txt"
+        back = self.filename + ".back"
+        self.addCleanup(unlink, text)
+        self.addCleanup(unlink, back)
+        historybinary.binary_to_text(self.filename, text, "utf-8")
+        historybinary.text_to_binary(text, back, "utf-8", session=7)
+        with historybinary.BinaryHistoryFile(back) as f:
+            self.assertEqual([(r[0], 0.0, 7, 0) for r in self.records],
+                             f.records())
+
+
+class TestHistoryJournal(HistoryFileTestCase):
+    content = b"old line\n"
+
+    def lines(self):
+        with open(self.filename) as f:
+            return f.read().splitlines()
+
+    def test_lines_are_appended(self):
+        q = LineHistory()
+        q.history_filename = self.filename
+        q.journal = True
+        q.read_history_file()
+        q.add_history("first line")
+        q.add_history("second line")
+        q.write_history_file()
+        self.assertEqual(["old line", "first line", "second line"],
+                         self.lines())
+        q.close_journal()
+
+    @unittest2.skipUnless(hasattr(atexit, "unregister"), "Python 3 only")
+    def test_closed_journal_is_released(self):
+        journal = HistoryJournal(self.filename)
+        journal.close()
+        ref = weakref.ref(journal)
+        del journal
+        gc.collect()
+        self.assertEqual(None, ref())
+
+    def test_background_write(self):
+        journal = HistoryJournal(self.filename, interval=0.01)
+        self.addCleanup(journal.close)
+        journal.append("first line")
+        journal.append("second line")
+        for i in range(200):
+            if len(self.lines()) == 3:
+                break
+            journal._stop.wait(0.01)
+        self.assertEqual(["old line", "first line", "second line"],
+                         self.lines())
+
+    def test_close_writes_tail(self):
+        journal = HistoryJournal(self.filename, interval=60)
+        journal.append("first line")
+        journal.close()
+        self.assertEqual(["old line", "first line"], self.lines())
+        journal.append("late line")
+        self.assertEqual(["old line", "first line", "late line"],
+                         self.lines())
+
+    def test_compaction(self):
+        journal = HistoryJournal(self.filename, history_length=3,
+                                 interval=60)
+        self.addCleanup(journal.close)
+        for i in range(5):
+            journal.append("line %d" % i)
+            journal.flush()
+        self.assertEqual(["line 2", "line 3", "line 4"], self.lines())
+        journal.append("line 5")
+        journal.flush()
+        self.assertEqual(["line 2", "line 3", "line 4", "line 5"],
+                         self.lines())
+
+    def test_compaction_splits_on_newlines(self):
+        journal = HistoryJournal(self.filename, history_length=2,
+                                 interval=60)
+        self.addCleanup(journal.close)
+        journal.append("x")
+        journal.append("a\rb")
+        journal.append("e")
+        journal.flush()
+        with open(self.filename, "rb") as f:
+            self.assertEqual(b"a\rb\ne\n", f.read())
+
+    def test_write_to_other_file(self):
+        other = tempfile.NamedTemporaryFile(delete=False)
+        other.close()
+        self.addCleanup(unlink, other.name)
+        q = LineHistory()
+        q.history_filename = self.filename
+        q.journal = True
+        q.add_history("first line")
+        q.write_history_file(other.name)
+        q.close_journal()
+        with open(other.name) as f:
+            self.assertEqual(["first line"], f.read().splitlines())
+        self.assertEqual(["old line", "first line"], self.lines())
+
+
+class TestSharedHistory(HistoryFileTestCase):
+    content = b"old line\n"
+
+    def setUp(self):
+        super(TestSharedHistory, self).setUp()
+        self.addCleanup(unlink, self.filename + ".lock")
+
+    def session(self):
+        q = LineHistory()
+        q.history_filename = self.filename
+        q.shared = True
+        q.read_history_file()
+        self.addCleanup(q.close_journal)
+        return q
+
+    def test_lines_of_other_sessions_are_merged(self):
+        a = self.session()
+        b = self.session()
+        a.add_history("from a")
+        a.write_history_file()
+        b.add_history("from b")
+        self.assertEqual(["old line", "from a", "from b"], b.history)
+        b.write_history_file()
+        a.merge_shared_history()
+        self.assertEqual(["old line", "from a", "from b"], a.history)
+        self.assertEqual(len(a.history), a.history_cursor)
+        with open(self.filename) as f:
+            self.assertEqual(["old line", "from a", "from b"],
+                             f.read().splitlines())
+
+    def test_only_new_bytes_are_read(self):
+        a = self.session()
+        journal = a._journal
+        with open(self.filename, "ab") as f:
+            f.write(b"other 1\nother")
+        a.merge_shared_history()
+        self.assertEqual(["old line", "other 1"], a.history)
+        self.assertEqual(len(b"old line\nother 1\nother"), journal.offset)
+        with open(self.filename, "ab") as f:
+            f.write(b" 2\n")
+        a.merge_shared_history()
+        self.assertEqual(["old line", "other 1", "other 2"], a.history)
+
+    def test_no_merge_while_browsing(self):
+        a = self.session()
+        b = self.session()
+        b.add_history("from b")
+        b.write_history_file()
+        a.history_cursor = 0
+        a.merge_shared_history()
+        self.assertEqual(["old line"], a.history)
+        a.history_cursor = 1
+        a.merge_shared_history()
+        self.assertEqual(["old line", "from b"], a.history)
+
+    def test_compaction_by_other_session(self):
+        a = self.session()
+        b = self.session()
+        b.history_length = 2
+        for i in range(3):
+            b.add_history("line %d" % i)
+            b.write_history_file()
+        with open(self.filename) as f:
+            self.assertEqual(["line 1", "line 2"], f.read().splitlines())
+        a.merge_shared_history()
+        a.add_history("from a")
+        a.write_history_file()
+        b.merge_shared_history()
+        self.assertEqual("from a", b.history[-1])
+
+
 class TestHistoryManipulation(unittest2.TestCase):
     """These tests were added to check that the libedit emulation on OSX and
     the "real" readline have the same interface for history manipulation.
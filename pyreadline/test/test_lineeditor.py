@@ -1,9 +1,12 @@
 # Copyright (C) 2006  Michael Graz. <mgraz@plan10.com>
 from __future__ import print_function, unicode_literals, absolute_import
 
+import random
 import unittest
 
-from pyreadline.lineeditor import lineobj
+from pyreadline.lineeditor import lineobj, wordmatcher
+from pyreadline.lineeditor.gapbuffer import GapBuffer
+from pyreadline.lineeditor.undo import UndoHistory
 
 
 class Test_copy(unittest.TestCase):
@@ -358,6 +361,224 @@ class Test_movement(unittest.TestCase):
             self.assertEqual(p, cmd(l))
 
 
+class Test_gapbuffer(unittest.TestCase):
+    def test_same_as_list(self):
+        rnd = random.Random(4711)
+        ref = list("first second third")
+        buf = GapBuffer(ref)
+        for i in range(2000):
+            n = len(ref)
+            a = rnd.randint(-3, n + 3)
+            b = rnd.randint(-3, n + 3)
+            op = rnd.randint(0, 6)
+            if op == 0:
+                ref.insert(a, "x")
+                buf.insert(a, "x")
+            elif op == 1:
+                del ref[a:b]
+                del buf[a:b]
+            elif op == 2:
+                ref[a:b] = "yz"
+                buf[a:b] = "yz"
+            elif op == 3 and n:
+                a = rnd.randint(-n, n - 1)
+                del ref[a]
+                del buf[a]
+            elif op == 4 and n:
+                a = rnd.randint(-n, n - 1)
+                ref[a] = "w"
+                buf[a] = "w"
+            elif op == 5:
+                buf.append("q")
+                ref.append("q")
+            self.assertEqual(ref[a:b], buf[a:b])
+            self.assertEqual(ref, buf.tolist())
+            self.assertEqual("".join(ref), buf.text())
+            self.assertEqual(ref.count("x"), buf.count("x"))
+            if ref:
+                self.assertEqual(ref[-1], buf[-1])
+                self.assertEqual(ref[0], buf[0])
+
+    def test_index_error(self):
+        buf = GapBuffer("ab")
+        self.assertRaises(IndexError, lambda: buf[2])
+        self.assertRaises(IndexError, lambda: buf[-3])
+
+
+class Test_textline_buffer(unittest.TestCase):
+    def test_large_paste(self):
+        text = "0123456789" * 20000
+        l = lineobj.ReadLineTextBuffer("ab", point=1)
+        l.insert_text(text)
+        self.assertEqual("a" + text + "b", l.get_line_text())
+        self.assertEqual(len(text) + 1, l.point)
+
+    def test_assign_list(self):
+        l = lineobj.ReadLineTextBuffer("abc")
+        l.line_buffer = ["x", "y"]
+        self.assertEqual("xy", l.get_line_text())
+        self.assertEqual(["x", "y"], l.line_buffer)
+
+    def test_delete_reversed_range(self):
+        # same result as line_buffer[:start] + line_buffer[stop:]
+        l = lineobj.ReadLineTextBuffer("abcdef")
+        del l[4:2]
+        self.assertEqual("abcdcdef", l.get_line_text())
+
+
+class SnapshotUndo(object):
+    """The undo stack of full copies TextLine used before UndoHistory."""
+
+    def __init__(self):
+        self.stack = []
+
+    def push(self, l):
+        if self.stack and l.get_line_text() == self.stack[-1][0]:
+            self.stack[-1] = (self.stack[-1][0], l.point, self.stack[-1][2])
+        else:
+            self.stack.append((l.get_line_text(), l.point, l.mark))
+
+    def pop(self, l):
+        if len(self.stack) >= 2:
+            self.stack.pop()
+            l.line_buffer, l.point, l.mark = self.stack.pop()
+        else:
+            l.reset_line()
+            self.stack = []
+
+
+class Test_undo(unittest.TestCase):
+    def edit(self, rnd, l):
+        action = rnd.random()
+        if action < 0.5:
+            l.insert_text(rnd.choice("aab "))
+        elif action < 0.6:
+            l.insert_text("paste")
+        elif action < 0.7:
+            l.backward_delete_char()
+        elif action < 0.8:
+            l.point = rnd.randint(0, len(l))
+        elif action < 0.85:
+            l.mark = rnd.randint(-1, len(l))
+        elif action < 0.9:
+            l.kill_line()
+        else:
+            l.delete_char()
+
+    def test_same_as_snapshots(self):
+        rnd = random.Random(4711)
+        l = lineobj.ReadLineTextBuffer("")
+        reference = lineobj.ReadLineTextBuffer("")
+        snapshots = SnapshotUndo()
+        for i in range(3000):
+            if rnd.random() < 0.2:
+                l.pop_undo()
+                snapshots.pop(reference)
+            else:
+                self.edit(rnd, l)
+                reference.line_buffer = l.line_buffer
+                reference.point = l.point
+                reference.mark = l.mark
+            self.assertEqual(reference.get_line_text(), l.get_line_text())
+            self.assertEqual(reference.point, l.point)
+            self.assertEqual(reference.mark, l.mark)
+            l.push_undo()
+            snapshots.push(reference)
+
+    def test_typing_is_one_record(self):
+        undo = UndoHistory()
+        text = ""
+        for c in "some typed text":
+            text += c
+            undo.push(text, len(text), -1)
+        self.assertEqual(len("some typed text"), len(undo))
+        self.assertEqual(1, len(undo._records))
+        self.assertEqual(("some typed tex", 14, -1), undo.pop())
+
+    def test_memory_limit(self):
+        undo = UndoHistory(limit=5000)
+        for c in "abcdefghij":
+            undo.push(c * 1000, 0, -1)
+        self.assertTrue(undo.size <= 5000)
+        kept = len(undo)
+        self.assertTrue(1 < kept < 10)
+        self.assertEqual(("j" * 1000, 0, -1), undo.top())
+        while len(undo) > 1:
+            undo.pop()
+        # the oldest states were dropped
+        self.assertEqual(("abcdefghij"[10 - kept] * 1000, 0, -1), undo.top())
+
+    def test_undo_redo_same_as_list(self):
+        # the list of (text, point) states and cursor vi mode used to keep
+        rnd = random.Random(4711)
+        undo = UndoHistory()
+        states, cursor = [], -1
+        text = ""
+        for i in range(3000):
+            action = rnd.random()
+            if action < 0.6:
+                p = rnd.randint(0, len(text))
+                if rnd.random() < 0.7:
+                    text = text[:p] + rnd.choice("ab") + text[p:]
+                else:
+                    text = text[:p] + text[p + 2:]
+                point = min(p + 1, len(text))
+                del states[cursor + 1:]
+                if not states or states[cursor][0] != text:
+                    states.append((text, point))
+                    cursor += 1
+                    undo.push(text, point, -1)
+                else:
+                    undo.clear_redo()
+            elif action < 0.8:
+                if cursor > 0:
+                    cursor -= 1
+                    self.assertEqual(states[cursor] + (-1,), undo.undo())
+                else:
+                    self.assertEqual(None, undo.undo())
+            else:
+                if cursor < len(states) - 1:
+                    cursor += 1
+                    self.assertEqual(states[cursor] + (-1,), undo.redo())
+                else:
+                    self.assertEqual(None, undo.redo())
+                    self.assertFalse(undo.has_redo())
+            text = states[cursor][0]
+            self.assertEqual(cursor + 1, len(undo))
+
+    def test_revert(self):
+        l = lineobj.ReadLineTextBuffer("")
+        for c in "abc":
+            l.insert_text(c)
+            l.push_undo()
+        l.revert_undo()
+        self.assertEqual("", l.get_line_text())
+        self.assertEqual(0, l.point)
+        l.push_undo()
+        l.pop_undo()
+        self.assertEqual("", l.get_line_text())
+
+
+class Test_wordmatcher(unittest.TestCase):
+    def test_index_same_as_table(self):
+        rnd = random.Random(4711)
+        pairs = [
+            (wordmatcher.next_start_segment, wordmatcher.next_start_index),
+            (wordmatcher.next_end_segment, wordmatcher.next_end_index),
+            (wordmatcher.prev_start_segment, wordmatcher.prev_start_index),
+            (wordmatcher.prev_end_segment, wordmatcher.prev_end_index),
+        ]
+        is_word = wordmatcher.is_word_token
+        for i in range(500):
+            text = "".join(rnd.choice("ab  \t.")
+                           for j in range(rnd.randint(0, 12)))
+            for table, index in pairs:
+                expected = table(text, is_word)
+                for point in range(len(text) + 1):
+                    self.assertEqual(expected[point],
+                                     index(list(text), point, is_word))
+
+
 # ----------------------------------------------------------------------
 # utility functions
 
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, absolute_import
+
+import random
+import unittest
+
+from pyreadline.lineeditor.linerenderer import LineRenderer, is_plain, \
+    make_cells
+
+
+class RecordingConsole(object):
+    """Console keeping a grid of (char, attr) cells and a log of calls."""
+
+    def __init__(self, width=10, height=5):
+        self.width = width
+        self.height = height
+        self.grid = [[(" ", None)] * width for y in range(height)]
+        self.x = self.y = 0
+        self.calls = []
+
+    def size(self):
+        return self.width, self.height
+
+    def pos(self, x=None, y=None):
+        if x is None:
+            return self.x, self.y
+        self.calls.append(("pos", x, y))
+        self.x, self.y = x, y
+
+    def write_scrolling(self, text, attr=None):
+        self.calls.append(("write", text, attr))
+        scroll = 0
+        for c in text:
+            self.grid[self.y][self.x] = (c, attr)
+            self.x += 1
+            if self.x == self.width:
+                self.x = 0
+                self.y += 1
+            if self.y == self.height:
+                self.grid.pop(0)
+                self.grid.append([(" ", None)] * self.width)
+                self.y -= 1
+                scroll += 1
+        return scroll
+
+    def cells(self, origin, count):
+        x, y = origin
+        result = []
+        for i in range(x, x + count):
+            result.append(self.grid[y + i // self.width][i % self.width])
+        return result
+
+
+class Test_linerenderer(unittest.TestCase):
+    def draw(self, console, cells):
+        renderer = LineRenderer(console)
+        console.pos(2, 0)
+        console.write_scrolling("".join(c for c, a in cells))
+        renderer.drawn("state", (2, 0), cells)
+        del console.calls[:]
+        return renderer
+
+    def test_append_writes_one_cell(self):
+        console = RecordingConsole()
+        renderer = self.draw(console, make_cells("abcdefghijk",
+                                                 [(0, 11, None)]))
+        self.assertEqual(0, renderer.update(make_cells("abcdefghijkl",
+                                                       [(0, 12, None)])))
+        self.assertEqual([("pos", 3, 1), ("write", "l", None)], console.calls)
+
+    def test_unchanged_writes_nothing(self):
+        console = RecordingConsole()
+        cells = make_cells("abc", [(0, 3, None)])
+        renderer = self.draw(console, cells)
+        renderer.update(list(cells))
+        self.assertEqual([], console.calls)
+
+    def test_attribute_change(self):
+        console = RecordingConsole()
+        renderer = self.draw(console, make_cells("abcdef", [(0, 6, None)]))
+        renderer.update(make_cells("abcdef", [(0, 2, None), (2, 4, 7),
+                                              (4, 6, None)]))
+        self.assertEqual([("pos", 4, 0), ("write", "cd", 7)], console.calls)
+
+    def test_screen_matches_full_draw(self):
+        rnd = random.Random(4711)
+        console = RecordingConsole(width=7, height=6)
+        text = "hello"
+        renderer = self.draw(console, make_cells(text, [(0, len(text), None)]))
+        for i in range(300):
+            old = text
+            p = rnd.randint(0, len(text))
+            if rnd.random() < 0.6 and len(text) < 25:
+                text = text[:p] + rnd.choice("xyz ") + text[p:]
+            else:
+                text = text[:p] + text[p + 1:]
+            cut = rnd.randint(0, len(text))
+            cells = make_cells(text, [(0, cut, None), (cut, len(text), 3)])
+            renderer.update(cells)
+            self.assertEqual(cells, console.cells(renderer.origin, len(cells)))
+            blank = console.cells(renderer.position(len(cells)),
+                                  max(0, len(old) - len(text)))
+            self.assertEqual([(" ", None)] * len(blank), blank)
+
+    def test_scroll_moves_origin(self):
+        console = RecordingConsole(width=4, height=2)
+        renderer = self.draw(console, make_cells("ab", [(0, 2, None)]))
+        self.assertEqual(1, renderer.update(make_cells("abcdef",
+                                                       [(0, 6, None)])))
+        self.assertEqual((2, -1), renderer.origin)
+
+    def test_can_update(self):
+        renderer = LineRenderer(RecordingConsole())
+        cells = make_cells("a", [(0, 1, None)])
+        self.assertFalse(renderer.can_update("state", cells))
+        renderer.drawn("state", (0, 0), cells)
+        self.assertTrue(renderer.can_update("state", cells))
+        self.assertFalse(renderer.can_update("other", cells))
+        self.assertFalse(renderer.can_update("state", None))
+        renderer.invalidate()
+        self.assertFalse(renderer.can_update("state", cells))
+
+    def test_is_plain(self):
+        self.assertTrue(is_plain("abc def"))
+        self.assertFalse(is_plain("a\tb"))
+        self.assertFalse(is_plain("a†"))
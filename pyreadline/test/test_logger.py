@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, absolute_import
+
+import os
+import tempfile
+import unittest
+
+import pyreadline.logger as logger
+from pyreadline.logger import log
+
+
+class Unformattable(object):
+    def __str__(self):
+        raise AssertionError("formatted while logging is disabled")
+
+
+class Test_logger(unittest.TestCase):
+    def test_disabled_does_not_format(self):
+        self.assertFalse(logger.enabled)
+        log("value %s", Unformattable())
+
+    def test_file_log(self):
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            logger.start_file_log(filename)
+            self.assertTrue(logger.enabled)
+            log("cursor:%d", 5)
+            log("100%")
+            logger.stop_file_log()
+            self.assertFalse(logger.enabled)
+            log("not written %s", 1)
+            with open(filename) as f:
+                self.assertEqual(["cursor:5", "100%"], f.read().splitlines())
+        finally:
+            logger.stop_file_log()
+            os.remove(filename)
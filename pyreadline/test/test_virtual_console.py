@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, absolute_import
+
+import os
+import subprocess
+import sys
+import unittest
+
+from pyreadline.console.virtual_console import Console
+from pyreadline.rlmain import Readline
+
+
+class Test_virtual_console(unittest.TestCase):
+    def test_write_wraps_and_scrolls(self):
+        c = Console(width=4, height=2)
+        self.assertEqual(0, c.write_scrolling("abcde"))
+        self.assertEqual(["abcd", "e"], c.lines())
+        self.assertEqual((1, 1), c.pos())
+        self.assertEqual(1, c.write_scrolling("fgh"))
+        self.assertEqual(["efgh"], c.lines())
+        self.assertEqual((0, 1), c.pos())
+
+    def test_motion_characters(self):
+        c = Console(width=20, height=3)
+        c.write("ab\tc\rA\010B\n\007x")
+        self.assertEqual(["Bb      c", "x"], c.lines())
+        self.assertEqual(1, c.bell_count)
+
+    def test_ansi_color(self):
+        c = Console(width=10, height=2)
+        c.write("a\033[0;31mb\033[0mc")
+        self.assertEqual(["abc"], c.lines())
+        self.assertEqual([0x7, 0x4, 0x7], c.line_attrs(0)[:3])
+
+    def test_rectangle_and_scroll(self):
+        c = Console(width=3, height=3)
+        c.write("abcdefgh")
+        c.scroll((0, 0, 3, 3), 0, -1)
+        self.assertEqual(["def", "gh"], c.lines())
+        c.rectangle((1, 0, 10, 1))
+        self.assertEqual(["d", "gh"], c.lines())
+
+    def test_keys(self):
+        c = Console()
+        c.send_text("a \n\x01")
+        c.send_keys("Shift-Left")
+        keys = []
+        while c.keypress_pending():
+            keys.append(c.getkeypress().keyinfo.tuple())
+        self.assertEqual([(False, False, False, "a"),
+                          (False, False, False, "space"),
+                          (False, False, False, "return"),
+                          (True, False, False, "A"),
+                          (False, False, True, "left")], keys)
+        self.assertRaises(EOFError, c.getkeypress)
+
+
+class Test_console_fallback(unittest.TestCase):
+    # a fresh interpreter that believes it runs on Windows
+    script = ("import sys; sys.platform = 'win32'; "
+              "import pyreadline.console, pyreadline.keysyms; "
+              "print(pyreadline.console.Console.__module__)")
+
+    def run_script(self, **environ):
+        env = dict(os.environ)
+        env.pop("PYREADLINE_VIRTUAL_CONSOLE", None)
+        env.update(environ)
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        process = subprocess.Popen([sys.executable, "-c", self.script],
+                                   cwd=root, env=env,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        out, err = process.communicate()
+        return process.returncode, out.decode(), err.decode()
+
+    @unittest.skipIf(sys.platform == "win32", "the win32 console imports")
+    def test_import_error_on_windows(self):
+        code, out, err = self.run_script()
+        self.assertNotEqual(0, code)
+        self.assertTrue("ImportError" in err, err)
+
+    @unittest.skipIf(sys.platform == "win32", "the win32 console imports")
+    def test_requested_fallback(self):
+        code, out, err = self.run_script(PYREADLINE_VIRTUAL_CONSOLE="1")
+        self.assertEqual(0, code, err)
+        self.assertEqual("pyreadline.console.virtual_console", out.strip())
+
+
+class Test_readline_virtual_console(unittest.TestCase):
+    def readline(self, keys, **settings):
+        c = Console(width=20, height=5)
+        rl = Readline(c)
+        for name, value in settings.items():
+            setattr(rl, name, value)
+        for key in keys:
+            if len(key) > 1:
+                c.send_keys(key)
+            else:
+                c.send_text(key)
+        return rl.readline(">>> "), c
+
+    def test_readline(self):
+        line, c = self.readline("hello wrld" + "\x02" * 3 + "o\n")
+        self.assertEqual("hello world\n", line)
+        self.assertEqual([">>> hello world"], c.lines())
+        self.assertEqual((0, 1), c.pos())
+
+    def test_long_line(self):
+        line, c = self.readline(["x"] * 30 + ["Home", "y", "\n"])
+        self.assertEqual("y" + "x" * 30 + "\n", line)
+        self.assertEqual([">>> y" + "x" * 15, "x" * 15], c.lines())
+
+    def test_redraw_modes_draw_the_same(self):
+        keys = list("some text") + ["Left"] * 4 + ["\x7f", "\x08", "Z",
+            "Control-k", "End", "\n"]
+        screens = []
+        for settings in [dict(differential_redraw=False),
+                         dict(differential_redraw=True),
+                         dict(key_batch_size=100)]:
+            line, c = self.readline(keys, **settings)
+            screens.append((line, c.lines(), c.pos()))
+        self.assertEqual(screens[0], screens[1])
+        self.assertEqual(screens[0], screens[2])
+
+    def test_completion_pages(self):
+        c = Console(width=20, height=6)
+        rl = Readline(c)
+        rl.mode._bind_key("Tab", rl.mode.complete)
+        rl.mode.completion_query_items = 10
+        rl.mode.page_completions = "on"
+        rl.set_bulk_completer(lambda text: ["item%02d" % i
+                                            for i in range(30)])
+        # 2 columns of 15 rows, a screen shows 5 rows and --More--
+        c.send_keys("i", "Tab", "y", "space", "Return", "q", "Return")
+        self.assertEqual("item\n", rl.readline(">>> "))
+        self.assertEqual(["item07 item22", "item08 item23",
+                          "item09 item24", "item10 item25",
+                          ">>> item"], c.lines())
+
+    def test_end_of_input(self):
+        c = Console()
+        rl = Readline(c)
+        c.send_text("abc")
+        self.assertRaises(EOFError, rl.readline, ">>> ")
+        self.assertEqual([">>> abc"], c.lines())
@@ -4,6 +4,15 @@
 # of a readline module
 
 from __future__ import print_function, unicode_literals, absolute_import
+from platform import system
+
+# The package itself imports everywhere (using the virtual console off
+# Windows), but only a Windows console can stand in for GNU readline.
+_S = system()
+if 'windows' != _S.lower():
+    raise RuntimeError('pyreadline is for Windows only, not {}.'.format(_S))
+del system, _S
+
 from pyreadline.rlmain import Readline
 
 __all__ = [
@@ -22,6 +31,8 @@ __all__ = [
     'set_pre_input_hook',
     'set_completer',
     'get_completer',
+    'set_bulk_completer',
+    'get_bulk_completer',
     'get_begidx',
     'get_endidx',
     'set_completer_delims',
@@ -76,6 +87,8 @@ else:
     get_line_buffer = rl.get_line_buffer
     set_completer = rl.set_completer
     get_completer = rl.get_completer
+    set_bulk_completer = rl.set_bulk_completer
+    get_bulk_completer = rl.get_bulk_completer
     get_begidx = rl.get_begidx
     get_endidx = rl.get_endidx
 